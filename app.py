@@ -1,18 +1,43 @@
 import streamlit as st
-import cv2
-import numpy as np
 import os
-import json
-from datetime import datetime
-from PIL import Image
+import atexit
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+import pandas as pd
 # 导入图像处理模块
-from image_processing import calibrate_circle, calibrate_rectangle, measure_circle, measure_rectangle
+from image_processing import calibrate_circle, calibrate_rectangle, measure_circle, measure_rectangle, measure_circles, measure_rectangles, annotate_circle, annotate_rectangle
 # 导入首页模块
 from home_page import home_page
 # 导入认证模块
 from auth import is_authenticated, require_login
 # 导入摄像头工具模块
-from camera_utils import init_camera, stop_camera, camera_stream_placeholder, display_camera_stream, capture_frame
+from camera_utils import init_camera, stop_camera, camera_stream_placeholder, display_camera_stream, capture_frame, get_camera_manager, keep_camera_alive
+# 导入ROI跟踪模块
+from roi_tracker import RoiTracker
+# 导入实时测量模块
+from live_measurement import LiveMeasurementScheduler, run_live_view
+# 导入二值化方法统计模块
+from strategy_stats import StrategyStats
+# 导入标定配置存储模块
+from calibration_store import CalibrationStore, DEFAULT_PROFILE
+# 导入测量结果库
+from results_store import ResultsStore, import_legacy_results
+# 导入后台保存模块
+from result_writer import BackgroundResultWriter
+# 导入统计过程控制模块
+from spc_stats import merge_buckets
+# 导入分阶段计时模块
+from stage_timer import stage_timer
+# 导入视频测量模块
+from video_measure import measure_video, video_info, VIDEO_EXTENSIONS
+# 导入多帧平均测量模块
+from frame_averaging import measure_frames
+# 导入上传图片解码模块
+from image_loader import load_image
+# 导入相机几何校正模块
+from camera_geometry import (calibrate_a4, calibrate_checkerboard, save_geometry, load_geometry, delete_geometry,
+                             DEFAULT_PATTERN, MIN_DISTORTION_VIEWS)
 
 # 设置页面配置
 st.set_page_config(page_title="机器视觉零件测量系统", layout="wide")
@@ -30,32 +55,156 @@ calibration_dir = os.path.join(current_dir, 'calibration')
 if not os.path.exists(calibration_dir):
     os.makedirs(calibration_dir)
 
-# 初始化标定数据文件（使用绝对路径）
+# 标定数据文件（使用绝对路径）
 CALIBRATION_FILE = os.path.join(calibration_dir, 'calibration_data.json')
-if not os.path.exists(CALIBRATION_FILE):
-    with open(CALIBRATION_FILE, 'w') as f:
-        json.dump({
-            'circle': {'radius': 0, 'pixels_per_mm': 0},
-            'rectangle': {'width': 0, 'height': 0, 'pixels_per_mm_width': 0, 'pixels_per_mm_height': 0},
-            'custom': []
-        }, f)
+
+# 相机几何校正的保存目录（每个摄像头/分辨率一个文件）
+GEOMETRY_DIR = os.path.join(calibration_dir, 'geometry')
+
+# 标定历史中各标定类型的名称
+CALIBRATION_TYPE_LABELS = {'circle': "圆形", 'rectangle': "矩形", 'geometry': "相机几何"}
+
+# 可选的摄像头采集分辨率
+RESOLUTION_OPTIONS = {
+    "640x480": (640, 480),
+    "1280x720": (1280, 720),
+    "1920x1080": (1920, 1080),
+    "2592x1944": (2592, 1944)
+}
+
+# 获取标定配置存储（进程内共享，文件未变化时不重新读取）
+@st.cache_resource
+def get_calibration_store():
+    return CalibrationStore(CALIBRATION_FILE)
+
+# 当前会话使用的标定配置名称
+def current_profile():
+    return st.session_state.get('calibration_profile', DEFAULT_PROFILE)
 
 # 加载标定数据
 def load_calibration_data():
+    return get_calibration_store().load_profile(current_profile())
+
+# 保存标定结果（记入当前配置的标定历史）
+def save_calibration_result(calibration_type, values):
+    get_calibration_store().record_calibration(current_profile(), calibration_type, values,
+                                               operator=st.session_state.get('username'))
+
+# 获取矩形检测的二值化方法统计（按标定配置分别统计，跨脚本重跑保留）
+def get_strategy_stats(calibration_data):
+    stats_key = f"strategy_stats_{current_profile()}"
+    stats = st.session_state.get(stats_key)
+    if stats is None:
+        stats = StrategyStats.from_calibration(calibration_data['rectangle'])
+        st.session_state[stats_key] = stats
+    return stats
+
+# 保存有更新的二值化方法统计
+def persist_strategy_stats():
+    stats = st.session_state.get(f"strategy_stats_{current_profile()}")
+    if stats is not None and stats.dirty:
+        section = {}
+        stats.save_to(section)
+        get_calibration_store().update_section(current_profile(), 'rectangle', section)
+
+# 在侧边栏选择和新建标定配置
+def profile_selector():
+    store = get_calibration_store()
+    names = store.profile_names()
+    if current_profile() not in names:
+        st.session_state.calibration_profile = DEFAULT_PROFILE
+    st.sidebar.selectbox("标定配置（相机/工位）", names, key="calibration_profile")
+    with st.sidebar.expander("新建标定配置"):
+        name = st.text_input("配置名称", key="new_profile_name")
+        station = st.text_input("工位", key="new_profile_station")
+        camera_id = st.number_input("摄像头编号", min_value=0, value=0, step=1, key="new_profile_camera")
+        resolution = st.selectbox("采集分辨率", list(RESOLUTION_OPTIONS), key="new_profile_resolution")
+        if st.button("创建", key="create_profile") and name:
+            store.create_profile(name, camera_id=int(camera_id), station=station,
+                                 resolution=RESOLUTION_OPTIONS[resolution])
+            st.session_state.calibration_profile = name
+            st.experimental_rerun()
+
+# 打开当前标定配置对应的摄像头（按配置中的分辨率采集）
+def start_profile_camera():
+    profile = load_calibration_data()
+    return init_camera(profile.get('camera_id', 0), profile.get('resolution'))
+
+# 当前标定配置的相机几何校正（按摄像头编号和采集分辨率保存），没有时返回None
+def current_geometry():
+    profile = load_calibration_data()
+    return load_geometry(profile.get('camera_id', 0), profile.get('resolution'), GEOMETRY_DIR)
+
+# 测量摄像头画面时使用的几何校正：只有尺寸标定也是在几何校正后得到时才使用，保证比例和轮廓在同一坐标系
+def measurement_geometry(section):
+    if not section.get('geometry_corrected'):
+        return None
+    return current_geometry()
+
+# 在侧边栏显示摄像头状态，并可修改当前配置的摄像头和分辨率
+def camera_panel():
+    with st.sidebar.expander("摄像头"):
+        status = get_camera_manager().status()
+        if not status:
+            st.caption("没有正在运行的摄像头")
+        for camera in status:
+            size = camera['frame_size'] or camera['resolution']
+            st.caption(f"摄像头 {camera['camera_id']}: {size[0]}x{size[1]}，{camera['fps']} fps，"
+                       f"{camera['sessions']} 个会话使用中")
+
+        profile = load_calibration_data()
+        current = f"{profile['resolution'][0]}x{profile['resolution'][1]}"
+        geometry = current_geometry()
+        if geometry is not None:
+            st.caption(f"几何校正: 已标定（{'棋盘格' if geometry.method == 'checkerboard' else 'A4纸'}，"
+                       f"{'含' if geometry.camera_matrix is not None else '不含'}镜头畸变）")
+        else:
+            st.caption("几何校正: 未标定")
+        options = list(RESOLUTION_OPTIONS)
+        if current not in options:
+            options.append(current)
+        camera_id = st.number_input("当前配置的摄像头编号", min_value=0, value=int(profile.get('camera_id', 0)),
+                                    step=1, key=f"camera_id_{current_profile()}")
+        resolution = st.selectbox("采集分辨率", options, index=options.index(current),
+                                  key=f"camera_resolution_{current_profile()}")
+        if st.button("应用", key="apply_camera_settings"):
+            width, height = (int(v) for v in resolution.split('x'))
+            get_calibration_store().set_camera(current_profile(), int(camera_id), (width, height))
+            st.experimental_rerun()
+
+# 是否启用金字塔检测
+def use_pyramid():
+    return st.session_state.get('use_pyramid', False)
+
+# 缩小解码时保留的最长边下限（像素）
+REDUCED_DECODE_MIN_SIDE = 2000
+
+# 解码上传的图片
+def load_uploaded_image(uploaded_file, gray=False):
+    """
+    按内容哈希缓存解码结果；圆形检测只用灰度图，直接解码为灰度以减少解码时间和内存
+
+    返回:
+        (image, scale)，scale为相对原图的缩放比例；无法解码时image为None
+    """
+    max_side = REDUCED_DECODE_MIN_SIDE if st.session_state.get('reduced_decode', False) else None
     try:
-        with open(CALIBRATION_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return {
-            'circle': {'radius': 0, 'pixels_per_mm': 0},
-            'rectangle': {'width': 0, 'height': 0, 'pixels_per_mm_width': 0, 'pixels_per_mm_height': 0},
-            'custom': []
-        }
+        return load_image(uploaded_file.getvalue(), 'gray' if gray else 'rgb', max_side)
+    except ValueError:
+        st.error("无法读取图片，请检查文件格式")
+        return None, 1.0
 
-# 保存标定数据
-def save_calibration_data(data):
-    with open(CALIBRATION_FILE, 'w') as f:
-        json.dump(data, f)
+# 按解码缩放比例换算标定数据（标定数据按原图分辨率保存）
+def scale_calibration(calibration_data, scale):
+    if scale == 1:
+        return calibration_data
+    scaled = dict(calibration_data)
+    scaled['circle'] = dict(calibration_data['circle'],
+                            pixels_per_mm=calibration_data['circle']['pixels_per_mm'] * scale)
+    scaled['rectangle'] = dict(calibration_data['rectangle'],
+                               pixels_per_mm_width=calibration_data['rectangle']['pixels_per_mm_width'] * scale,
+                               pixels_per_mm_height=calibration_data['rectangle']['pixels_per_mm_height'] * scale)
+    return scaled
 
 # 主应用
 def main():
@@ -82,7 +231,18 @@ def main():
     
     # 根据登录状态决定可选模式
     if is_authenticated():
-        app_mode = st.sidebar.selectbox("选择模式", ["首页", "标定", "测量"], index=["首页", "标定", "测量"].index(st.session_state.app_mode))
+        app_mode = st.sidebar.selectbox("选择模式", ["首页", "标定", "测量", "历史记录", "统计"], index=["首页", "标定", "测量", "历史记录", "统计"].index(st.session_state.app_mode))
+        # 高分辨率图像先在缩小图上定位零件，再在全分辨率局部区域内精确检测
+        st.sidebar.checkbox("高分辨率图像加速（金字塔检测）", value=True, key="use_pyramid")
+        st.sidebar.checkbox("上传大图缩小解码（更快，精度略降）", value=False, key="reduced_decode",
+                            help=f"按2/4/8倍缩小解码，最长边不低于{REDUCED_DECODE_MIN_SIDE}像素；标定数据自动按比例换算")
+        profile_selector()
+        if get_calibration_store().corrupt_backup:
+            st.sidebar.warning(f"标定数据文件已损坏，已备份为 {get_calibration_store().corrupt_backup}，"
+                               "当前按空标定数据处理，请检查备份或重新标定")
+        camera_panel()
+        show_writer_status()
+        stage_timing_panel()
     else:
         app_mode = "首页"
         st.sidebar.info("请先登录系统才能使用标定和测量功能")
@@ -94,6 +254,10 @@ def main():
         home_page()
     elif app_mode == "标定":
         calibration_page()
+    elif app_mode == "历史记录":
+        history_page()
+    elif app_mode == "统计":
+        statistics_page()
     else:
         measurement_page()
 
@@ -107,9 +271,25 @@ def calibration_page():
         return
         
     st.header("标定模式")
+    st.caption(f"当前标定配置: {current_profile()}")
+    
+    # 当前配置的标定历史
+    history = load_calibration_data().get('history', [])
+    if history:
+        with st.expander(f"标定历史（{len(history)} 次）"):
+            st.table([{
+                "时间": datetime.fromtimestamp(entry['time']).strftime("%Y-%m-%d %H:%M:%S"),
+                "类型": CALIBRATION_TYPE_LABELS.get(entry['type'], entry['type']),
+                "操作员": entry.get('operator') or "",
+                "标定数据": ", ".join(f"{k}: {v:.4f}" if isinstance(v, float) else f"{k}: {v}"
+                                    for k, v in entry['values'].items())
+            } for entry in reversed(history)])
     
     # 选择标定类型
-    calibration_type = st.radio("选择标定类型", ["圆形标定", "矩形标定", "自定义标定"])
+    calibration_type = st.radio("选择标定类型", ["圆形标定", "矩形标定", "相机几何标定", "自定义标定"])
+    if calibration_type == "相机几何标定":
+        geometry_calibration()
+        return
     
     # 常用标定物体预设
     if calibration_type == "圆形标定":
@@ -144,12 +324,12 @@ def calibration_page():
     if source_type == "上传图片":
         uploaded_file = st.file_uploader("上传白色背景的标定图片", type=["jpg", "jpeg", "png"])
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            img_array = np.array(image)
-            process_calibration(img_array, calibration_type)
+            img_array, scale = load_uploaded_image(uploaded_file, gray=calibration_type == "圆形标定")
+            if img_array is not None:
+                process_calibration(img_array, calibration_type, scale)
     else:
         # 初始化摄像头
-        if init_camera():
+        if start_profile_camera():
             # 创建摄像头流占位符
             camera_placeholder = camera_stream_placeholder()
             col1, col2 = st.columns([3, 1])
@@ -168,8 +348,8 @@ def calibration_page():
                     if captured_frame is not None:
                         st.session_state.captured_frame = captured_frame
                         st.success("图像已捕获!")
-                        # 处理捕获的图像
-                        process_calibration(captured_frame, calibration_type)
+                        # 处理捕获的图像（有几何校正时得到校正坐标下的比例）
+                        process_calibration(captured_frame, calibration_type, geometry=current_geometry())
                     else:
                         st.error("捕获图像失败，请检查摄像头连接")
                 
@@ -193,9 +373,13 @@ def measurement_page():
     measurement_type = st.radio("选择测量类型", ["圆形测量", "矩形测量"])
     
     # 选择输入源
-    source_type = st.radio("选择输入源", ["上传图片", "使用摄像头"])
+    source_type = st.radio("选择输入源", ["上传图片", "上传视频", "使用摄像头"])
+    
+    # 多零件模式：一次测量画面中的所有零件
+    multi_mode = st.checkbox("多零件模式（一次测量画面中的所有零件）")
     
-    # 加载标定数据
+    # 加载标定数据（先保存实时测量期间更新的二值化方法统计）
+    persist_strategy_stats()
     calibration_data = load_calibration_data()
     
     # 检查是否已标定
@@ -206,33 +390,68 @@ def measurement_page():
         st.error("请先进行矩形标定！")
         return
     
+    # 几何校正后的标定比例属于校正坐标，只能用于同一摄像头、同一分辨率的画面
+    section = calibration_data['circle' if measurement_type == "圆形测量" else 'rectangle']
+    if section.get('geometry_corrected'):
+        if source_type != "使用摄像头":
+            st.error("当前配置的标定是在几何校正后的摄像头画面上得到的，不能用于上传的图片或视频。"
+                     "请使用摄像头测量，或新建一个标定配置并用上传的图片标定")
+            return
+        if current_geometry() is None:
+            st.warning("标定时使用的几何校正已删除或采集分辨率已改变，测量结果不准确，请重新进行几何标定和尺寸标定")
+    elif source_type == "使用摄像头" and current_geometry() is not None:
+        st.info("当前的尺寸标定是在几何校正之前得到的，本次测量不使用几何校正；重新标定后生效")
+    
     # 输入期望尺寸
     if measurement_type == "圆形测量":
         expected_radius = st.number_input("输入期望半径 (mm)", min_value=0.1, value=10.0, step=0.1)
     else:  # 矩形测量
         expected_width = st.number_input("输入期望长度 (mm)", min_value=0.1, value=50.0, step=0.1)
         expected_height = st.number_input("输入期望宽度 (mm)", min_value=0.1, value=30.0, step=0.1)
+    # 误差在允许范围内判定为合格
+    tolerance = st.number_input("允许误差 (%)", min_value=0.0, value=1.0, step=0.1)
     
     if source_type == "上传图片":
         uploaded_file = st.file_uploader("上传白色背景的测量图片", type=["jpg", "jpeg", "png"])
+        img_array = None
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            img_array = np.array(image)
-            
-            if measurement_type == "圆形测量":
-                process_circle_measurement(img_array, expected_radius, calibration_data)
+            img_array, scale = load_uploaded_image(uploaded_file, gray=measurement_type == "圆形测量")
+            calibration_data = scale_calibration(calibration_data, scale)
+        if img_array is not None:
+            if multi_mode:
+                process_multi_measurement(img_array, measurement_type, calibration_data)
+            elif measurement_type == "圆形测量":
+                process_circle_measurement(img_array, expected_radius, calibration_data, tolerance)
             else:  # 矩形测量
-                process_rectangle_measurement(img_array, expected_width, expected_height, calibration_data)
+                process_rectangle_measurement(img_array, expected_width, expected_height, calibration_data, tolerance)
+    elif source_type == "上传视频":
+        uploaded_file = st.file_uploader("上传检测视频", type=[ext.lstrip('.') for ext in VIDEO_EXTENSIONS])
+        if uploaded_file is not None:
+            if measurement_type == "圆形测量":
+                expected = {'radius': expected_radius}
+            else:
+                expected = {'width': expected_width, 'height': expected_height}
+            process_video_measurement(uploaded_file, measurement_type, calibration_data, expected, tolerance)
     else:
         # 初始化摄像头
-        if init_camera():
+        if start_profile_camera():
+            # 实时测量：在预览画面上持续叠加测量结果
+            live_mode = st.checkbox("实时测量（在画面中持续显示测量结果）", key="live_measurement")
+            # 显示检测结果时，后续帧只在上次检测位置附近搜索
+            show_detection = False
+            if not live_mode:
+                stop_live_scheduler()
+                show_detection = st.checkbox("在画面中显示检测结果（ROI跟踪）", key="show_detection")
+            tracker = get_roi_tracker(measurement_type, calibration_data) if (show_detection or live_mode) else None
+            
             # 创建摄像头流占位符
             camera_placeholder = camera_stream_placeholder()
             col1, col2 = st.columns([3, 1])
             
             with col1:
-                # 显示摄像头流
-                current_frame = display_camera_stream(camera_placeholder)
+                # 显示摄像头流（实时测量模式下由下方的实时画面循环刷新）
+                if not live_mode:
+                    current_frame = display_camera_stream(camera_placeholder, processing_func=tracker)
             
             with col2:
                 st.markdown("### 摄像头控制")
@@ -243,22 +462,256 @@ def measurement_page():
                     captured_frame = capture_frame()
                     if captured_frame is not None:
                         st.session_state.captured_frame = captured_frame
+                        st.session_state.pop('averaged_result', None)
+                        clear_pending_result()
                         st.success("图像已捕获!")
-                        # 处理捕获的图像
-                        if measurement_type == "圆形测量":
-                            process_circle_measurement(captured_frame, expected_radius, calibration_data)
-                        else:  # 矩形测量
-                            process_rectangle_measurement(captured_frame, expected_width, expected_height, calibration_data)
                     else:
                         st.error("捕获图像失败，请检查摄像头连接")
                 
+                # 多帧平均测量：连续测量后续N帧，减小传感器噪声和边缘抖动的影响
+                if not multi_mode and not live_mode:
+                    average_frames = st.number_input("平均帧数", min_value=2, max_value=100, value=10, step=1,
+                                                     key="average_frames")
+                    if st.button("多帧平均测量", key="average_measurement"):
+                        st.session_state.pop('captured_frame', None)
+                        clear_pending_result()
+                        st.session_state.averaged_result = run_averaged_measurement(
+                            measurement_type, calibration_data, int(average_frames))
+                
                 # 停止摄像头按钮
                 if st.button("停止摄像头", key="stop_camera_measurement"):
+                    stop_live_scheduler()
                     stop_camera()
                     st.experimental_rerun()
+            
+            # 处理捕获的图像（保存在session_state中，点击测量和保存按钮重跑脚本后仍然可用）
+            captured_frame = st.session_state.get('captured_frame')
+            if captured_frame is not None:
+                # 摄像头画面按几何校正测量（只校正轮廓点）
+                geometry = measurement_geometry(section)
+                if multi_mode:
+                    process_multi_measurement(captured_frame, measurement_type, calibration_data, geometry)
+                elif measurement_type == "圆形测量":
+                    process_circle_measurement(captured_frame, expected_radius, calibration_data, tolerance, geometry)
+                else:  # 矩形测量
+                    process_rectangle_measurement(captured_frame, expected_width, expected_height, calibration_data,
+                                                  tolerance, geometry)
+            
+            # 显示多帧平均测量结果
+            averaged = st.session_state.get('averaged_result')
+            if averaged is not None and not multi_mode:
+                if measurement_type == "圆形测量":
+                    expected = {'radius': expected_radius}
+                else:
+                    expected = {'width': expected_width, 'height': expected_height}
+                show_averaged_result(averaged, expected, tolerance)
+            
+            # 实时测量画面循环（放在页面最后，任何交互都会触发重跑并结束本次循环）
+            if live_mode:
+                part_type = 'circle' if measurement_type == "圆形测量" else 'rectangle'
+                scheduler = get_live_scheduler(tracker)
+                run_live_view(camera_placeholder, scheduler, part_type, heartbeat=keep_camera_alive)
+
+# 多帧平均测量
+def run_averaged_measurement(measurement_type, calibration_data, frame_count):
+    part_type = 'circle' if measurement_type == "圆形测量" else 'rectangle'
+    strategy_stats = get_strategy_stats(calibration_data) if part_type == 'rectangle' else None
+    # 使用单独的跟踪器，第一帧全图检测，后续帧只在零件附近搜索
+    tracker = RoiTracker(part_type, calibration_data[part_type], strategy_stats=strategy_stats,
+                         geometry=measurement_geometry(calibration_data[part_type]))
+    progress_bar = st.progress(0.0)
+    averager, result, frame = measure_frames(st.session_state.camera, tracker, frame_count,
+                                             progress=lambda done, total: progress_bar.progress(done / total))
+    progress_bar.empty()
+    persist_strategy_stats()
+    if result is None:
+        if averager.discarded and not averager.failed:
+            st.error(f"测量失败，{averager.discarded}帧在检测完成前已被新画面覆盖，请降低摄像头分辨率后重试")
+        else:
+            st.error("测量失败，未能检测到零件" if averager.failed else "测量失败，未能从摄像头获取画面")
+        return None
+
+    summary = averager.summary()
+    if part_type == 'circle':
+        labels = [f"半径: {summary['radius']['robust_mean']:.3f} mm（{averager.count}帧平均）"]
+        image = annotate_circle(frame, result, labels)
+    else:
+        labels = [f"长度: {summary['width']['robust_mean']:.3f} mm（{averager.count}帧平均）",
+                  f"宽度: {summary['height']['robust_mean']:.3f} mm"]
+        image = annotate_rectangle(frame, result, labels)
+    return {'type': part_type, 'summary': summary, 'frames': averager.count, 'failed': averager.failed,
+            'discarded': averager.discarded, 'image': image}
+
+# 显示多帧平均测量结果
+def show_averaged_result(averaged, expected, tolerance):
+    summary = averaged['summary']
+    st.image(averaged['image'], caption="多帧平均测量结果", use_column_width=True)
+    rejected = max(stats['rejected'] for stats in summary.values())
+    st.caption(f"共测量 {averaged['frames']} 帧，检测失败 {averaged['failed']} 帧，剔除异常值 {rejected} 帧，"
+               f"检测期间被覆盖作废 {averaged['discarded']} 帧；测量值为剔除异常值后的平均值")
+
+    data = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "frames": averaged['frames'],
+        "tolerance_percentage": tolerance
+    }
+    errors = []
+    columns = st.columns(len(summary) + 1)
+    for column, (name, stats) in zip(columns, summary.items()):
+        value = stats['robust_mean']
+        error = (value - expected[name]) / expected[name] * 100
+        errors.append(error)
+        label = {'radius': "半径", 'width': "长度", 'height': "宽度"}[name]
+        with column:
+            st.metric(f"{label} (mm)", f"{value:.3f}", f"{error:+.2f}%", delta_color="off")
+            st.caption(f"标准差 {stats['std']:.4f}，范围 {stats['min']:.3f} ~ {stats['max']:.3f}")
+        data[f"expected_{name}"] = expected[name]
+        data[f"measured_{name}"] = value
+        data[f"std_{name}"] = stats['std']
+        if averaged['type'] == 'circle':
+            data["error_percentage"] = error
+        else:
+            data[f"{name}_error_percentage"] = error
+    passed = all(abs(error) <= tolerance for error in errors)
+    with columns[-1]:
+        st.metric("判定", "合格" if passed else "不合格")
+
+    # 测量完成后暂存一次结果，点击保存按钮触发脚本重跑后仍可保存（保存后不再重复暂存）
+    if not averaged.get('pending_set'):
+        set_pending_result(averaged['type'], data, averaged['image'], passed)
+        averaged['pending_set'] = True
+    save_result_button("save_averaged_result")
+
+# 获取实时测量调度器（测量线程在脚本重跑之间持续运行）
+def get_live_scheduler(tracker):
+    scheduler = st.session_state.get('live_scheduler')
+    if scheduler is not None and (scheduler.tracker is not tracker or scheduler.camera is not st.session_state.camera):
+        scheduler.stop()
+        scheduler = None
+    if scheduler is None:
+        scheduler = LiveMeasurementScheduler(st.session_state.camera, tracker)
+        st.session_state.live_scheduler = scheduler
+    scheduler.start()
+    return scheduler
+
+# 停止实时测量调度器
+def stop_live_scheduler():
+    scheduler = st.session_state.get('live_scheduler')
+    if scheduler is not None:
+        scheduler.stop()
+        del st.session_state.live_scheduler
+
+# 获取ROI跟踪器（按测量类型保存在session_state中，跨脚本重跑保留跟踪区域）
+def get_roi_tracker(measurement_type, calibration_data):
+    part_type = 'circle' if measurement_type == "圆形测量" else 'rectangle'
+    tracker_key = f"roi_tracker_{current_profile()}_{part_type}"
+    tracker = st.session_state.get(tracker_key)
+    if tracker is None:
+        strategy_stats = get_strategy_stats(calibration_data) if part_type == 'rectangle' else None
+        tracker = RoiTracker(part_type, calibration_data[part_type], strategy_stats=strategy_stats,
+                             geometry=measurement_geometry(calibration_data[part_type]))
+        st.session_state[tracker_key] = tracker
+    else:
+        # 标定数据和几何校正可能已更新
+        tracker.calibration = calibration_data[part_type]
+        tracker.geometry = measurement_geometry(calibration_data[part_type])
+    return tracker
+
+# 相机几何标定（镜头畸变和透视校正）
+def geometry_calibration():
+    profile = load_calibration_data()
+    camera_id = profile.get('camera_id', 0)
+    resolution = tuple(profile['resolution'])
+    st.markdown(f"为摄像头 {camera_id}（{resolution[0]}x{resolution[1]}）标定镜头畸变和透视。"
+                "校正只作用于该摄像头在该分辨率下拍摄的画面，标定后请重新进行圆形/矩形标定。")
+
+    geometry = current_geometry()
+    if geometry is not None:
+        info = geometry.summary()
+        st.info(f"已有几何校正: {'棋盘格' if info['method'] == 'checkerboard' else 'A4纸'}，"
+                f"{'含' if info['distortion'] else '不含'}镜头畸变"
+                + (f"，重投影误差 {info['rms']:.3f} 像素" if info['rms'] is not None else ""))
+        if st.button("删除几何校正", key="delete_geometry"):
+            delete_geometry(camera_id, resolution, GEOMETRY_DIR)
+            st.experimental_rerun()
+
+    method = st.radio("标定方式", ["A4纸四角", "棋盘格"], key="geometry_method")
+    if method == "棋盘格":
+        col1, col2, col3 = st.columns(3)
+        columns = col1.number_input("内角点列数", min_value=3, value=DEFAULT_PATTERN[0], step=1)
+        rows = col2.number_input("内角点行数", min_value=3, value=DEFAULT_PATTERN[1], step=1)
+        square_mm = col3.number_input("方格边长 (mm)", min_value=0.1, value=25.0, step=0.1)
+        st.caption(f"从不同角度拍摄至少 {MIN_DISTORTION_VIEWS} 张覆盖整个画面的棋盘格才能估计镜头畸变；"
+                   "最后一张须是平放在测量位置的棋盘格。")
+    else:
+        st.caption("把A4纸平放在测量位置，背景颜色较深，整张纸在画面内。A4纸只能校正透视，不能校正镜头畸变。")
+
+    source_type = st.radio("选择输入源", ["上传图片", "使用摄像头"], key="geometry_source")
+    images = []
+    if source_type == "上传图片":
+        # 几何标定需要原始分辨率，不缩小解码
+        if method == "棋盘格":
+            uploaded_files = st.file_uploader("上传棋盘格图片（按拍摄顺序）", type=["jpg", "jpeg", "png"],
+                                              accept_multiple_files=True)
+        else:
+            uploaded_file = st.file_uploader("上传A4纸图片", type=["jpg", "jpeg", "png"])
+            uploaded_files = [uploaded_file] if uploaded_file is not None else []
+        for uploaded_file in uploaded_files or []:
+            try:
+                images.append(load_image(uploaded_file.getvalue())[0])
+            except ValueError:
+                st.error(f"无法读取图片: {uploaded_file.name}")
+    else:
+        if start_profile_camera():
+            camera_placeholder = camera_stream_placeholder()
+            display_camera_stream(camera_placeholder)
+            frames = st.session_state.setdefault('geometry_frames', [])
+            col1, col2 = st.columns(2)
+            if col1.button("捕获图像", key="capture_geometry"):
+                captured_frame = capture_frame()
+                if captured_frame is None:
+                    st.error("捕获图像失败，请检查摄像头连接")
+                elif method == "棋盘格":
+                    frames.append(captured_frame)
+                else:
+                    frames[:] = [captured_frame]
+            if col2.button("清空已捕获图像", key="clear_geometry_frames"):
+                frames.clear()
+            st.caption(f"已捕获 {len(frames)} 张图像")
+            images = list(frames)
+
+    if not images or not st.button("计算几何校正", key="compute_geometry"):
+        return
+    if any(image.shape[:2] != (resolution[1], resolution[0]) for image in images):
+        st.warning(f"图像分辨率与当前配置的采集分辨率 {resolution[0]}x{resolution[1]} 不一致，"
+                   "校正不会作用于摄像头画面")
+    try:
+        with st.spinner("正在计算几何校正..."):
+            if method == "棋盘格":
+                geometry, found = calibrate_checkerboard(images, (int(columns), int(rows)), square_mm)
+            else:
+                geometry, _ = calibrate_a4(images[-1])
+                found = 1
+    except ValueError as e:
+        st.error(f"几何标定失败: {e}")
+        return
+    if method == "棋盘格":
+        st.caption(f"{found}/{len(images)} 张图像找到棋盘格")
+        if geometry.camera_matrix is None:
+            st.warning(f"找到棋盘格的图像少于 {MIN_DISTORTION_VIEWS} 张，只校正透视，未估计镜头畸变")
+
+    save_geometry(geometry, camera_id, GEOMETRY_DIR)
+    save_calibration_result('geometry', geometry.summary())
+    st.success("几何校正已保存，请重新进行圆形/矩形标定")
+    st.image(geometry.warp(images[-1]), caption="校正后的画面", use_column_width=True)
+    st.session_state.pop('geometry_frames', None)
+
+# 标定图像是否经过几何校正（比例属于校正坐标，只能用于同一摄像头的画面）
+def geometry_applies(geometry, image):
+    return geometry is not None and geometry.applies_to(image.shape)
 
 # 处理标定
-def process_calibration(image, calibration_type):
+def process_calibration(image, calibration_type, scale=1.0, geometry=None):
     st.image(image, caption="上传的标定图片", use_column_width=True)
     
     # 显示标定参数输入
@@ -283,16 +736,19 @@ def process_calibration(image, calibration_type):
             # 这里将调用圆形标定函数
             st.info("正在进行圆形标定...")
             # 调用圆形标定函数
-            success, result_image, pixels_per_mm = calibrate_circle(image, actual_radius)
+            with stage_timer.collect() as timings:
+                success, result_image, pixels_per_mm = calibrate_circle(image, actual_radius, pyramid=use_pyramid(),
+                                                                        geometry=geometry)
+            show_stage_timings(timings)
             if success:
+                # 换算为原图分辨率下的比例
+                pixels_per_mm /= scale
                 st.success(f"圆形标定成功! 像素/毫米比例: {pixels_per_mm:.4f}")
                 st.image(result_image, caption="标定结果", use_column_width=True)
                 
                 # 保存标定数据
-                calibration_data = load_calibration_data()
-                calibration_data['circle']['radius'] = actual_radius
-                calibration_data['circle']['pixels_per_mm'] = pixels_per_mm
-                save_calibration_data(calibration_data)
+                save_calibration_result('circle', {'radius': actual_radius, 'pixels_per_mm': pixels_per_mm,
+                                                   'geometry_corrected': geometry_applies(geometry, image)})
             else:
                 st.error("标定失败，未能检测到圆形")
     
@@ -318,18 +774,30 @@ def process_calibration(image, calibration_type):
             # 这里将调用矩形标定函数
             st.info("正在进行矩形标定...")
             # 调用矩形标定函数
-            success, result_image, pixels_per_mm_width, pixels_per_mm_height = calibrate_rectangle(image, actual_width, actual_height)
+            calibration_data = load_calibration_data()
+            strategy_stats = get_strategy_stats(calibration_data)
+            with stage_timer.collect() as timings:
+                success, result_image, pixels_per_mm_width, pixels_per_mm_height, method = calibrate_rectangle(
+                    image, actual_width, actual_height, pyramid=use_pyramid(), strategy_stats=strategy_stats,
+                    geometry=geometry)
+            show_stage_timings(timings)
             if success:
+                pixels_per_mm_width /= scale
+                pixels_per_mm_height /= scale
                 st.success(f"矩形标定成功! 宽度像素/毫米: {pixels_per_mm_width:.4f}, 高度像素/毫米: {pixels_per_mm_height:.4f}")
                 st.image(result_image, caption="标定结果", use_column_width=True)
                 
                 # 保存标定数据
-                calibration_data = load_calibration_data()
-                calibration_data['rectangle']['width'] = actual_width
-                calibration_data['rectangle']['height'] = actual_height
-                calibration_data['rectangle']['pixels_per_mm_width'] = pixels_per_mm_width
-                calibration_data['rectangle']['pixels_per_mm_height'] = pixels_per_mm_height
-                save_calibration_data(calibration_data)
+                save_calibration_result('rectangle', {
+                    'width': actual_width,
+                    'height': actual_height,
+                    'pixels_per_mm_width': pixels_per_mm_width,
+                    'pixels_per_mm_height': pixels_per_mm_height,
+                    # 测量时优先使用标定时的二值化方法，保证测量与标定取同一条边缘
+                    'method': method,
+                    'geometry_corrected': geometry_applies(geometry, image)
+                })
+                persist_strategy_stats()
             else:
                 st.error("标定失败，未能检测到矩形")
     
@@ -343,236 +811,413 @@ def process_calibration(image, calibration_type):
             st.warning("自定义标定功能正在开发中...")
 
 # 圆形测量处理
-def process_circle_measurement(image, expected_radius, calibration_data):
+def process_circle_measurement(image, expected_radius, calibration_data, tolerance, geometry=None):
     st.image(image, caption="上传的测量图片", use_column_width=True)
     
     if st.button("开始圆形测量"):
         st.info("正在进行圆形测量...")
         # 调用圆形测量函数
-        success, result_image, measured_radius = measure_circle(image, calibration_data['circle']['pixels_per_mm'])
+        with stage_timer.collect() as timings:
+            success, result_image, measured_radius = measure_circle(image, calibration_data['circle']['pixels_per_mm'],
+                                                                   pyramid=use_pyramid(), geometry=geometry)
+        show_stage_timings(timings)
         
         if success:
             st.success(f"测量成功!")
             st.image(result_image, caption="测量结果", use_column_width=True)
             
-            col1, col2, col3 = st.columns(3)
+            error = ((measured_radius - expected_radius) / expected_radius) * 100
+            passed = abs(error) <= tolerance
+            col1, col2, col3, col4 = st.columns(4)
             with col1:
                 st.metric("期望半径 (mm)", f"{expected_radius:.2f}")
             with col2:
                 st.metric("实际半径 (mm)", f"{measured_radius:.2f}")
             with col3:
-                error = ((measured_radius - expected_radius) / expected_radius) * 100
                 st.metric("误差 (%)", f"{error:.2f}")
+            with col4:
+                st.metric("判定", "合格" if passed else "不合格")
             
-            # 保存结果选项
-            if st.button("保存测量结果", key="save_circle_result"):
-                save_success = save_measurement_result("circle", {
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "expected_radius": expected_radius,
-                    "measured_radius": measured_radius,
-                    "error_percentage": error
-                }, result_image)
-                if save_success:
-                    st.success("测量结果已保存!")
-                else:
-                    st.error("保存测量结果失败，请检查文件权限或磁盘空间。")
+            # 暂存测量结果，点击保存按钮触发脚本重跑后仍可保存
+            set_pending_result("circle", {
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "expected_radius": expected_radius,
+                "measured_radius": measured_radius,
+                "error_percentage": error,
+                "tolerance_percentage": tolerance
+            }, result_image, passed)
         else:
+            clear_pending_result()
             st.error("测量失败，未能检测到圆形")
+    
+    # 保存结果选项
+    save_result_button("save_circle_result")
 
 # 矩形测量处理
-def process_rectangle_measurement(image, expected_width, expected_height, calibration_data):
+def process_rectangle_measurement(image, expected_width, expected_height, calibration_data, tolerance, geometry=None):
     st.image(image, caption="上传的测量图片", use_column_width=True)
     
     if st.button("开始矩形测量"):
         st.info("正在进行矩形测量...")
         # 调用矩形测量函数
-        success, result_image, measured_width, measured_height = measure_rectangle(
-            image, 
-            calibration_data['rectangle']['pixels_per_mm_width'],
-            calibration_data['rectangle']['pixels_per_mm_height']
-        )
+        with stage_timer.collect() as timings:
+            success, result_image, measured_width, measured_height = measure_rectangle(
+                image, 
+                calibration_data['rectangle']['pixels_per_mm_width'],
+                calibration_data['rectangle']['pixels_per_mm_height'],
+                pyramid=use_pyramid(),
+                strategy_stats=get_strategy_stats(calibration_data),
+                geometry=geometry,
+                calibrated_method=calibration_data['rectangle'].get('method')
+            )
+        show_stage_timings(timings)
+        persist_strategy_stats()
         
         if success:
             st.success(f"测量成功!")
             st.image(result_image, caption="测量结果", use_column_width=True)
             
-            col1, col2, col3 = st.columns(3)
+            width_error = ((measured_width - expected_width) / expected_width) * 100
+            height_error = ((measured_height - expected_height) / expected_height) * 100
+            passed = abs(width_error) <= tolerance and abs(height_error) <= tolerance
+            col1, col2, col3, col4 = st.columns(4)
             with col1:
                 st.metric("长度 x 宽度 (mm)", f"{expected_width:.2f} x {expected_height:.2f}")
             with col2:
                 st.metric("实际长度 x 宽度 (mm)", f"{measured_width:.2f} x {measured_height:.2f}")
             with col3:
-                width_error = ((measured_width - expected_width) / expected_width) * 100
-                height_error = ((measured_height - expected_height) / expected_height) * 100
                 st.metric("误差 (%)", f"长: {width_error:.2f}, 宽: {height_error:.2f}")
+            with col4:
+                st.metric("判定", "合格" if passed else "不合格")
             
-            # 保存结果选项
-            if st.button("保存测量结果", key="save_rectangle_result"):
-                save_success = save_measurement_result("rectangle", {
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "expected_width": expected_width,
-                    "expected_height": expected_height,
-                    "measured_width": measured_width,
-                    "measured_height": measured_height,
-                    "width_error_percentage": width_error,
-                    "height_error_percentage": height_error
-                }, result_image)
-                if save_success:
-                    st.success("测量结果已保存!")
-                else:
-                    st.error("保存测量结果失败，请检查文件权限或磁盘空间。")
+            # 暂存测量结果，点击保存按钮触发脚本重跑后仍可保存
+            set_pending_result("rectangle", {
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "expected_width": expected_width,
+                "expected_height": expected_height,
+                "measured_width": measured_width,
+                "measured_height": measured_height,
+                "width_error_percentage": width_error,
+                "height_error_percentage": height_error,
+                "tolerance_percentage": tolerance
+            }, result_image, passed)
         else:
+            clear_pending_result()
             st.error("测量失败，未能检测到矩形")
+    
+    # 保存结果选项
+    save_result_button("save_rectangle_result")
 
-# 保存测量结果
-def save_measurement_result(measurement_type, data, image):
-    try:
-        # 导入csv模块
-        import csv
-        
-        # 获取当前脚本的绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 确保结果目录存在（使用绝对路径）
-        results_dir = os.path.join(current_dir, 'results')
-        
-        # 检查目录是否存在，如果不存在则创建
-        if not os.path.exists(results_dir):
-            try:
-                os.makedirs(results_dir, exist_ok=True)
-            except Exception as e:
-                st.error(f"创建结果目录失败: {str(e)}")
-                return False
-        
-        # 创建唯一的文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        result_dir_name = f"{measurement_type}_{timestamp}"
-        result_dir = os.path.join(results_dir, result_dir_name)
-        
-        # 创建结果子目录
-        try:
-            os.makedirs(result_dir, exist_ok=True)
-        except Exception as e:
-            st.error(f"创建测量结果目录失败: {str(e)}")
-            return False
-        
-        # 保存数据为JSON
-        data_file = os.path.join(result_dir, 'data.json')
-        try:
-            with open(data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            st.error(f"保存JSON数据文件失败: {str(e)}")
-            return False
-        
-        # 保存数据为CSV
-        csv_file = os.path.join(result_dir, 'data.csv')
-        try:
-            with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-                csv_writer = csv.writer(f)
-                # 写入表头和数据
-                if measurement_type == 'circle':
-                    csv_writer.writerow(['时间戳', '期望半径(mm)', '实际半径(mm)', '误差(%)'])
-                    csv_writer.writerow([
-                        data['timestamp'],
-                        data['expected_radius'],
-                        data['measured_radius'],
-                        data['error_percentage']
-                    ])
-                elif measurement_type == 'rectangle':
-                    csv_writer.writerow(['时间戳', '期望长度(mm)', '期望宽度(mm)', '实际长度(mm)', '实际宽度(mm)', '长度误差(%)', '宽度误差(%)'])
-                    csv_writer.writerow([
-                        data['timestamp'],
-                        data['expected_width'],
-                        data['expected_height'],
-                        data['measured_width'],
-                        data['measured_height'],
-                        data['width_error_percentage'],
-                        data['height_error_percentage']
-                    ])
-        except Exception as e:
-            st.error(f"保存CSV数据文件失败: {str(e)}")
-            # CSV保存失败不影响整体结果，继续执行
-        
-        # 保存图像
-        image_file = os.path.join(result_dir, 'result_image.jpg')
-        
-        # 检查图像通道，确保正确转换
-        if isinstance(image, np.ndarray):
-            try:
-                # 确保图像数据类型正确
-                if image.dtype != np.uint8:
-                    image = image.astype(np.uint8)
-                
-                # 使用PIL保存图像
-                if len(image.shape) == 3 and image.shape[2] == 3:
-                    # 对于彩色图像
-                    pil_image = Image.fromarray(image)
-                    pil_image.save(image_file, format='JPEG')
-                    st.info(f"保存彩色图像到: {image_file}")
-                elif len(image.shape) == 2 or (len(image.shape) == 3 and image.shape[2] == 1):
-                    # 对于灰度图
-                    if len(image.shape) == 3:
-                        image = image[:,:,0]  # 取第一个通道
-                    pil_image = Image.fromarray(image, mode='L')
-                    pil_image.save(image_file, format='JPEG')
-                    st.info(f"保存灰度图像到: {image_file}")
-                else:
-                    # 处理其他情况
-                    st.warning(f"未知图像格式: shape={image.shape}, 尝试转换为RGB")
-                    # 尝试转换为RGB
-                    try:
-                        if len(image.shape) == 3 and image.shape[2] == 4:  # RGBA图像
-                            rgb_image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
-                            pil_image = Image.fromarray(rgb_image)
-                        else:
-                            # 其他格式尝试直接转换
-                            pil_image = Image.fromarray(image)
-                        pil_image.save(image_file, format='JPEG')
-                        st.info(f"成功转换并保存图像到: {image_file}")
-                    except Exception as e:
-                        st.error(f"图像格式转换失败: {str(e)}")
-                        return False
-            except Exception as e:
-                st.error(f"保存图像失败: {str(e)}")
-                # 尝试使用OpenCV保存
-                try:
-                    st.warning("尝试使用OpenCV保存图像...")
-                    if len(image.shape) == 3 and image.shape[2] == 3:
-                        # BGR转RGB (OpenCV使用BGR格式)
-                        cv_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-                    else:
-                        cv_image = image
-                    cv2.imwrite(image_file, cv_image)
-                    st.info(f"使用OpenCV成功保存图像到: {image_file}")
-                except Exception as cv_error:
-                    st.error(f"OpenCV保存图像也失败: {str(cv_error)}")
-                    return False
+# 暂存待保存的测量结果
+def set_pending_result(measurement_type, data, image, passed):
+    st.session_state.pending_result = {
+        'measurement_type': measurement_type,
+        'data': data,
+        'image': image,
+        'passed': passed
+    }
+
+# 清除待保存的测量结果
+def clear_pending_result():
+    st.session_state.pop('pending_result', None)
+
+# 显示保存按钮（测量结果暂存在session_state中）
+def save_result_button(key):
+    pending = st.session_state.get('pending_result')
+    if pending is None:
+        return
+    if st.button("保存测量结果", key=key):
+        save_success = save_measurement_result(pending['measurement_type'], pending['data'], pending['image'],
+                                               passed=pending['passed'])
+        if save_success:
+            clear_pending_result()
+            st.success("测量结果已加入保存队列，可以继续测量下一个零件")
         else:
-            st.error(f"无效的图像数据类型: {type(image)}")
-            # 尝试直接保存PIL图像
-            try:
-                if isinstance(image, Image.Image):
-                    st.warning("检测到PIL图像对象，直接保存...")
-                    image.save(image_file, format='JPEG')
-                    st.info(f"成功保存PIL图像到: {image_file}")
-                else:
-                    return False
-            except Exception as e:
-                st.error(f"保存PIL图像失败: {str(e)}")
-                return False
+            st.warning("保存队列已满，请稍后再次点击保存")
+
+# 多零件测量处理
+def process_multi_measurement(image, measurement_type, calibration_data, geometry=None):
+    st.image(image, caption="上传的测量图片", use_column_width=True)
+    
+    if st.button("开始多零件测量"):
+        st.info("正在检测画面中的所有零件...")
+        with stage_timer.collect() as timings:
+            if measurement_type == "圆形测量":
+                success, result_image, parts = measure_circles(image, calibration_data['circle']['pixels_per_mm'], geometry)
+                rows = [{"编号": p['index'], "半径 (mm)": round(p['measured_radius'], 2)} for p in parts]
+            else:  # 矩形测量
+                success, result_image, parts = measure_rectangles(
+                    image,
+                    calibration_data['rectangle']['pixels_per_mm_width'],
+                    calibration_data['rectangle']['pixels_per_mm_height'],
+                    geometry
+                )
+                rows = [{"编号": p['index'], "长度 (mm)": round(p['measured_width'], 2),
+                         "宽度 (mm)": round(p['measured_height'], 2)} for p in parts]
+        show_stage_timings(timings)
         
-        # 验证文件是否成功创建
-        if os.path.exists(data_file) and os.path.exists(image_file):
-            st.success(f"测量结果已成功保存到: {result_dir}")
-            return True
+        if success:
+            st.success(f"测量成功! 共检测到 {len(parts)} 个零件")
+            st.image(result_image, caption="测量结果", use_column_width=True)
+            st.table(rows)
         else:
-            st.error("文件保存验证失败")
-            return False
+            st.error("测量失败，未能检测到零件")
+
+# 视频测量处理
+def process_video_measurement(uploaded_file, measurement_type, calibration_data, expected, tolerance):
+    part_type = 'circle' if measurement_type == "圆形测量" else 'rectangle'
+    sampling = st.radio("采样方式", ["按间隔采样", "按场景变化采样（零件放好后测量一次）"], key="video_sampling")
+    stride = st.number_input("采样间隔（帧）", min_value=1, value=10, step=1, key="video_stride",
+                             help="按场景变化采样时为检查画面的间隔")
+    scene_threshold = None
+    if sampling != "按间隔采样":
+        scene_threshold = st.slider("场景变化阈值（平均灰度差）", min_value=1.0, max_value=50.0, value=8.0, step=0.5,
+                                    key="video_scene_threshold")
+
+    if st.button("开始处理视频"):
+        # OpenCV只能从文件读取视频，按块复制到临时文件
+        suffix = os.path.splitext(uploaded_file.name)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, tmp, 1024 * 1024)
+            video_path = tmp.name
+        try:
+            info = video_info(video_path)
+            st.caption(f"{info['width']}x{info['height']}，{info['fps']:.1f} fps，时长 {info['duration_s']:.1f} 秒")
+            progress_bar = st.progress(0.0)
+            status = st.empty()
+            strategy_stats = get_strategy_stats(calibration_data) if part_type == 'rectangle' else None
+            rows = []
+            start_time = datetime.now()
+            for row in measure_video(video_path, part_type, calibration_data[part_type], expected, tolerance,
+                                     stride, scene_threshold, strategy_stats):
+                rows.append(row)
+                if info['frame_count']:
+                    progress_bar.progress(min(1.0, (row['frame'] + 1) / info['frame_count']))
+                status.text(f"已测量 {len(rows)} 帧（第 {row['frame']} 帧，{row['time_s']:.1f} 秒）")
+            progress_bar.progress(1.0)
+            elapsed = (datetime.now() - start_time).total_seconds()
+            persist_strategy_stats()
+        except ValueError as e:
+            st.error(str(e))
+            return
+        finally:
+            os.remove(video_path)
+
+        success_count = sum(1 for row in rows if row['success'])
+        status.text(f"完成: 采样 {len(rows)} 帧，{success_count} 帧测量成功，用时 {elapsed:.1f} 秒")
+        if rows:
+            df = pd.DataFrame(rows)
+            st.dataframe(df, use_container_width=True)
+            st.download_button("下载逐帧结果 (CSV)", df.to_csv(index=False).encode('utf-8-sig'),
+                               file_name=f"{os.path.splitext(uploaded_file.name)[0]}_results.csv",
+                               mime="text/csv")
+
+# 获取测量结果库（进程内共享一个数据库连接）
+@st.cache_resource
+def get_results_store():
+    store = ResultsStore(results_dir)
+    # 导入旧版按目录保存的结果（已导入的目录跳过，无法读取的目录输出错误后跳过）
+    import_legacy_results(store, results_dir)
+    return store
+
+# 获取后台保存线程（进程内共享，退出时写完队列中的记录）
+@st.cache_resource
+def get_result_writer():
+    writer = BackgroundResultWriter(get_results_store())
+    atexit.register(writer.stop)
+    return writer
+
+# 保存测量结果（加入后台保存队列，不等待写入完成）
+def save_measurement_result(measurement_type, data, image, passed=None):
+    try:
+        return get_result_writer().submit(measurement_type, data, image,
+                                          operator=st.session_state.get('username'), passed=passed)
     except Exception as e:
         st.error(f"保存测量结果时发生错误: {str(e)}")
         return False
 
+# 在侧边栏显示后台保存状态
+def show_writer_status():
+    status = get_result_writer().status()
+    if status['pending']:
+        st.sidebar.info(f"正在保存: {status['pending']} 条（队列容量 {status['capacity']}）")
+    if status['failed']:
+        st.sidebar.error(f"保存失败 {status['failed']} 条: {status['last_error']}")
+
+# 切换分阶段计时（对本进程的所有会话生效）
+def toggle_stage_timing():
+    stage_timer.enabled = st.session_state.stage_timing
+
+# 侧边栏的性能诊断面板
+def stage_timing_panel():
+    with st.sidebar.expander("性能诊断"):
+        st.checkbox("记录各处理阶段耗时", value=stage_timer.enabled, key="stage_timing",
+                    on_change=toggle_stage_timing,
+                    help="在标定和测量结果下方显示模糊、二值化、轮廓查找、筛选、文字绘制等阶段的耗时；"
+                         "对所有用户生效，诊断完成后请关闭")
+        if stage_timer.stats.calls:
+            st.caption(f"累计 {stage_timer.stats.calls} 次测量")
+            st.dataframe(timing_table(stage_timer.stats.summary()), use_container_width=True)
+            if st.button("清空耗时统计", key="reset_stage_timing"):
+                stage_timer.log_summary()
+                stage_timer.stats.reset()
+                st.experimental_rerun()
+
+# 阶段耗时汇总转换为表格
+def timing_table(summary):
+    return pd.DataFrame([{
+        "阶段": row['stage'],
+        "次数": row['count'],
+        "平均 (ms)": round(row['mean_ms'], 2),
+        "最大 (ms)": round(row['max_ms'], 2),
+        "合计 (ms)": round(row['total_ms'], 1)
+    } for row in summary])
+
+# 显示一次标定或测量的各阶段耗时
+def show_stage_timings(timings):
+    if not timings:
+        return
+    with st.expander(f"各阶段耗时（合计 {sum(timings.values()):.1f} ms）"):
+        rows = sorted(timings.items(), key=lambda item: item[1], reverse=True)
+        st.dataframe(pd.DataFrame([{"阶段": name, "耗时 (ms)": round(elapsed_ms, 2)} for name, elapsed_ms in rows]),
+                     use_container_width=True)
+        st.caption("矩形检测的各二值化方法并行执行，多核机器上各阶段耗时之和可能大于实际用时")
+
+# 历史记录页面
+def history_page():
+    # 检查用户是否已登录
+    if not is_authenticated():
+        st.warning("请先登录系统！")
+        st.session_state.app_mode = "首页"
+        st.experimental_rerun()
+        return
+    
+    st.header("历史记录")
+    store = get_results_store()
+    
+    # 查询条件
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        type_label = st.selectbox("测量类型", ["全部", "圆形", "矩形"])
+    with col2:
+        operator = st.text_input("操作员（留空表示全部）")
+    with col3:
+        passed_label = st.selectbox("判定", ["全部", "合格", "不合格"])
+    with col4:
+        days = st.number_input("最近天数", min_value=1, value=7, step=1)
+    
+    measurement_type = {"全部": None, "圆形": "circle", "矩形": "rectangle"}[type_label]
+    passed = {"全部": None, "合格": True, "不合格": False}[passed_label]
+    since = datetime.now() - timedelta(days=days)
+    filters = dict(measurement_type=measurement_type, operator=operator or None, passed=passed, since=since)
+    
+    total = store.count(**filters)
+    records = store.query(limit=500, **filters)
+    st.write(f"共 {total} 条记录" + (f"，显示最近 {len(records)} 条" if total > len(records) else ""))
+    if not records:
+        return
+    
+    rows = []
+    for record in records:
+        row = {
+            "编号": record['id'],
+            "时间": datetime.fromtimestamp(record['created_at']).strftime("%Y-%m-%d %H:%M:%S"),
+            "类型": "圆形" if record['measurement_type'] == 'circle' else "矩形",
+            "操作员": record['operator'] or "",
+            "判定": "" if record['passed'] is None else ("合格" if record['passed'] else "不合格")
+        }
+        data = record['data']
+        if record['measurement_type'] == 'circle':
+            row["尺寸 (mm)"] = f"R {data.get('measured_radius', 0):.2f}"
+        else:
+            row["尺寸 (mm)"] = f"{data.get('measured_width', 0):.2f} x {data.get('measured_height', 0):.2f}"
+        rows.append(row)
+    st.dataframe(rows, use_container_width=True)
+    
+    # 查看结果图像
+    record_ids = [record['id'] for record in records if record['image_sha1']]
+    if record_ids:
+        record_id = st.selectbox("查看结果图像", record_ids)
+        record = next(record for record in records if record['id'] == record_id)
+        image_data = store.get_blob(record['image_sha1'])
+        if image_data is not None:
+            st.image(image_data, caption=f"记录 {record_id}", use_column_width=True)
+
+# 统计特征的显示名称
+FEATURE_LABELS = {'radius': "半径", 'width': "长度", 'height': "宽度"}
+
+# 统计页面（基于增量维护的聚合数据，不读取逐条记录）
+def statistics_page():
+    # 检查用户是否已登录
+    if not is_authenticated():
+        st.warning("请先登录系统！")
+        st.session_state.app_mode = "首页"
+        st.experimental_rerun()
+        return
+    
+    st.header("统计过程控制")
+    store = get_results_store()
+    series = store.spc_series()
+    if not series:
+        st.info("暂无已保存的测量结果")
+        return
+    
+    # 选择统计分组：测量类型 + 特征 + 标称尺寸
+    labels = [f"{'圆形' if t == 'circle' else '矩形'} {FEATURE_LABELS.get(f, f)} 标称 {n:.2f} mm（共 {c} 次）"
+              for t, f, n, c in series]
+    index = st.selectbox("统计对象", range(len(series)), format_func=lambda i: labels[i])
+    measurement_type, feature, nominal, _ = series[index]
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        days = st.number_input("最近天数", min_value=1, value=30, step=1)
+    with col2:
+        tolerance = st.number_input("公差 (±%)", min_value=0.01, value=1.0, step=0.1)
+    
+    since = datetime.now() - timedelta(days=days)
+    buckets = store.spc_buckets(measurement_type, feature, nominal, since=since)
+    if not buckets:
+        st.info("所选时间范围内没有测量结果")
+        return
+    
+    # 总体统计与过程能力
+    total = merge_buckets(buckets)
+    lower_limit = nominal * (1 - tolerance / 100)
+    upper_limit = nominal * (1 + tolerance / 100)
+    cp, cpk = total.capability(lower_limit, upper_limit)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("测量次数", f"{total.count}")
+        st.metric("合格率", f"{total.passed / total.count * 100:.1f}%")
+    with col2:
+        st.metric("均值 (mm)", f"{total.mean:.3f}")
+        st.metric("平均误差 (%)", f"{(total.mean - nominal) / nominal * 100:.2f}")
+    with col3:
+        st.metric("标准差 (mm)", f"{total.std:.4f}")
+        st.metric("范围 (mm)", f"{total.min:.3f} ~ {total.max:.3f}")
+    with col4:
+        st.metric("Cp", "-" if cp is None else f"{cp:.2f}")
+        st.metric("Cpk", "-" if cpk is None else f"{cpk:.2f}")
+    st.caption(f"规格限: {lower_limit:.3f} ~ {upper_limit:.3f} mm")
+    
+    # 趋势：时间范围较长时按天合并，否则按小时显示
+    period = 86400 if days > 2 else 3600
+    trend = merge_buckets(buckets, period, utc_offset=datetime.now().astimezone().utcoffset().total_seconds())
+    index = pd.to_datetime([datetime.fromtimestamp(start) for start, _ in trend])
+    st.subheader("均值趋势 (mm)")
+    st.line_chart(pd.DataFrame({
+        "均值": [stats.mean for _, stats in trend],
+        "上限": upper_limit,
+        "下限": lower_limit
+    }, index=index))
+    st.subheader("误差趋势 (%)")
+    st.line_chart(pd.DataFrame({
+        "平均误差": [(stats.mean - nominal) / nominal * 100 for _, stats in trend],
+        "标准差": [stats.std / nominal * 100 for _, stats in trend]
+    }, index=index))
+
 # 运行应用
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,258 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+
+# 导入图像处理模块
+from image_processing import analyze_circle, analyze_rectangle, set_strategy_workers
+from preprocess_cache import preprocess_cache
+from strategy_stats import StrategyStats
+from calibration_store import CalibrationStore, DEFAULT_PROFILE
+from stage_timer import stage_timer, TimingStats
+
+# 获取当前脚本的绝对路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 默认标定数据文件
+DEFAULT_CALIBRATION_FILE = os.path.join(current_dir, 'calibration', 'calibration_data.json')
+
+# 支持的图片格式
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# 输出字段
+CIRCLE_FIELDS = ['path', 'success', 'measured_radius', 'expected_radius', 'error_percentage', 'confidence',
+                 'elapsed_ms', 'error']
+RECTANGLE_FIELDS = ['path', 'success', 'measured_width', 'measured_height', 'expected_width', 'expected_height',
+                    'width_error_percentage', 'height_error_percentage', 'confidence', 'method', 'elapsed_ms', 'error']
+
+# 收集待测量的图片路径
+def collect_images(pattern):
+    """
+    收集待测量的图片
+
+    参数:
+        pattern: 目录路径或glob通配符
+
+    返回:
+        排序后的图片路径列表
+    """
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+# 加载标定数据
+def load_calibration(calibration_file, profile=DEFAULT_PROFILE):
+    store = CalibrationStore(calibration_file)
+    data = store.load_profile(profile)
+    if store.corrupt_backup:
+        print(f"标定数据文件已损坏，已备份为 {store.corrupt_backup}", file=sys.stderr)
+    return data
+
+# 工作进程初始化
+def _init_worker(stage_timing=False):
+    # 批量测量中每张图片只处理一次，预处理缓存只会占用内存
+    preprocess_cache.enabled = False
+    stage_timer.enabled = stage_timing
+    # 进程数已与CPU核数相当，进程内不再开线程：OpenCV单线程运算，二值化方法按顺序执行
+    cv2.setNumThreads(1)
+    set_strategy_workers(1)
+
+# 在工作进程中测量单张图片
+def measure_file(path, measurement_type, calibration, expected=None, pyramid=False):
+    """
+    读取并测量单张图片（在工作进程中运行）
+
+    参数:
+        path: 图片路径
+        measurement_type: 'circle' 或 'rectangle'
+        calibration: 对应类型的标定数据字典
+        expected: 期望尺寸字典 (可选)
+        pyramid: 是否使用由粗到精的金字塔检测
+
+    返回:
+        结果行字典
+    """
+    start_time = time.perf_counter()
+    row = {'path': path, 'success': False, 'error': ''}
+    expected = expected or {}
+    try:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError('无法读取图片')
+        # 图像处理函数使用RGB格式
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        # 只需要数值结果，使用纯计算接口，不生成标注图像
+        if measurement_type == 'circle':
+            result = analyze_circle(image, calibration['pixels_per_mm'], pyramid=pyramid)
+            row['success'] = result.success
+            if result.success:
+                measured_radius = result.measured_radius
+                row['measured_radius'] = measured_radius
+                if expected.get('radius'):
+                    row['expected_radius'] = expected['radius']
+                    row['error_percentage'] = (measured_radius - expected['radius']) / expected['radius'] * 100
+        else:
+            # 优先使用标定时的二值化方法，其余方法按标定数据中保存的统计排序（工作进程中不回写统计）
+            result = analyze_rectangle(image, calibration['pixels_per_mm_width'], calibration['pixels_per_mm_height'],
+                                       pyramid=pyramid, strategy_stats=StrategyStats.from_calibration(calibration),
+                                       calibrated_method=calibration.get('method'))
+            row['success'] = result.success
+            row['method'] = result.method
+            if result.success:
+                measured_width, measured_height = result.measured_width, result.measured_height
+                row['measured_width'] = measured_width
+                row['measured_height'] = measured_height
+                if expected.get('width') and expected.get('height'):
+                    row['expected_width'] = expected['width']
+                    row['expected_height'] = expected['height']
+                    row['width_error_percentage'] = (measured_width - expected['width']) / expected['width'] * 100
+                    row['height_error_percentage'] = (measured_height - expected['height']) / expected['height'] * 100
+        row['confidence'] = result.confidence
+        if stage_timer.enabled:
+            row['timings'] = result.timings
+        if not row['success']:
+            row['error'] = '未能检测到圆形' if measurement_type == 'circle' else '未能检测到矩形'
+    except Exception as e:
+        row['error'] = str(e)
+    row['elapsed_ms'] = (time.perf_counter() - start_time) * 1000
+    return row
+
+class ResultWriter:
+    """按输出文件扩展名流式写出结果行（.csv 或 .jsonl）"""
+    def __init__(self, output_path, fields):
+        self.fields = fields
+        self.is_jsonl = output_path.lower().endswith(('.jsonl', '.json'))
+        if output_path == '-':
+            self.file = sys.stdout
+        else:
+            self.file = open(output_path, 'w', newline='', encoding='utf-8')
+        if not self.is_jsonl:
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=fields, extrasaction='ignore')
+            self.csv_writer.writeheader()
+
+    def write(self, row):
+        if self.is_jsonl:
+            self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        else:
+            self.csv_writer.writerow(row)
+        # 每行立即落盘，便于中途查看进度
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+# 批量测量
+def run_batch(paths, measurement_type, calibration, output_path, workers=None, expected=None, progress=None,
+              pyramid=False, timing_stats=None):
+    """
+    使用进程池并行测量多张图片，每完成一张立即写出一行结果
+
+    参数:
+        paths: 图片路径列表
+        measurement_type: 'circle' 或 'rectangle'
+        calibration: 对应类型的标定数据字典
+        output_path: 输出文件路径（.csv / .jsonl，'-'表示标准输出）
+        workers: 工作进程数，默认为CPU核心数
+        expected: 期望尺寸字典 (可选)
+        progress: 进度回调函数 progress(done, total, row) (可选)
+        pyramid: 是否使用由粗到精的金字塔检测
+        timing_stats: TimingStats实例 (可选)，提供时在工作进程中开启分阶段计时并汇总到其中
+
+    返回:
+        (成功数量, 总数量)
+    """
+    workers = workers or os.cpu_count() or 1
+    fields = CIRCLE_FIELDS if measurement_type == 'circle' else RECTANGLE_FIELDS
+    writer = ResultWriter(output_path, fields)
+    done_count = 0
+    success_count = 0
+    # 限制同时提交的任务数量，避免成千上万个任务一次性进入队列
+    max_pending = workers * 4
+    path_iter = iter(paths)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(timing_stats is not None,)) as executor:
+            pending = set()
+            while True:
+                for path in path_iter:
+                    pending.add(executor.submit(measure_file, path, measurement_type, calibration, expected, pyramid))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    row = future.result()
+                    writer.write(row)
+                    if timing_stats is not None and 'timings' in row:
+                        timing_stats.add({name[:-3]: value for name, value in row['timings'].items()})
+                    done_count += 1
+                    if row['success']:
+                        success_count += 1
+                    if progress is not None:
+                        progress(done_count, len(paths), row)
+    finally:
+        writer.close()
+    return success_count, done_count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量测量文件夹中的零件图片")
+    parser.add_argument('images', help="图片目录或glob通配符，例如 'dump/*.jpg'")
+    parser.add_argument('--type', choices=['circle', 'rectangle'], required=True, help="测量类型")
+    parser.add_argument('--calibration', default=DEFAULT_CALIBRATION_FILE, help="标定数据文件")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, help="标定配置名称（相机/工位）")
+    parser.add_argument('--output', '-o', default='-', help="输出文件 (.csv 或 .jsonl)，默认输出到标准输出")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认为CPU核心数")
+    parser.add_argument('--expected-radius', type=float, help="期望半径 (mm)")
+    parser.add_argument('--expected-width', type=float, help="期望长度 (mm)")
+    parser.add_argument('--expected-height', type=float, help="期望宽度 (mm)")
+    parser.add_argument('--pyramid', action='store_true', help="使用由粗到精的金字塔检测（适合高分辨率图像）")
+    parser.add_argument('--timings', action='store_true',
+                        help="记录各处理阶段的耗时，结束时输出汇总（.jsonl输出中每行附带耗时明细）")
+    args = parser.parse_args(argv)
+
+    paths = collect_images(args.images)
+    if not paths:
+        print(f"未找到图片: {args.images}", file=sys.stderr)
+        return 1
+
+    calibration = load_calibration(args.calibration, args.profile)[args.type]
+    if args.type == 'circle' and not calibration.get('pixels_per_mm'):
+        print("请先进行圆形标定！", file=sys.stderr)
+        return 1
+    if args.type == 'rectangle' and not calibration.get('pixels_per_mm_width'):
+        print("请先进行矩形标定！", file=sys.stderr)
+        return 1
+    if calibration.get('geometry_corrected'):
+        # 比例属于几何校正后的摄像头坐标，用于未校正的图片会随相机倾斜产生误差
+        print("该标定配置是在几何校正后的摄像头画面上标定的，不能用于图片文件，请另建配置并用图片标定", file=sys.stderr)
+        return 1
+
+    expected = {'radius': args.expected_radius, 'width': args.expected_width, 'height': args.expected_height}
+
+    def progress(done, total, row):
+        if done % 100 == 0 or done == total:
+            print(f"已完成 {done}/{total}", file=sys.stderr)
+
+    timing_stats = TimingStats() if args.timings else None
+    start_time = time.perf_counter()
+    success_count, total = run_batch(paths, args.type, calibration, args.output, args.workers, expected, progress,
+                                     args.pyramid, timing_stats)
+    elapsed = time.perf_counter() - start_time
+    print(f"完成: {success_count}/{total} 张测量成功，用时 {elapsed:.1f} 秒", file=sys.stderr)
+    if timing_stats is not None:
+        print(timing_stats.format(), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+# 导入图像处理模块
+import image_processing
+from image_processing import calibrate_circle, calibrate_rectangle, measure_circle, measure_rectangle
+from preprocess_cache import preprocess_cache
+from synthetic_images import make_part_image, measurement_error
+
+# 测试分辨率 (宽, 高)
+RESOLUTIONS = {
+    'VGA': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '12MP': (4000, 3000)
+}
+
+# 拍摄条件：传给make_part_image的参数
+SCENARIOS = {
+    'clean': {},
+    'rotated': {'rotation': 17.0},
+    'noisy': {'noise': 8.0, 'blur': 1.2},
+    'shadow': {'shadow': 0.6, 'lighting': 0.3},
+    'red': {'red_region': True}
+}
+
+# 标定物和被测零件的尺寸(mm)：圆形为半径，矩形为 (长, 宽)
+CALIBRATION_SIZES = {'circle': 25.0, 'rectangle': (85.6, 54.0)}
+PART_SIZES = {'circle': 15.0, 'rectangle': (60.0, 40.0)}
+
+# 被测零件相对画面中心的偏移(mm)，避免零件总在画面正中
+PART_OFFSET_MM = (30.0, -20.0)
+
+# 被测函数名称
+FUNCTIONS = ['calibrate_circle', 'calibrate_rectangle', 'measure_circle', 'measure_rectangle']
+
+# 与基准比较时的默认容差
+LATENCY_TOLERANCE = 0.10    # p50耗时增加超过10%
+MEMORY_TOLERANCE = 0.10     # 内存峰值增加超过10%
+ERROR_TOLERANCE = 0.2       # 平均绝对误差增加超过0.2个百分点
+
+# 生成一个函数在某个拍摄条件下的测试用例
+def make_case(function, resolution, scenario, seed=0):
+    """
+    参数:
+        function: FUNCTIONS中的函数名称
+        resolution: 图像尺寸 (宽, 高)
+        scenario: SCENARIOS中的条件名称
+        seed: 随机数种子
+
+    返回:
+        (run, evaluate, image)：run()执行一次被测函数并返回其结果；
+        evaluate(结果)返回 (是否成功, 误差百分比字典)
+    """
+    shape = 'circle' if function.endswith('circle') else 'rectangle'
+    calibrating = function.startswith('calibrate')
+    size = CALIBRATION_SIZES[shape] if calibrating else PART_SIZES[shape]
+    offset = (0.0, 0.0) if calibrating else PART_OFFSET_MM
+    image, truth = make_part_image(shape, size, resolution, offset_mm=offset, seed=seed, **SCENARIOS[scenario])
+    ppm = truth['pixels_per_mm']
+
+    if function == 'calibrate_circle':
+        def run():
+            return calibrate_circle(image, truth['radius_mm'])
+
+        def evaluate(result):
+            # 标定误差：求得的像素/毫米比例与真实值的相对误差
+            return result[0], {'pixels_per_mm': (result[2] - ppm) / ppm * 100}
+    elif function == 'calibrate_rectangle':
+        def run():
+            return calibrate_rectangle(image, truth['width_mm'], truth['height_mm'])
+
+        def evaluate(result):
+            return result[0], {'pixels_per_mm_width': (result[2] - ppm) / ppm * 100,
+                               'pixels_per_mm_height': (result[3] - ppm) / ppm * 100}
+    elif function == 'measure_circle':
+        # 测量使用真实比例，误差只反映测量本身，不叠加标定误差
+        def run():
+            return measure_circle(image, ppm)
+
+        def evaluate(result):
+            return result[0], measurement_error(truth, {'radius': result[2]})
+    else:
+        # 与实际使用一致，优先使用在同一场景的标定图像上选中的二值化方法
+        calibration_image, _ = make_part_image('rectangle', CALIBRATION_SIZES['rectangle'], resolution, seed=seed,
+                                               **SCENARIOS[scenario])
+        method = calibrate_rectangle(calibration_image, *CALIBRATION_SIZES['rectangle'])[4]
+
+        def run():
+            return measure_rectangle(image, ppm, ppm, calibrated_method=method)
+
+        def evaluate(result):
+            return result[0], measurement_error(truth, {'width': result[2], 'height': result[3]})
+    return run, evaluate, image
+
+# 测量一次调用的Python/numpy内存峰值
+def _memory_peak(run):
+    """
+    返回:
+        调用期间新分配内存的峰值（字节）
+
+    注: tracemalloc只统计经Python和numpy分配的内存（包括OpenCV返回的数组），
+    不包括OpenCV内部的临时缓冲区。
+    """
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# 运行一个函数在一种分辨率下的基准测试
+def bench_function(function, resolution, scenarios, repeat=5, warmup=1):
+    """
+    参数:
+        function: FUNCTIONS中的函数名称
+        resolution: 图像尺寸 (宽, 高)
+        scenarios: 拍摄条件名称列表
+        repeat: 每个条件下计时的次数
+        warmup: 每个条件下计时前的预热次数
+
+    返回:
+        结果字典 {latency_ms: {p50, p90, p99, max}, memory_peak_mb, error: {mean_abs, max_abs}, failures, scenarios}
+    """
+    latencies = []
+    peaks = []
+    abs_errors = []
+    failures = 0
+    details = {}
+    for index, scenario in enumerate(scenarios):
+        run, evaluate, _ = make_case(function, resolution, scenario, seed=index)
+        for _ in range(warmup):
+            run()
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            result = run()
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        peaks.append(_memory_peak(run))
+
+        success, errors = evaluate(result)
+        if success:
+            abs_errors.extend(abs(value) for value in errors.values())
+        else:
+            failures += 1
+        details[scenario] = {'success': bool(success), 'error': errors if success else None}
+
+    latencies = np.array(latencies)
+    return {
+        'latency_ms': {
+            'p50': float(np.percentile(latencies, 50)),
+            'p90': float(np.percentile(latencies, 90)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max())
+        },
+        'memory_peak_mb': max(peaks) / (1024 * 1024),
+        'error': {
+            'mean_abs': float(np.mean(abs_errors)) if abs_errors else None,
+            'max_abs': float(np.max(abs_errors)) if abs_errors else None
+        },
+        'failures': failures,
+        'scenarios': details
+    }
+
+# 运行环境信息（与基准比较时提示环境差异）
+def environment():
+    return {
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'machine': platform.machine(),
+        'early_exit_confidence': image_processing.RECTANGLE_EARLY_EXIT_CONFIDENCE,
+        'preprocess_cache': preprocess_cache.enabled
+    }
+
+# 运行全部基准测试
+def run_benchmarks(functions, resolutions, scenarios, repeat=5, warmup=1, progress=None):
+    """
+    参数:
+        functions: 函数名称列表
+        resolutions: 分辨率名称列表（RESOLUTIONS的键）
+        scenarios: 拍摄条件名称列表
+        repeat: 每个条件下计时的次数
+        warmup: 预热次数
+        progress: 进度回调 progress(键) (可选)
+
+    返回:
+        报告字典 {environment, created_at, results: {"函数@分辨率": 结果}}
+    """
+    report = {'environment': environment(), 'created_at': time.time(), 'results': {}}
+    for resolution in resolutions:
+        for function in functions:
+            key = f"{function}@{resolution}"
+            if progress:
+                progress(key)
+            report['results'][key] = bench_function(function, RESOLUTIONS[resolution], scenarios, repeat, warmup)
+    return report
+
+# 与基准报告比较
+def compare(report, baseline, latency_tolerance=LATENCY_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE,
+            error_tolerance=ERROR_TOLERANCE):
+    """
+    返回:
+        字典 {"函数@分辨率": 问题列表}，列表为空表示没有退化；基准中没有的项目不比较
+    """
+    regressions = {}
+    for key, current in report['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        problems = []
+        if current['latency_ms']['p50'] > base['latency_ms']['p50'] * (1 + latency_tolerance):
+            problems.append(f"p50耗时 {base['latency_ms']['p50']:.1f} -> {current['latency_ms']['p50']:.1f} ms")
+        if current['memory_peak_mb'] > base['memory_peak_mb'] * (1 + memory_tolerance):
+            problems.append(f"内存峰值 {base['memory_peak_mb']:.1f} -> {current['memory_peak_mb']:.1f} MB")
+        if current['failures'] > base['failures']:
+            problems.append(f"检测失败 {base['failures']} -> {current['failures']}")
+        base_error = base['error']['mean_abs']
+        current_error = current['error']['mean_abs']
+        if base_error is not None and current_error is not None and current_error > base_error + error_tolerance:
+            problems.append(f"平均误差 {base_error:.2f}% -> {current_error:.2f}%")
+        regressions[key] = problems
+    return regressions
+
+# 格式化百分比变化
+def _change(current, base):
+    if base is None or current is None or base == 0:
+        return ''
+    return f"({(current - base) / base * 100:+.0f}%)"
+
+# 格式化报告表格
+def format_report(report, baseline=None, regressions=None):
+    """
+    返回:
+        文本表格，提供基准时每个数值后附带相对基准的变化，退化的项目标记为"退化"
+    """
+    header = f"{'函数@分辨率':<28}{'p50(ms)':>16}{'p90(ms)':>16}{'p99(ms)':>10}{'内存(MB)':>16}" \
+             f"{'平均误差%':>10}{'最大误差%':>10}{'失败':>6}  状态"
+    lines = [header, '-' * len(header)]
+    for key, result in report['results'].items():
+        base = baseline['results'].get(key) if baseline else None
+        latency = result['latency_ms']
+        error = result['error']
+        p50 = f"{latency['p50']:.1f}{_change(latency['p50'], base and base['latency_ms']['p50'])}"
+        p90 = f"{latency['p90']:.1f}{_change(latency['p90'], base and base['latency_ms']['p90'])}"
+        memory = f"{result['memory_peak_mb']:.1f}{_change(result['memory_peak_mb'], base and base['memory_peak_mb'])}"
+        mean_error = '-' if error['mean_abs'] is None else f"{error['mean_abs']:.2f}"
+        max_error = '-' if error['max_abs'] is None else f"{error['max_abs']:.2f}"
+        if regressions is None or key not in regressions:
+            status = ''
+        else:
+            status = '退化: ' + '; '.join(regressions[key]) if regressions[key] else 'OK'
+        lines.append(f"{key:<28}{p50:>16}{p90:>16}{latency['p99']:>10.1f}{memory:>16}"
+                     f"{mean_error:>10}{max_error:>10}{result['failures']:>6}  {status}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量流程基准测试（合成图像）")
+    parser.add_argument('--resolutions', default=','.join(RESOLUTIONS),
+                        help=f"分辨率，逗号分隔（可选: {', '.join(RESOLUTIONS)}）")
+    parser.add_argument('--functions', default=','.join(FUNCTIONS), help="被测函数，逗号分隔")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"拍摄条件，逗号分隔（可选: {', '.join(SCENARIOS)}）")
+    parser.add_argument('--repeat', type=int, default=5, help="每个条件下计时的次数")
+    parser.add_argument('--warmup', type=int, default=1, help="计时前的预热次数")
+    parser.add_argument('--cache', action='store_true',
+                        help="启用预处理缓存（默认关闭，否则重复处理同一图像只测到缓存命中的耗时）")
+    parser.add_argument('--output', help="把报告保存为JSON文件，可作为以后比较的基准")
+    parser.add_argument('--baseline', help="与基准报告(JSON)比较，有退化时返回非零退出码")
+    parser.add_argument('--latency-tolerance', type=float, default=LATENCY_TOLERANCE, help="允许的耗时增加比例")
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE, help="允许的内存峰值增加比例")
+    parser.add_argument('--error-tolerance', type=float, default=ERROR_TOLERANCE, help="允许的平均误差增加（百分点）")
+    args = parser.parse_args(argv)
+
+    functions = [name for name in args.functions.split(',') if name]
+    resolutions = [name for name in args.resolutions.split(',') if name]
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    for name, choices in ((functions, FUNCTIONS), (resolutions, RESOLUTIONS), (scenarios, SCENARIOS)):
+        unknown = [item for item in name if item not in choices]
+        if unknown:
+            parser.error(f"未知的选项: {', '.join(unknown)}")
+
+    preprocess_cache.enabled = args.cache
+    report = run_benchmarks(functions, resolutions, scenarios, args.repeat, args.warmup,
+                            progress=lambda key: print(f"运行 {key} ...", file=sys.stderr))
+
+    baseline = None
+    regressions = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.latency_tolerance, args.memory_tolerance, args.error_tolerance)
+        changed = [name for name, value in report['environment'].items() if baseline['environment'].get(name) != value]
+        if changed:
+            print(f"注意: 运行环境与基准不同（{', '.join(changed)}），耗时比较仅供参考", file=sys.stderr)
+
+    print(format_report(report, baseline, regressions))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if regressions and any(regressions.values()):
+        print(f"\n{sum(1 for problems in regressions.values() if problems)} 项相对基准退化", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import copy
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:
+    # Windows没有fcntl，使用msvcrt加锁
+    fcntl = None
+    import msvcrt
+
+# 默认标定配置名称
+DEFAULT_PROFILE = 'default'
+
+# 标定数据文件格式版本
+STORE_VERSION = 2
+
+# 每个配置保留的标定历史条数
+MAX_HISTORY = 50
+
+# 新建配置默认的摄像头采集分辨率 (宽, 高)
+DEFAULT_RESOLUTION = [640, 480]
+
+# 新建配置的空标定数据
+def empty_profile(camera_id=0, station='', resolution=None):
+    return {
+        'camera_id': camera_id,
+        'station': station,
+        'resolution': list(resolution or DEFAULT_RESOLUTION),
+        'circle': {'radius': 0, 'pixels_per_mm': 0},
+        'rectangle': {'width': 0, 'height': 0, 'pixels_per_mm_width': 0, 'pixels_per_mm_height': 0},
+        'custom': [],
+        'history': []
+    }
+
+# 旧版格式（顶层直接是circle/rectangle/custom）迁移为多配置格式
+def migrate(data):
+    """
+    参数:
+        data: 从文件读取的字典
+
+    返回:
+        新版格式的字典 {version, profiles: {名称: 配置}}
+    """
+    if data.get('version') == STORE_VERSION and 'profiles' in data:
+        return data
+    profile = empty_profile()
+    for key in ('circle', 'rectangle', 'custom'):
+        if key in data:
+            profile[key] = data[key]
+    return {'version': STORE_VERSION, 'profiles': {DEFAULT_PROFILE: profile}}
+
+class CalibrationStore:
+    """标定配置存储
+
+    一个文件中保存多个命名的标定配置（按相机/工位区分），每个配置包含圆形、矩形标定数据和标定历史。
+    读取时按文件的修改时间缓存，文件未变化时不重新解析；写入时先获取文件锁，重新读取最新内容，
+    修改后写入临时文件再原子替换，多个会话同时标定也不会互相覆盖或写坏文件。
+    """
+    def __init__(self, path):
+        """
+        参数:
+            path: 标定数据文件路径
+        """
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock = Lock()
+        self._cache = None
+        self._cache_stamp = None
+        # 损坏的标定文件被移走后的备份路径（没有时为None），供界面和命令行提示用户
+        self.corrupt_backup = None
+
+    def _stamp(self):
+        """文件的版本标记（修改时间、大小和inode），文件不存在时返回None"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read(self):
+        """读取文件内容（文件未变化时直接返回缓存）"""
+        with self._lock:
+            stamp = self._stamp()
+            if self._cache is not None and stamp == self._cache_stamp:
+                return self._cache
+            if stamp is None:
+                data = migrate({})
+            else:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if not isinstance(data, dict):
+                        raise ValueError("标定数据不是JSON对象")
+                    data = migrate(data)
+                except ValueError:
+                    # 文件内容损坏（写入总是原子替换，正常情况下不会出现）：先移到备份文件再按空配置处理，
+                    # 否则下一次保存会覆盖文件，原有的所有配置都无法找回
+                    data = migrate({})
+                    stamp = self._move_corrupt()
+            self._cache = data
+            self._cache_stamp = stamp
+            return data
+
+    def _move_corrupt(self):
+        """把损坏的标定文件改名为带时间的.corrupt备份，返回改名后原路径的版本标记"""
+        backup = f"{self.path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+        try:
+            os.replace(self.path, backup)
+            self.corrupt_backup = backup
+        except FileNotFoundError:
+            # 其他进程已经移走了该文件
+            pass
+        return self._stamp()
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的排他文件锁"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        with open(self.lock_path, 'a+') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                # msvcrt.LK_LOCK最多重试10秒，超时抛出OSError
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _write(self, data):
+        """写入临时文件后原子替换（需持有文件锁）"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._cache = data
+            self._cache_stamp = self._stamp()
+
+    def update(self, func):
+        """
+        在文件锁保护下读取-修改-写入
+
+        参数:
+            func: 函数 func(data)，直接修改传入的字典
+
+        返回:
+            func的返回值
+        """
+        with self._file_lock():
+            # 加锁后绕过缓存重新读取，拿到其他进程的最新修改
+            with self._lock:
+                self._cache = None
+            data = copy.deepcopy(self._read())
+            result = func(data)
+            self._write(data)
+            return result
+
+    # 配置读取
+    def profile_names(self):
+        """所有配置名称（默认配置排在最前）"""
+        names = sorted(self._read()['profiles'])
+        if DEFAULT_PROFILE in names:
+            names.remove(DEFAULT_PROFILE)
+        return [DEFAULT_PROFILE] + names
+
+    def load_profile(self, name=DEFAULT_PROFILE):
+        """
+        读取一个标定配置
+
+        参数:
+            name: 配置名称
+
+        返回:
+            配置字典的副本 {camera_id, station, resolution, circle, rectangle, custom, history}，
+            配置不存在时返回空配置
+        """
+        profile = self._read()['profiles'].get(name)
+        if profile is None:
+            return empty_profile()
+        profile = copy.deepcopy(profile)
+        # 早期创建的配置没有分辨率字段
+        profile.setdefault('resolution', list(DEFAULT_RESOLUTION))
+        return profile
+
+    # 配置修改
+    def create_profile(self, name, camera_id=0, station='', resolution=None):
+        """新建空的标定配置（已存在时不修改）"""
+        def apply(data):
+            data['profiles'].setdefault(name, empty_profile(camera_id, station, resolution))
+        self.update(apply)
+
+    def delete_profile(self, name):
+        """删除标定配置（默认配置不能删除）"""
+        if name == DEFAULT_PROFILE:
+            raise ValueError("默认标定配置不能删除")
+
+        def apply(data):
+            data['profiles'].pop(name, None)
+        self.update(apply)
+
+    def save_profile(self, name, profile):
+        """整体保存一个标定配置（标定历史以文件中的为准）"""
+        def apply(data):
+            current = data['profiles'].get(name, empty_profile())
+            saved = copy.deepcopy(profile)
+            saved['history'] = current.get('history', [])
+            data['profiles'][name] = saved
+        self.update(apply)
+
+    def set_camera(self, name, camera_id, resolution):
+        """修改配置使用的摄像头编号和采集分辨率"""
+        def apply(data):
+            profile = data['profiles'].setdefault(name, empty_profile())
+            profile['camera_id'] = camera_id
+            profile['resolution'] = list(resolution)
+        self.update(apply)
+
+    def update_section(self, name, calibration_type, values):
+        """
+        只更新配置中的一部分标定数据（不记录历史），如矩形检测的方法统计
+
+        参数:
+            name: 配置名称
+            calibration_type: 'circle' / 'rectangle'
+            values: 要更新的字段字典
+        """
+        def apply(data):
+            profile = data['profiles'].setdefault(name, empty_profile())
+            profile[calibration_type].update(values)
+        self.update(apply)
+
+    def record_calibration(self, name, calibration_type, values, operator=None):
+        """
+        保存一次标定结果并记入标定历史
+
+        参数:
+            name: 配置名称
+            calibration_type: 'circle' / 'rectangle' / 'geometry'（相机几何标定的摘要，映射表另存）
+            values: 标定数据字典，如 {'radius': 12.5, 'pixels_per_mm': 9.8}
+            operator: 操作员 (可选)
+        """
+        def apply(data):
+            profile = data['profiles'].setdefault(name, empty_profile())
+            profile.setdefault(calibration_type, {}).update(values)
+            history = profile.setdefault('history', [])
+            history.append({
+                'time': time.time(),
+                'type': calibration_type,
+                'operator': operator,
+                'values': values
+            })
+            del history[:-MAX_HISTORY]
+        self.update(apply)
@@ -0,0 +1,532 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+
+import cv2
+import numpy as np
+
+# 相机几何标定数据目录，每个摄像头/分辨率一个文件
+GEOMETRY_DIR = os.path.join('calibration', 'geometry')
+
+# 默认棋盘格内角点数 (每行, 每列)
+DEFAULT_PATTERN = (9, 6)
+
+# A4纸尺寸（毫米，横向）
+A4_SIZE_MM = (297.0, 210.0)
+
+# 估计镜头畸变至少需要的棋盘格图像数（不同角度拍摄）
+MIN_DISTORTION_VIEWS = 3
+
+# 校正后画面的最大尺寸（相对原图的倍数），透视很强时避免生成过大的映射表
+MAX_OUTPUT_SCALE = 2
+
+# 亚像素角点优化的终止条件
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+# 同时保留的已加载几何标定数：每个几何标定的轮廓点映射表约为 宽×高×8 字节（2592x1944时约40MB），
+# 只保留正在使用的标定配置对应的摄像头，多工位同时使用时按最近使用淘汰
+MAX_LOADED_GEOMETRIES = 2
+
+# 已加载的几何标定：{文件路径: (文件版本标记, CameraGeometry)}，按最近使用排序
+_loaded = OrderedDict()
+_loaded_lock = Lock()
+
+class CameraGeometry:
+    """相机几何校正（镜头畸变 + 透视）
+
+    把原图像素坐标映射到测量平面上的"校正坐标"：先去除镜头畸变，再用单应矩阵把测量平面
+    变换为正视图。校正坐标的单位仍是像素，比例约等于标定时测量平面上的像素/毫米，
+    因此圆形/矩形标定得到的像素/毫米比例在整个画面内都一致。
+
+    两种映射表都在首次使用时计算：
+    - point_map：原图每个像素对应的校正坐标，用于只校正检测到的轮廓点（查表，几乎没有开销）。
+      体积较大（宽×高×8字节），不保存到文件，加载后由标定参数重新计算
+    - remap_tables：cv2.remap使用的映射表，用于把整帧图像变换为校正后的正视图（显示用）。
+      随标定数据一起保存，加载时不读取，第一次预览时才从文件读取
+    """
+    def __init__(self, size, homography, pixels_per_mm, output_size=None, camera_matrix=None, dist_coeffs=None,
+                 method='', rms=None, remap_tables=None, source_path=None):
+        """
+        参数:
+            size: 原图尺寸 (宽, 高)
+            homography: 3x3单应矩阵，去畸变后的像素坐标 -> 校正坐标
+            pixels_per_mm: 校正坐标中测量平面的像素/毫米比例
+            output_size: 校正后画面的尺寸 (宽, 高)，默认与原图相同
+            camera_matrix: 相机内参矩阵，为None时不校正镜头畸变
+            dist_coeffs: 畸变系数
+            method: 标定方法 'checkerboard' 或 'a4'
+            rms: 棋盘格标定的重投影误差（像素）
+            remap_tables: 预先计算的整帧映射表 (map1, map2) (可选)
+            source_path: 保存了整帧映射表的文件 (可选)，第一次使用remap_tables时读取
+        """
+        self.size = (int(size[0]), int(size[1]))
+        self.homography = np.asarray(homography, dtype=np.float64)
+        self.pixels_per_mm = float(pixels_per_mm)
+        self.output_size = tuple(int(v) for v in output_size) if output_size is not None else self.size
+        self.camera_matrix = None if camera_matrix is None else np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeffs = None if dist_coeffs is None else np.asarray(dist_coeffs, dtype=np.float64)
+        self.method = method
+        self.rms = rms
+        self.source_path = source_path
+        self._point_map = None
+        self._remap_tables = remap_tables
+        # 映射表在测量线程和界面线程中都可能首次使用，只计算一次
+        self._tables_lock = Lock()
+
+    def applies_to(self, image_shape):
+        """图像分辨率是否与标定时一致"""
+        return tuple(image_shape[:2]) == (self.size[1], self.size[0])
+
+    def transform(self, points):
+        """
+        直接计算点的校正坐标（不查表，用于生成映射表和少量点）
+
+        参数:
+            points: (N, 2) 或 (N, 1, 2) 原图坐标
+
+        返回:
+            (N, 1, 2) float32 校正坐标
+        """
+        return _forward(points, self.camera_matrix, self.dist_coeffs, self.homography)
+
+    @property
+    def point_map(self):
+        """原图每个像素的校正坐标 (高, 宽, 2) float32，首次使用时计算"""
+        with self._tables_lock:
+            if self._point_map is None:
+                width, height = self.size
+                xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+                grid = np.stack([xs.ravel(), ys.ravel()], axis=1)
+                self._point_map = self.transform(grid).reshape(height, width, 2)
+            return self._point_map
+
+    @property
+    def remap_tables(self):
+        """cv2.remap使用的定点映射表 (map1, map2)，校正坐标 -> 原图坐标，首次使用时读取或计算"""
+        with self._tables_lock:
+            if self._remap_tables is None:
+                self._remap_tables = self._load_remap_tables() or self._compute_remap_tables()
+            return self._remap_tables
+
+    def _load_remap_tables(self):
+        """从保存的文件中只读取整帧映射表，文件不存在或内容不对应时返回None"""
+        if self.source_path is None:
+            return None
+        try:
+            with np.load(self.source_path) as data:
+                if 'map1' not in data or tuple(data['output_size']) != self.output_size:
+                    return None
+                return data['map1'], data['map2']
+        except (OSError, ValueError):
+            return None
+
+    def _compute_remap_tables(self):
+        """计算整帧映射表"""
+        width, height = self.output_size
+        xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+        grid = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+        # 校正坐标 -> 去畸变的像素坐标
+        points = cv2.perspectiveTransform(grid, np.linalg.inv(self.homography))
+        if self.camera_matrix is not None:
+            # 再按畸变模型投影回原图：归一化坐标 (x, y, 1) 经projectPoints加上畸变
+            normalized = cv2.undistortPoints(points, self.camera_matrix, None)
+            object_points = cv2.convertPointsToHomogeneous(normalized).reshape(-1, 3)
+            points, _ = cv2.projectPoints(object_points, np.zeros(3), np.zeros(3), self.camera_matrix,
+                                          self.dist_coeffs)
+        points = points.reshape(height, width, 2).astype(np.float32)
+        # 转换为定点格式，remap时更快
+        return cv2.convertMaps(points, None, cv2.CV_16SC2)
+
+    def correct_points(self, points):
+        """
+        校正轮廓点，只对检测到的点查表，不需要变换整帧图像
+
+        参数:
+            points: 轮廓点 (N, 1, 2) 或 (N, 2)，整数坐标直接查表，小数坐标双线性插值
+
+        返回:
+            形状相同的float32校正坐标
+        """
+        points = np.asarray(points)
+        flat = points.reshape(-1, 2)
+        width, height = self.size
+        if np.issubdtype(flat.dtype, np.integer):
+            xs = np.clip(flat[:, 0], 0, width - 1)
+            ys = np.clip(flat[:, 1], 0, height - 1)
+            corrected = self.point_map[ys, xs]
+        else:
+            map_x = np.ascontiguousarray(flat[:, 0], dtype=np.float32).reshape(1, -1)
+            map_y = np.ascontiguousarray(flat[:, 1], dtype=np.float32).reshape(1, -1)
+            corrected = cv2.remap(self.point_map, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return corrected.reshape(points.shape[:-1] + (2,))
+
+    def warp(self, image):
+        """把整帧图像变换为校正后的正视图（显示和检查标定结果用）"""
+        map1, map2 = self.remap_tables
+        return cv2.remap(image, map1, map2, cv2.INTER_LINEAR)
+
+    def summary(self):
+        """返回标定信息字典（不含映射表）"""
+        return {
+            'method': self.method,
+            'size': list(self.size),
+            'output_size': list(self.output_size),
+            'pixels_per_mm': self.pixels_per_mm,
+            'rms': self.rms,
+            'distortion': self.camera_matrix is not None
+        }
+
+    def save(self, path):
+        """保存标定数据和整帧映射表（写入临时文件后原子替换）；轮廓点映射表可由标定参数重新计算，不保存"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        map1, map2 = self.remap_tables
+        arrays = {
+            'size': np.array(self.size),
+            'output_size': np.array(self.output_size),
+            'homography': self.homography,
+            'pixels_per_mm': np.array(self.pixels_per_mm),
+            'method': np.array(self.method),
+            'rms': np.array(np.nan if self.rms is None else self.rms),
+            'map1': map1,
+            'map2': map2
+        }
+        if self.camera_matrix is not None:
+            arrays['camera_matrix'] = self.camera_matrix
+            arrays['dist_coeffs'] = self.dist_coeffs
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """读取save保存的标定数据（不读取映射表）"""
+        with np.load(path) as data:
+            rms = float(data['rms'])
+            return cls(data['size'], data['homography'], float(data['pixels_per_mm']),
+                       output_size=data['output_size'],
+                       camera_matrix=data['camera_matrix'] if 'camera_matrix' in data else None,
+                       dist_coeffs=data['dist_coeffs'] if 'dist_coeffs' in data else None,
+                       method=str(data['method']), rms=None if np.isnan(rms) else rms,
+                       source_path=path)
+
+# 原图坐标 -> 校正坐标
+def _forward(points, camera_matrix, dist_coeffs, homography):
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+    if camera_matrix is not None:
+        # 去除镜头畸变，输出仍为像素坐标（P=相机内参）
+        points = cv2.undistortPoints(points, camera_matrix, dist_coeffs, P=camera_matrix)
+    return cv2.perspectiveTransform(points, homography).astype(np.float32)
+
+# 调整校正坐标的方向和原点
+def _align_homography(homography, size, camera_matrix=None, dist_coeffs=None):
+    """
+    旋转（必要时镜像）校正坐标，使画面的水平方向在校正后仍大致水平，
+    并平移使整个画面的校正坐标从(0, 0)开始
+
+    返回:
+        (调整后的单应矩阵, 校正后画面尺寸 (宽, 高))
+    """
+    width, height = size
+    center = np.array([width / 2, height / 2])
+    mapped = _forward([center, center + (1, 0), center + (0, 1)], camera_matrix, dist_coeffs,
+                      homography).reshape(3, 2)
+    ex, ey = mapped[1] - mapped[0], mapped[2] - mapped[0]
+    adjust = np.eye(3)
+    if ex[0] * ey[1] - ex[1] * ey[0] < 0:
+        # 角点顺序使坐标系镜像，翻转y轴
+        adjust = np.diag([1.0, -1.0, 1.0])
+        ex = np.array([ex[0], -ex[1]])
+    angle = np.arctan2(ex[1], ex[0])
+    cos, sin = np.cos(-angle), np.sin(-angle)
+    rotation = np.array([[cos, -sin, 0], [sin, cos, 0], [0, 0, 1]])
+    homography = rotation @ adjust @ homography
+
+    # 画面边界的校正坐标，平移到从(0, 0)开始
+    steps = np.linspace(0, 1, 50)
+    border = np.concatenate([
+        np.stack([steps * (width - 1), np.zeros_like(steps)], axis=1),
+        np.stack([steps * (width - 1), np.full_like(steps, height - 1)], axis=1),
+        np.stack([np.zeros_like(steps), steps * (height - 1)], axis=1),
+        np.stack([np.full_like(steps, width - 1), steps * (height - 1)], axis=1)
+    ])
+    mapped = _forward(border, camera_matrix, dist_coeffs, homography).reshape(-1, 2)
+    low, high = mapped.min(axis=0), mapped.max(axis=0)
+    translation = np.array([[1, 0, -low[0]], [0, 1, -low[1]], [0, 0, 1]])
+    output_size = (int(min(np.ceil(high[0] - low[0]) + 1, MAX_OUTPUT_SCALE * width)),
+                   int(min(np.ceil(high[1] - low[1]) + 1, MAX_OUTPUT_SCALE * height)))
+    return translation @ homography, output_size
+
+# 图像转灰度
+def _gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if len(image.shape) == 3 else image
+
+# 查找棋盘格角点
+def find_checkerboard(image, pattern_size=DEFAULT_PATTERN):
+    """
+    参数:
+        image: RGB或灰度图像
+        pattern_size: 内角点数 (每行, 每列)
+
+    返回:
+        亚像素精度的角点 (N, 1, 2) float32，按行排列；未找到时返回None
+    """
+    gray = _gray(image)
+    found, corners = cv2.findChessboardCorners(gray, pattern_size,
+                                               cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+
+# 用直线拟合精确求四边形的角点
+def _refine_quad(contour, corners):
+    """
+    对四边形每条边中间部分的轮廓点拟合直线，相邻两条直线的交点作为角点（亚像素精度）
+
+    参数:
+        contour: 轮廓点 (N, 1, 2)
+        corners: 近似角点 (4, 2)，按顺序排列
+
+    返回:
+        精确的角点 (4, 2)，某条边的点太少时返回原角点
+    """
+    points = contour.reshape(-1, 2).astype(np.float64)
+    lines = []
+    for i in range(4):
+        start, end = corners[i], corners[(i + 1) % 4]
+        direction = end - start
+        length_sq = float(direction @ direction)
+        if length_sq == 0:
+            return corners
+        relative = points - start
+        t = relative @ direction / length_sq
+        distance = np.abs(relative[:, 0] * direction[1] - relative[:, 1] * direction[0]) / np.sqrt(length_sq)
+        # 只用边的中间部分，避开圆角和角点附近的噪声
+        selected = points[(t > 0.1) & (t < 0.9) & (distance < max(3.0, 0.01 * np.sqrt(length_sq)))]
+        if len(selected) < 10:
+            return corners
+        vx, vy, x0, y0 = cv2.fitLine(selected.astype(np.float32), cv2.DIST_HUBER, 0, 0.01, 0.01).ravel()
+        lines.append((np.array([x0, y0]), np.array([vx, vy])))
+
+    refined = []
+    for i in range(4):
+        # 角点i是第i-1条边和第i条边的交点
+        (p1, d1), (p2, d2) = lines[i - 1], lines[i]
+        denominator = d1[0] * d2[1] - d1[1] * d2[0]
+        if abs(denominator) < 1e-9:
+            return corners
+        s = ((p2[0] - p1[0]) * d2[1] - (p2[1] - p1[1]) * d2[0]) / denominator
+        refined.append(p1 + s * d1)
+    return np.array(refined)
+
+# 查找A4纸的四个角
+def find_a4_corners(image, min_area_ratio=0.2):
+    """
+    在深色桌面上查找白色A4纸的四个角（纸的四条边都需要在画面内）
+
+    参数:
+        image: RGB或灰度图像
+        min_area_ratio: A4纸至少占画面面积的比例
+
+    返回:
+        角点 (4, 2) float64，顺序为左上、右上、右下、左下；未找到时返回None
+    """
+    gray = _gray(image)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    if not contours:
+        return None
+    contour = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(contour) < min_area_ratio * gray.shape[0] * gray.shape[1]:
+        return None
+    # 纸上的零件在阈值图中是孔洞，凸包把它们连同纸的边缘一起去掉
+    hull = cv2.convexHull(contour)
+    approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True).reshape(-1, 2)
+    if len(approx) != 4:
+        return None
+    # 按左上、右上、右下、左下排序
+    s = approx.sum(axis=1)
+    d = approx[:, 1] - approx[:, 0]
+    corners = np.array([approx[np.argmin(s)], approx[np.argmin(d)], approx[np.argmax(s)], approx[np.argmax(d)]],
+                       dtype=np.float64)
+    if len({tuple(c) for c in corners}) != 4:
+        return None
+    return _refine_quad(contour, corners)
+
+# 用A4纸标定透视
+def calibrate_a4(image, paper_size_mm=A4_SIZE_MM):
+    """
+    用画面中A4纸的四个角计算透视校正（单张图像无法估计镜头畸变）
+
+    参数:
+        image: 拍摄平放在测量位置的A4纸的图像
+        paper_size_mm: 纸张尺寸（毫米）
+
+    返回:
+        (CameraGeometry, 角点)，未找到A4纸时抛出ValueError
+    """
+    corners = find_a4_corners(image)
+    if corners is None:
+        raise ValueError("未找到A4纸的四个角，请确保整张纸在画面内且背景颜色较深")
+    tl, tr, br, bl = corners
+    horizontal = (np.linalg.norm(tr - tl) + np.linalg.norm(br - bl)) / 2
+    vertical = (np.linalg.norm(bl - tl) + np.linalg.norm(br - tr)) / 2
+    # 纸的长边对应297mm
+    long_mm, short_mm = max(paper_size_mm), min(paper_size_mm)
+    width_mm, height_mm = (long_mm, short_mm) if horizontal >= vertical else (short_mm, long_mm)
+    pixels_per_mm = (horizontal / width_mm + vertical / height_mm) / 2
+    target = np.array([[0, 0], [width_mm, 0], [width_mm, height_mm], [0, height_mm]]) * pixels_per_mm
+    homography = cv2.getPerspectiveTransform(corners.astype(np.float32), target.astype(np.float32))
+    size = (image.shape[1], image.shape[0])
+    homography, output_size = _align_homography(homography, size)
+    return CameraGeometry(size, homography, pixels_per_mm, output_size, method='a4'), corners
+
+# 用棋盘格标定镜头畸变和透视
+def calibrate_checkerboard(images, pattern_size=DEFAULT_PATTERN, square_mm=25.0):
+    """
+    参数:
+        images: 棋盘格图像列表（分辨率相同）。至少MIN_DISTORTION_VIEWS张不同角度的图像时估计镜头畸变；
+            最后一张图像中的棋盘格必须平放在测量平面上，用于计算透视校正
+        pattern_size: 内角点数 (每行, 每列)
+        square_mm: 方格边长（毫米）
+
+    返回:
+        (CameraGeometry, 找到角点的图像数)，最后一张图像中未找到棋盘格时抛出ValueError
+    """
+    if not images:
+        raise ValueError("没有棋盘格图像")
+    size = (images[0].shape[1], images[0].shape[0])
+    columns, rows = pattern_size
+    grid = np.zeros((columns * rows, 3), np.float32)
+    grid[:, :2] = np.mgrid[0:columns, 0:rows].T.reshape(-1, 2) * square_mm
+
+    image_points = []
+    plane_corners = None
+    for index, image in enumerate(images):
+        if (image.shape[1], image.shape[0]) != size:
+            raise ValueError("棋盘格图像的分辨率不一致")
+        corners = find_checkerboard(image, pattern_size)
+        if corners is not None:
+            image_points.append(corners)
+        if index == len(images) - 1:
+            plane_corners = corners
+    if plane_corners is None:
+        raise ValueError("最后一张图像（测量平面上的棋盘格）中未找到棋盘格角点")
+
+    camera_matrix = dist_coeffs = rms = None
+    if len(image_points) >= MIN_DISTORTION_VIEWS:
+        rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(
+            [grid] * len(image_points), image_points, size, None, None)
+
+    corners = plane_corners
+    if camera_matrix is not None:
+        corners = cv2.undistortPoints(plane_corners, camera_matrix, dist_coeffs, P=camera_matrix)
+    corners = corners.reshape(rows, columns, 2)
+    # 相邻角点的平均距离作为校正坐标的比例
+    spacing = np.concatenate([np.linalg.norm(np.diff(corners, axis=1), axis=2).ravel(),
+                              np.linalg.norm(np.diff(corners, axis=0), axis=2).ravel()]).mean()
+    pixels_per_mm = spacing / square_mm
+    homography, _ = cv2.findHomography(corners.reshape(-1, 2), grid[:, :2] * pixels_per_mm)
+    homography, output_size = _align_homography(homography, size, camera_matrix, dist_coeffs)
+    geometry = CameraGeometry(size, homography, pixels_per_mm, output_size, camera_matrix, dist_coeffs,
+                              method='checkerboard', rms=rms)
+    return geometry, len(image_points)
+
+# 几何标定文件路径
+def geometry_path(camera_id, resolution, directory=GEOMETRY_DIR):
+    return os.path.join(directory, f"camera{camera_id}_{int(resolution[0])}x{int(resolution[1])}.npz")
+
+# 保存几何标定
+def save_geometry(geometry, camera_id, directory=GEOMETRY_DIR):
+    """
+    按摄像头编号和分辨率保存，返回文件路径
+    """
+    path = geometry_path(camera_id, geometry.size, directory)
+    geometry.save(path)
+    return path
+
+# 读取几何标定（按文件修改时间缓存）
+def load_geometry(camera_id, resolution, directory=GEOMETRY_DIR):
+    """
+    返回:
+        CameraGeometry，该摄像头和分辨率没有几何标定时返回None
+    """
+    if resolution is None:
+        return None
+    path = geometry_path(camera_id, resolution, directory)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == stamp:
+            _loaded.move_to_end(path)
+            return cached[1]
+        geometry = CameraGeometry.load(path)
+        _loaded[path] = (stamp, geometry)
+        _loaded.move_to_end(path)
+        while len(_loaded) > MAX_LOADED_GEOMETRIES:
+            _loaded.popitem(last=False)
+        return geometry
+
+# 删除几何标定
+def delete_geometry(camera_id, resolution, directory=GEOMETRY_DIR):
+    path = geometry_path(camera_id, resolution, directory)
+    with _loaded_lock:
+        _loaded.pop(path, None)
+    if os.path.exists(path):
+        os.remove(path)
+
+# 读取图像文件（RGB）
+def _read_image(path):
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"无法读取图像: {path}")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="相机几何标定（镜头畸变和透视校正）")
+    parser.add_argument('method', choices=['a4', 'checkerboard'], help="标定方法")
+    parser.add_argument('images', nargs='+', help="标定图像；棋盘格方法的最后一张须为平放在测量平面上的棋盘格")
+    parser.add_argument('--camera', type=int, default=0, help="摄像头编号")
+    parser.add_argument('--pattern', default=f"{DEFAULT_PATTERN[0]}x{DEFAULT_PATTERN[1]}",
+                        help="棋盘格内角点数，如 9x6")
+    parser.add_argument('--square', type=float, default=25.0, help="棋盘格方格边长 (mm)")
+    parser.add_argument('--directory', default=GEOMETRY_DIR, help="几何标定数据目录")
+    args = parser.parse_args(argv)
+
+    try:
+        images = [_read_image(path) for path in args.images]
+        start_time = time.perf_counter()
+        if args.method == 'a4':
+            geometry, _ = calibrate_a4(images[-1])
+        else:
+            pattern = tuple(int(v) for v in args.pattern.lower().split('x'))
+            geometry, found = calibrate_checkerboard(images, pattern, args.square)
+            print(f"{found}/{len(images)} 张图像找到棋盘格", file=sys.stderr)
+        path = save_geometry(geometry, args.camera, args.directory)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    info = geometry.summary()
+    rms = f"，重投影误差 {info['rms']:.3f} 像素" if info['rms'] is not None else ''
+    print(f"已保存 {path}: {info['size'][0]}x{info['size'][1]}，校正后 {info['pixels_per_mm']:.4f} 像素/毫米，"
+          f"{'含' if info['distortion'] else '不含'}镜头畸变{rms}，用时 {time.perf_counter() - start_time:.1f} 秒",
+          file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,136 @@
+import atexit
 import cv2
 import numpy as np
 import streamlit as st
 import time
-from threading import Thread
+import uuid
+from threading import Thread, Condition, Lock, Event
 from PIL import Image
 
+# 默认采集分辨率 (宽, 高)
+DEFAULT_RESOLUTION = (640, 480)
+
+# 会话超过该时间（秒）没有使用摄像头时视为已离开（浏览器关闭后Streamlit不会通知），自动释放
+HOLDER_TIMEOUT = 300
+
+class FrameRingBuffer:
+    """预分配的帧环形缓冲区
+
+    捕获线程是唯一的写入者，依次写入N个预分配的槽位，每帧带递增的序号和时间戳。
+    读取者直接拿到槽位的只读视图，不需要复制也不需要加锁；写入前先作废槽位序号，
+    读取者可用is_valid()确认所持有的帧在处理期间没有被覆盖。
+    """
+    def __init__(self, size, shape, dtype=np.uint8):
+        self.size = size
+        self.shape = shape
+        self.frames = np.empty((size,) + tuple(shape), dtype=dtype)
+        self.sequences = np.full(size, -1, dtype=np.int64)
+        self.timestamps = np.zeros(size)
+        self.latest_seq = -1
+        self._condition = Condition()
+
+    def slot_for_write(self):
+        """返回下一帧要写入的槽位，并作废该槽位中的旧帧"""
+        slot = (self.latest_seq + 1) % self.size
+        self.sequences[slot] = -1
+        return slot
+
+    def publish(self, slot, timestamp):
+        """写入完成后发布新帧，并唤醒等待新帧的读取者"""
+        seq = self.latest_seq + 1
+        self.timestamps[slot] = timestamp
+        self.sequences[slot] = seq
+        with self._condition:
+            self.latest_seq = seq
+            self._condition.notify_all()
+        return seq
+
+    def _view(self, slot):
+        view = self.frames[slot]
+        view.flags.writeable = False
+        return view
+
+    def is_valid(self, seq):
+        """序号为seq的帧是否仍在缓冲区中（未被覆盖）"""
+        return seq >= 0 and self.sequences[seq % self.size] == seq
+
+    def get(self, seq):
+        """
+        获取指定序号的帧
+
+        返回:
+            (帧的只读视图, 时间戳)，该帧已被覆盖时返回(None, 0)
+        """
+        if not self.is_valid(seq):
+            return None, 0
+        slot = seq % self.size
+        return self._view(slot), self.timestamps[slot]
+
+    def latest(self):
+        """
+        获取最新帧
+
+        返回:
+            (帧的只读视图, 序号, 时间戳)，尚无帧时返回(None, -1, 0)
+        """
+        seq = self.latest_seq
+        frame, timestamp = self.get(seq)
+        return frame, seq, timestamp
+
+    def wait_next(self, after_seq, timeout=1.0):
+        """
+        等待序号大于after_seq的新帧（无需轮询）
+
+        返回:
+            (帧的只读视图, 序号, 时间戳)，超时返回(None, -1, 0)
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.latest_seq > after_seq, timeout):
+                return None, -1, 0
+        return self.latest()
+
+    def history(self, count):
+        """
+        获取最近的若干帧（从新到旧）
+
+        返回:
+            [(帧的只读视图, 序号, 时间戳), ...]
+        """
+        result = []
+        latest_seq = self.latest_seq
+        for seq in range(latest_seq, max(latest_seq - min(count, self.size), -1), -1):
+            frame, timestamp = self.get(seq)
+            if frame is not None:
+                result.append((frame, seq, timestamp))
+        return result
+
+# 帧颜色模式对应的转换代码（摄像头原始帧为BGR）
+COLOR_CONVERSIONS = {
+    'rgb': cv2.COLOR_BGR2RGB,
+    'gray': cv2.COLOR_BGR2GRAY
+}
+
 class CameraCapture:
-    """摄像头捕获类，用于管理摄像头视频流"""
-    def __init__(self, camera_id=0):
+    """摄像头捕获类，用于管理摄像头视频流
+
+    捕获线程只把摄像头原始的BGR帧写入环形缓冲区，不做颜色转换。
+    帧被读取时才按需转换为RGB或灰度图（测量只需要灰度图），
+    转换结果按帧序号缓存在预分配的槽位中，同一帧多次读取只转换一次。
+    """
+    def __init__(self, camera_id=0, buffer_size=8, resolution=DEFAULT_RESOLUTION):
         self.camera_id = camera_id
+        self.buffer_size = buffer_size
+        # 请求的采集分辨率，摄像头不支持时以实际分辨率为准
+        self.resolution = tuple(resolution)
         self.is_running = False
         self.cap = None
-        self.frame = None
+        self.thread = None
+        self.buffer = None
         self.last_frame_time = 0
         self.fps = 0
+        # 颜色转换缓存：模式 -> (预分配的帧数组, 每个槽位对应的帧序号)
+        self._converted = {}
+        self._convert_lock = Lock()
     
     def start(self):
         """启动摄像头"""
@@ -24,8 +141,8 @@ class CameraCapture:
                 return False
             
             # 设置分辨率
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
             
             self.is_running = True
             # 启动捕获线程
@@ -43,28 +160,121 @@ class CameraCapture:
         frame_count = 0
         
         while self.is_running:
-            ret, frame = self.cap.read()
-            if ret:
-                # 转换BGR到RGB
-                self.frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # 计算FPS
-                frame_count += 1
-                curr_time = time.time()
-                if curr_time - prev_time >= 1.0:
-                    self.fps = frame_count
-                    frame_count = 0
-                    prev_time = curr_time
-                
-                self.last_frame_time = time.time()
-            time.sleep(0.01)  # 减少CPU使用率
+            if self.buffer is None:
+                # 首帧用于确定分辨率并分配环形缓冲区
+                ret, frame = self.cap.read()
+                if ret:
+                    self.buffer = FrameRingBuffer(self.buffer_size, frame.shape, frame.dtype)
+                    slot = self.buffer.slot_for_write()
+                    self.buffer.frames[slot] = frame
+            else:
+                # 原始BGR帧直接读入环形缓冲区的槽位，cap.read会阻塞到下一帧到达，无需额外休眠
+                slot = self.buffer.slot_for_write()
+                ret, frame = self.cap.read(self.buffer.frames[slot])
+                if ret and frame.shape != self.buffer.shape:
+                    # 分辨率变化，重新分配缓冲区
+                    self.buffer = FrameRingBuffer(self.buffer_size, frame.shape, frame.dtype)
+                    slot = self.buffer.slot_for_write()
+                    self.buffer.frames[slot] = frame
+            if not ret:
+                time.sleep(0.01)
+                continue
+            
+            # 计算FPS
+            frame_count += 1
+            curr_time = time.time()
+            if curr_time - prev_time >= 1.0:
+                self.fps = frame_count
+                frame_count = 0
+                prev_time = curr_time
+            
+            self.last_frame_time = curr_time
+            self.buffer.publish(slot, curr_time)
+    
+    def _convert(self, raw, seq, mode):
+        """
+        将环形缓冲区中的原始帧转换为指定颜色模式（按帧序号缓存转换结果）
+        
+        参数:
+            raw: 原始BGR帧（只读视图）
+            seq: 帧序号
+            mode: 'rgb'、'gray' 或 'bgr'
+            
+        返回:
+            转换后的只读视图，原始帧在转换期间被覆盖时返回None
+        """
+        if raw is None:
+            return None
+        if mode == 'bgr':
+            return raw
+        buffer = self.buffer
+        slot = seq % buffer.size
+        with self._convert_lock:
+            cache = self._converted.get(mode)
+            if cache is None or cache[0].shape[1:3] != raw.shape[:2] or cache[0].shape[0] != buffer.size:
+                # 首次使用该模式或分辨率变化时分配转换缓存
+                channels = () if mode == 'gray' else (3,)
+                cache = (np.empty((buffer.size,) + raw.shape[:2] + channels, dtype=raw.dtype),
+                         np.full(buffer.size, -1, dtype=np.int64))
+                self._converted[mode] = cache
+            frames, sequences = cache
+            if sequences[slot] != seq:
+                cv2.cvtColor(raw, COLOR_CONVERSIONS[mode], dst=frames[slot])
+                sequences[slot] = seq
+            view = frames[slot]
+        view.flags.writeable = False
+        if not buffer.is_valid(seq):
+            return None
+        return view
     
-    def get_frame(self):
-        """获取当前帧"""
-        if self.frame is not None:
-            return self.frame.copy(), self.fps
+    def get_frame(self, copy=False, mode='rgb'):
+        """获取当前帧
+        
+        参数:
+            copy: 是否返回副本。默认返回最新帧的只读视图，
+                  视图在缓冲区写满一圈后会被覆盖，需要长期保存时请使用副本
+            mode: 颜色模式 'rgb'、'gray' 或 'bgr'
+        """
+        frame, _, _ = self.get_latest(mode)
+        if frame is not None:
+            return (frame.copy() if copy else frame), self.fps
         return None, 0
     
+    def get_latest(self, mode='rgb'):
+        """获取最新帧的只读视图、序号和时间戳"""
+        if self.buffer is None:
+            return None, -1, 0
+        raw, seq, timestamp = self.buffer.latest()
+        frame = self._convert(raw, seq, mode)
+        if frame is None:
+            return None, -1, 0
+        return frame, seq, timestamp
+    
+    def wait_for_frame(self, after_seq=-1, timeout=1.0, mode='rgb'):
+        """等待序号大于after_seq的新帧，返回(只读视图, 序号, 时间戳)"""
+        deadline = time.time() + timeout
+        # 缓冲区在首帧到达时才分配
+        while self.buffer is None:
+            if not self.is_running or time.time() >= deadline:
+                return None, -1, 0
+            time.sleep(0.005)
+        raw, seq, timestamp = self.buffer.wait_next(after_seq, max(deadline - time.time(), 0))
+        frame = self._convert(raw, seq, mode)
+        if frame is None:
+            return None, -1, 0
+        return frame, seq, timestamp
+    
+    def get_history(self, count, mode='rgb'):
+        """获取最近的若干帧（从新到旧），每项为(只读视图, 序号, 时间戳)"""
+        if self.buffer is None:
+            return []
+        history = []
+        for raw, seq, timestamp in self.buffer.history(count):
+            frame = self._convert(raw, seq, mode)
+            if frame is not None:
+                history.append((frame, seq, timestamp))
+        return history
+    
     def stop(self):
         """停止摄像头"""
         self.is_running = False
@@ -73,34 +283,254 @@ class CameraCapture:
         if self.cap is not None:
             self.cap.release()
 
+class CameraManager:
+    """多摄像头管理
+
+    每个摄像头只有一个CameraCapture实例（一个捕获线程），由所有会话共享：
+    多个浏览器会话打开同一个摄像头时读取同一个环形缓冲区，不会重复打开设备。
+    会话通过acquire/release登记和注销使用，最后一个会话释放时才停止该摄像头。
+    浏览器关闭后会话不会主动释放，会话在使用摄像头时调用touch更新心跳，
+    超过holder_timeout秒没有心跳的会话由后台线程自动释放。
+    """
+    def __init__(self, buffer_size=8, holder_timeout=HOLDER_TIMEOUT):
+        self.buffer_size = buffer_size
+        self.holder_timeout = holder_timeout
+        self._cameras = {}  # 摄像头编号 -> CameraCapture
+        self._holders = {}  # 摄像头编号 -> {会话标识: 最后一次心跳的时间}
+        self._lock = Lock()
+        self._stop_event = Event()
+        self._reaper = None
+
+    def acquire(self, camera_id, holder, resolution=None):
+        """
+        登记使用一个摄像头，未启动时启动
+
+        参数:
+            camera_id: 摄像头编号
+            holder: 使用者标识（会话ID）
+            resolution: 采集分辨率 (宽, 高)。与当前不同时，没有其他会话在使用才重新启动该摄像头，
+                否则保持当前分辨率（调用方可比较返回的camera.resolution）
+
+        返回:
+            正在运行的CameraCapture，启动失败时返回None
+        """
+        resolution = tuple(resolution or DEFAULT_RESOLUTION)
+        with self._lock:
+            self._start_reaper()
+            stale = self._prune(time.time())
+        # 先关闭超时释放的摄像头，同一设备才能重新打开
+        self._stop_cameras(stale)
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+            others = set(self._holders.get(camera_id, ())) - {holder}
+            if camera is None:
+                camera = CameraCapture(camera_id, self.buffer_size, resolution)
+                self._cameras[camera_id] = camera
+            elif camera.resolution != resolution and not others:
+                # 只有本会话在使用时才按新分辨率重新启动；其他会话正在读取画面时不能中断它们
+                camera.stop()
+                camera.resolution = resolution
+            if not camera.is_running and not camera.start():
+                if not self._holders.get(camera_id):
+                    del self._cameras[camera_id]
+                camera = None
+            else:
+                self._holders.setdefault(camera_id, {})[holder] = time.time()
+        return camera
+
+    def touch(self, camera_id, holder):
+        """
+        更新会话的心跳
+
+        返回:
+            该会话是否仍在使用该摄像头（超时被释放后返回False）
+        """
+        with self._lock:
+            holders = self._holders.get(camera_id)
+            if holders is None or holder not in holders:
+                return False
+            holders[holder] = time.time()
+            return True
+
+    def release(self, camera_id, holder):
+        """
+        注销使用，没有会话使用时停止该摄像头
+
+        返回:
+            摄像头是否已停止
+        """
+        with self._lock:
+            holders = self._holders.get(camera_id, {})
+            holders.pop(holder, None)
+            if holders:
+                return False
+            camera = self._cameras.pop(camera_id, None)
+            self._holders.pop(camera_id, None)
+        if camera is not None:
+            camera.stop()
+        return True
+
+    def _prune(self, now):
+        """
+        释放心跳超时的会话（需持有锁）
+
+        返回:
+            已没有会话使用、需要停止的摄像头列表（在锁外停止）
+        """
+        stale = []
+        for camera_id in list(self._holders):
+            holders = self._holders[camera_id]
+            for holder, last_seen in list(holders.items()):
+                if now - last_seen > self.holder_timeout:
+                    del holders[holder]
+            if not holders:
+                del self._holders[camera_id]
+                camera = self._cameras.pop(camera_id, None)
+                if camera is not None:
+                    stale.append(camera)
+        return stale
+
+    @staticmethod
+    def _stop_cameras(cameras):
+        for camera in cameras:
+            camera.stop()
+
+    def _start_reaper(self):
+        """启动清理超时会话的后台线程（需持有锁）"""
+        if self._reaper is None:
+            self._reaper = Thread(target=self._reap, name='camera-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while not self._stop_event.wait(self.holder_timeout / 4):
+            with self._lock:
+                stale = self._prune(time.time())
+            self._stop_cameras(stale)
+
+    def get(self, camera_id):
+        """获取正在运行的摄像头，未启动时返回None"""
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+        if camera is None or not camera.is_running:
+            return None
+        return camera
+
+    def capture(self, camera_id, mode='rgb'):
+        """
+        从指定摄像头抓取当前帧
+
+        返回:
+            帧的副本，摄像头未启动或还没有帧时返回None
+        """
+        camera = self.get(camera_id)
+        if camera is None:
+            return None
+        frame, _ = camera.get_frame(copy=True, mode=mode)
+        return frame
+
+    def status(self):
+        """
+        返回:
+            每个摄像头的状态列表 {camera_id, resolution, frame_size, fps, running, sessions}
+        """
+        with self._lock:
+            items = [(camera_id, camera, len(self._holders.get(camera_id, ())))
+                     for camera_id, camera in sorted(self._cameras.items(), key=lambda item: str(item[0]))]
+        status = []
+        for camera_id, camera, sessions in items:
+            buffer = camera.buffer
+            status.append({
+                'camera_id': camera_id,
+                'resolution': camera.resolution,
+                # 实际帧尺寸，摄像头不支持请求的分辨率时与resolution不同
+                'frame_size': (buffer.shape[1], buffer.shape[0]) if buffer is not None else None,
+                'fps': camera.fps,
+                'running': camera.is_running,
+                'sessions': sessions
+            })
+        return status
+
+    def stop_all(self):
+        """停止所有摄像头"""
+        self._stop_event.set()
+        with self._lock:
+            cameras = list(self._cameras.values())
+            self._cameras.clear()
+            self._holders.clear()
+        for camera in cameras:
+            camera.stop()
+
+@st.cache_resource
+def get_camera_manager():
+    """获取进程内共享的摄像头管理器"""
+    manager = CameraManager()
+    atexit.register(manager.stop_all)
+    return manager
+
+def _session_holder():
+    """当前会话在摄像头管理器中的标识"""
+    if 'camera_holder' not in st.session_state:
+        st.session_state.camera_holder = uuid.uuid4().hex
+    return st.session_state.camera_holder
+
 def camera_stream_placeholder():
     """创建摄像头流占位符"""
     return st.empty()
 
-def init_camera(camera_id=0):
-    """初始化摄像头"""
-    if 'camera' not in st.session_state:
-        st.session_state.camera = CameraCapture(camera_id)
-    
-    if not st.session_state.camera.is_running:
-        if st.session_state.camera.start():
-            st.success("摄像头已成功启动")
-            return True
-        else:
-            st.error("摄像头启动失败")
-            return False
+def init_camera(camera_id=0, resolution=None):
+    """
+    为当前会话打开摄像头（与其他会话共享），切换到其他摄像头时释放之前使用的摄像头
+
+    参数:
+        camera_id: 摄像头编号
+        resolution: 采集分辨率 (宽, 高)，默认DEFAULT_RESOLUTION
+    """
+    manager = get_camera_manager()
+    holder = _session_holder()
+    previous_id = st.session_state.get('camera_id')
+    if previous_id is not None and previous_id != camera_id:
+        manager.release(previous_id, holder)
+
+    was_running = manager.get(camera_id) is not None
+    camera = manager.acquire(camera_id, holder, resolution)
+    if camera is None:
+        st.session_state.pop('camera', None)
+        st.session_state.pop('camera_id', None)
+        st.error("摄像头启动失败")
+        return False
+    if not was_running:
+        st.success("摄像头已成功启动")
+    if camera.resolution != tuple(resolution or DEFAULT_RESOLUTION):
+        st.warning(f"摄像头 {camera_id} 正在被其他会话以 {camera.resolution[0]}x{camera.resolution[1]} 使用，"
+                   "保持当前分辨率；其他会话断开后再修改")
+    st.session_state.camera = camera
+    st.session_state.camera_id = camera_id
     return True
 
 def stop_camera():
-    """停止摄像头"""
-    if 'camera' in st.session_state and st.session_state.camera.is_running:
-        st.session_state.camera.stop()
+    """停止当前会话使用的摄像头（其他会话仍在使用时只断开本会话）"""
+    camera_id = st.session_state.get('camera_id')
+    if camera_id is None:
+        return
+    stopped = get_camera_manager().release(camera_id, _session_holder())
+    st.session_state.pop('camera', None)
+    st.session_state.pop('camera_id', None)
+    if stopped:
         st.info("摄像头已停止")
+    else:
+        st.info("已断开摄像头（其他会话仍在使用）")
 
-def get_camera_frame():
-    """获取摄像头当前帧"""
+def keep_camera_alive():
+    """更新当前会话使用摄像头的心跳（长时间运行的实时画面循环中定期调用）"""
+    camera_id = st.session_state.get('camera_id')
+    if camera_id is not None:
+        get_camera_manager().touch(camera_id, _session_holder())
+
+def get_camera_frame(copy=False):
+    """获取摄像头当前帧（默认为只读视图）"""
+    keep_camera_alive()
     if 'camera' in st.session_state and st.session_state.camera.is_running:
-        return st.session_state.camera.get_frame()
+        return st.session_state.camera.get_frame(copy)
     return None, 0
 
 def display_camera_stream(placeholder, processing_func=None, params=None):
@@ -123,16 +553,13 @@ def display_camera_stream(placeholder, processing_func=None, params=None):
         else:
             display_frame = frame
         
-        # 显示FPS
-        cv2.putText(display_frame, f"FPS: {fps}", (10, 30), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        
-        # 显示图像
-        placeholder.image(display_frame, channels="RGB", use_column_width=True)
+        # 显示图像，FPS显示在标题中，避免为了绘制文字而复制帧
+        placeholder.image(display_frame, channels="RGB", use_column_width=True, caption=f"FPS: {fps}")
         return display_frame
     return None
 
 def capture_frame():
     """捕获当前帧"""
-    frame, _ = get_camera_frame()
+    # 捕获的帧会长期保存在session_state中，需要复制出环形缓冲区
+    frame, _ = get_camera_frame(copy=True)
     return frame
\ No newline at end of file
@@ -0,0 +1,165 @@
+import numpy as np
+
+def contour_stats(contours):
+    """
+    批量计算轮廓的几何统计量（面积、周长、外接矩形），所有轮廓一次性向量化计算
+
+    将全部轮廓的点拼接成一个数组，用np.add.reduceat按轮廓分段求和，
+    避免对成百上千个噪点轮廓逐个调用cv2.contourArea / cv2.arcLength。
+    计算结果与cv2.contourArea(鞋带公式)和cv2.arcLength(闭合)一致。
+
+    参数:
+        contours: cv2.findContours返回的轮廓列表
+
+    返回:
+        字典，各项均为长度等于轮廓数量的数组:
+            area: 轮廓面积
+            perimeter: 闭合轮廓周长
+            x, y, w, h: 轴对齐外接矩形
+    """
+    count = len(contours)
+    if count == 0:
+        empty = np.zeros(0)
+        return {'area': empty, 'perimeter': empty, 'x': empty, 'y': empty, 'w': empty, 'h': empty}
+
+    lengths = np.fromiter(map(len, contours), dtype=np.int64, count=count)
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.float64)
+    starts = np.zeros(count, dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+
+    # 每个点的下一个点（轮廓内循环，最后一个点连回第一个点）
+    next_index = np.arange(len(points)) + 1
+    next_index[starts + lengths - 1] = starts
+    next_points = points[next_index]
+
+    x, y = points[:, 0], points[:, 1]
+    nx, ny = next_points[:, 0], next_points[:, 1]
+
+    # 鞋带公式求面积
+    cross = x * ny - nx * y
+    area = np.abs(np.add.reduceat(cross, starts)) / 2.0
+
+    # 相邻点距离求周长
+    segment = np.hypot(nx - x, ny - y)
+    perimeter = np.add.reduceat(segment, starts)
+
+    # 轴对齐外接矩形
+    min_x = np.minimum.reduceat(x, starts)
+    min_y = np.minimum.reduceat(y, starts)
+    max_x = np.maximum.reduceat(x, starts)
+    max_y = np.maximum.reduceat(y, starts)
+
+    return {
+        'area': area,
+        'perimeter': perimeter,
+        'x': min_x,
+        'y': min_y,
+        'w': max_x - min_x + 1,
+        'h': max_y - min_y + 1
+    }
+
+def select_by_area(contours, min_area):
+    """
+    按面积向量化预筛选轮廓
+
+    参数:
+        contours: 轮廓列表
+        min_area: 最小面积
+
+    返回:
+        (保留的轮廓列表, 对应的统计量字典)，统计量的各项与contour_stats相同，只包含保留的轮廓
+    """
+    stats = contour_stats(contours)
+    keep = np.flatnonzero(stats['area'] >= min_area)
+    return [contours[i] for i in keep], {name: values[keep] for name, values in stats.items()}
+
+def _intersections(boxes):
+    """
+    返回:
+        (交集面积矩阵 (N, N), 各外接矩形面积 (N,))
+    """
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    inter_w = np.clip(np.minimum(x2[:, None], x2) - np.maximum(x1[:, None], x1), 0, None)
+    inter_h = np.clip(np.minimum(y2[:, None], y2) - np.maximum(y1[:, None], y1), 0, None)
+    return inter_w * inter_h, boxes[:, 2] * boxes[:, 3]
+
+def find_containers(boxes, containment_threshold=0.9):
+    """
+    找出包围多个零件的外框（如画面中的整张A4纸或托盘边缘）
+
+    一个外接矩形中包含两个以上彼此不重叠的候选时，它是背景而不是零件。
+    同一零件的重复检测彼此重叠，不算作多个零件。
+
+    参数:
+        boxes: (N, 4) 数组，每行为外接矩形 (x, y, w, h)
+        containment_threshold: 交集占较小矩形面积的比例超过该值视为包含
+
+    返回:
+        外框的索引列表
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) < 3:
+        return []
+    inter, areas = _intersections(boxes)
+    # contained[i, j]: j在i内部（且比i小）
+    contained = (inter / np.maximum(areas, 1.0) > containment_threshold) & (areas < areas[:, None])
+    # 两个候选之间交集占较小者的比例超过阈值视为重叠（同一零件或嵌套）
+    overlap = inter / np.maximum(np.minimum(areas[:, None], areas), 1.0) > containment_threshold
+    containers = []
+    for i in range(len(boxes)):
+        inside = np.flatnonzero(contained[i])
+        if len(inside) >= 2 and not overlap[np.ix_(inside, inside)].all():
+            containers.append(i)
+    return containers
+
+def suppress_overlaps(boxes, scores, iou_threshold=0.5, containment_threshold=0.9):
+    """
+    非极大值抑制：同一个零件在多种二值化方法中会被重复检测，保留得分最高的一个
+
+    零件内部的印刷区域（如Otsu或红色过滤检测到的图案）与零件外框的交并比很小，
+    因此还按包含关系抑制：交集占较小外接矩形面积的比例超过containment_threshold时，
+    得分较低的一个被抑制。包围多个零件的外框应先用find_containers去掉。
+
+    参数:
+        boxes: (N, 4) 数组，每行为外接矩形 (x, y, w, h)
+        scores: (N,) 得分数组（如面积）
+        iou_threshold: 交并比超过该值视为同一零件
+        containment_threshold: 包含比例超过该值视为同一零件
+
+    返回:
+        保留的索引列表，按得分从高到低排列
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return []
+    inter, areas = _intersections(boxes)
+
+    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind='stable')
+    keep = []
+    while len(order) > 0:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        # 与剩余所有候选的交并比和包含比例一次性计算
+        iou = inter[i, rest] / (areas[i] + areas[rest] - inter[i, rest])
+        containment = inter[i, rest] / np.maximum(np.minimum(areas[i], areas[rest]), 1.0)
+        order = rest[(iou <= iou_threshold) & (containment <= containment_threshold)]
+    return keep
+
+def reading_order(centers, row_tolerance):
+    """
+    按从上到下、从左到右的阅读顺序排列零件，便于标注编号
+
+    参数:
+        centers: (N, 2) 中心点数组
+        row_tolerance: 纵坐标相差小于该值的零件视为同一行
+
+    返回:
+        排序后的索引列表
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    if len(centers) == 0:
+        return []
+    rows = np.floor(centers[:, 1] / max(row_tolerance, 1.0))
+    return list(np.lexsort((centers[:, 0], rows)))
@@ -0,0 +1,148 @@
+import numpy as np
+
+# 导入运行统计量
+from spc_stats import RunningStats
+
+# 各测量类型参与平均的尺寸：(名称, 结果字段)
+AVERAGED_FEATURES = {
+    'circle': [('radius', 'measured_radius')],
+    'rectangle': [('width', 'measured_width'), ('height', 'measured_height')]
+}
+
+# 异常值判定阈值（修正Z分数，Iglewicz-Hoaglin建议取3.5）
+OUTLIER_THRESHOLD = 3.5
+
+# MAD换算为正态分布标准差的系数
+MAD_SCALE = 1.4826
+
+class FrameAverager:
+    """多帧测量结果的平均
+
+    每帧只记录测量得到的尺寸（几个浮点数），不保存帧图像。均值和标准差用运行统计量
+    逐帧更新；剔除异常值时以中位数和MAD（绝对中位差）为基准，修正Z分数超过阈值的值
+    （例如零件边缘被手或阴影短暂遮挡的帧）不参与稳健均值。
+    """
+    def __init__(self, measurement_type, outlier_threshold=OUTLIER_THRESHOLD):
+        """
+        参数:
+            measurement_type: 'circle' 或 'rectangle'
+            outlier_threshold: 异常值的修正Z分数阈值
+        """
+        self.measurement_type = measurement_type
+        self.outlier_threshold = outlier_threshold
+        self.features = AVERAGED_FEATURES[measurement_type]
+        self.stats = {name: RunningStats() for name, _ in self.features}
+        self.values = {name: [] for name, _ in self.features}
+        self.failed = 0
+        # 测量期间被捕获线程覆盖、结果作废的帧数
+        self.discarded = 0
+
+    @property
+    def count(self):
+        """成功测量的帧数"""
+        return self.stats[self.features[0][0]].count
+
+    def add(self, result):
+        """
+        加入一帧的测量结果
+
+        参数:
+            result: CircleMeasurement / RectangleMeasurement
+        """
+        if not result.success:
+            self.failed += 1
+            return
+        for name, field in self.features:
+            value = float(getattr(result, field))
+            self.stats[name].add(value)
+            self.values[name].append(value)
+
+    def summary(self):
+        """
+        返回:
+            {尺寸名称: {count, mean, std, min, max, median, robust_mean, rejected}}，
+            robust_mean为剔除异常值后的均值；没有成功测量的帧时返回空字典
+        """
+        if self.count == 0:
+            return {}
+        summary = {}
+        for name, _ in self.features:
+            stats = self.stats[name]
+            values = np.array(self.values[name])
+            median = float(np.median(values))
+            mad = float(np.median(np.abs(values - median))) * MAD_SCALE
+            if mad > 0:
+                # 修正Z分数 = (x - 中位数) / (1.4826 * MAD)
+                kept = values[np.abs(values - median) / mad <= self.outlier_threshold]
+            else:
+                # 一半以上的帧结果完全相同，无法估计离散程度，不剔除
+                kept = values
+            summary[name] = {
+                'count': stats.count,
+                'mean': stats.mean,
+                'std': stats.std,
+                'min': stats.min,
+                'max': stats.max,
+                'median': median,
+                'robust_mean': float(kept.mean()),
+                'rejected': int(len(values) - len(kept))
+            }
+        return summary
+
+# 连续测量摄像头的后续N帧
+def measure_frames(camera, tracker, frame_count=10, timeout=1.0, progress=None, max_discarded=None):
+    """
+    从实时画面中依次测量frame_count个新帧，测量期间只持有当前一帧的只读视图
+
+    检测一帧的耗时超过环形缓冲区一轮（高分辨率下很常见）时，帧在测量期间就被覆盖，
+    结果作废；作废的帧数达到max_discarded时提前结束，避免一直等不到有效帧。
+
+    参数:
+        camera: CameraCapture实例
+        tracker: RoiTracker实例，后续帧只在上次检测位置附近搜索
+        frame_count: 测量的帧数
+        timeout: 等待每一帧的最长时间（秒），超时则提前结束
+        progress: 进度回调 progress(已测量帧数, frame_count) (可选)
+        max_discarded: 最多作废的帧数，默认等于frame_count
+
+    返回:
+        (FrameAverager, 最后一个成功的测量结果, 该帧的副本)；没有成功的帧时后两项为None，
+        作废的帧数记录在FrameAverager.discarded中
+    """
+    averager = FrameAverager(tracker.measurement_type)
+    # 圆形检测只用灰度图；矩形检测的红色过滤方法需要彩色图
+    mode = 'gray' if tracker.measurement_type == 'circle' else 'rgb'
+    last_result = None
+    # 最后一个成功帧的副本，两个缓冲区交替使用，不随帧数增加内存
+    last_frame = None
+    spare = None
+    # 从调用之后到达的帧开始测量
+    _, last_seq, _ = camera.get_latest(mode)
+    if max_discarded is None:
+        max_discarded = frame_count
+    measured = 0
+    while measured < frame_count:
+        frame, seq, _ = camera.wait_for_frame(last_seq, timeout=timeout, mode=mode)
+        if frame is None:
+            break
+        last_seq = seq
+        result, search_roi = tracker.detect(frame)
+        if result.success:
+            if spare is None or spare.shape != frame.shape:
+                spare = np.empty_like(frame)
+            np.copyto(spare, frame)
+        if not camera.buffer.is_valid(seq):
+            # 测量期间该帧已被捕获线程覆盖，结果不可信，跟踪区域也不更新
+            averager.discarded += 1
+            if averager.discarded >= max_discarded:
+                break
+            continue
+        tracker.commit(result, search_roi, frame.shape)
+        averager.add(result)
+        if result.success:
+            last_result = result
+            last_frame, spare = spare, last_frame
+        measured += 1
+        if progress is not None:
+            progress(measured, frame_count)
+    return averager, last_result, last_frame
@@ -0,0 +1,101 @@
+import itertools
+import threading
+
+import numpy as np
+
+class WorkspaceKey:
+    """工作区中一张图像的键，代替预处理缓存的内容哈希在各处理阶段之间传递"""
+    __slots__ = ('workspace', 'token')
+
+    def __init__(self, workspace, token):
+        self.workspace = workspace
+        self.token = token
+
+class FrameWorkspace:
+    """摄像头连续测量的工作缓冲区
+
+    连续测量时每帧的内容都不同，按内容哈希缓存中间结果没有意义，反而要为每帧计算哈希、
+    分配新的灰度图、模糊图和二值掩码。工作区为每个处理阶段预先分配一块缓冲区，
+    各阶段用OpenCV的dst参数直接写入，稳定运行后每帧几乎不再分配大数组；
+    同一帧内各二值化方法共用的灰度图和模糊图仍只计算一次。
+
+    缓冲区在下一帧被覆盖，处理结果（轮廓除外）不能在帧之间保留。
+    一个工作区同一时间只能处理一帧，每个跟踪器使用各自的工作区。
+    """
+    def __init__(self):
+        self.shape = None
+        self.allocations = 0
+        self._buffers = {}  # 缓冲区名称 -> 一维数组
+        self._results = {}  # 图像键 -> {阶段名: 结果}
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+
+    def begin(self, shape):
+        """
+        开始处理新的一帧，丢弃上一帧的中间结果；分辨率变化时重新分配缓冲区
+
+        参数:
+            shape: 帧图像的shape
+        """
+        with self._lock:
+            if shape != self.shape:
+                self.shape = shape
+                self._buffers = {}
+            self._results = {}
+
+    def image_key(self, image):
+        """为本帧中的一张图像（整帧、ROI或缩小图）分配键，不计算内容哈希"""
+        return WorkspaceKey(self, next(self._tokens))
+
+    def get(self, key, stage, compute):
+        """
+        获取本帧某张图像某个处理阶段的结果，未计算时调用compute计算
+
+        参数:
+            key: image_key返回的键
+            stage: 处理阶段名称
+            compute: 无参数的计算函数
+
+        返回:
+            该阶段的处理结果
+        """
+        with self._lock:
+            entry = self._results.get(key.token)
+            if entry is not None and stage in entry:
+                return entry[stage]
+        # 在锁外计算，各二值化方法在策略线程中并行执行
+        value = compute()
+        with self._lock:
+            return self._results.setdefault(key.token, {}).setdefault(stage, value)
+
+    def buffer(self, name, shape):
+        """
+        获取指定名称的uint8缓冲区
+
+        每个名称保留一块连续内存，容量不足时按新尺寸重新分配；ROI大小逐帧变化时
+        返回同一块内存的前一部分，因此同一名称的缓冲区不能同时用于两张图像。
+
+        参数:
+            name: 缓冲区名称（每个处理阶段一个）
+            shape: 需要的数组形状
+
+        返回:
+            C连续的数组视图，内容未初始化
+        """
+        size = int(np.prod(shape))
+        with self._lock:
+            storage = self._buffers.get(name)
+            if storage is None or storage.size < size:
+                storage = np.empty(size, dtype=np.uint8)
+                self._buffers[name] = storage
+                self.allocations += 1
+        return storage[:size].reshape(shape)
+
+    def stats(self):
+        """返回工作区统计信息"""
+        with self._lock:
+            return {
+                'buffers': len(self._buffers),
+                'bytes': sum(storage.nbytes for storage in self._buffers.values()),
+                'allocations': self.allocations
+            }
@@ -0,0 +1,155 @@
+import hashlib
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 复用预处理缓存的LRU实现缓存解码结果
+from preprocess_cache import PreprocessCache
+
+# PNG文件签名
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# OpenCV缩小解码支持的倍数（JPEG在DCT阶段直接按比例解码，不生成全尺寸图像）
+REDUCE_FACTORS = (8, 4, 2)
+
+# 缩小解码的标志：{(颜色格式, 倍数): imdecode标志}
+_DECODE_FLAGS = {
+    ('rgb', 1): cv2.IMREAD_COLOR,
+    ('rgb', 2): cv2.IMREAD_REDUCED_COLOR_2,
+    ('rgb', 4): cv2.IMREAD_REDUCED_COLOR_4,
+    ('rgb', 8): cv2.IMREAD_REDUCED_COLOR_8,
+    ('gray', 1): cv2.IMREAD_GRAYSCALE,
+    ('gray', 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    ('gray', 4): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    ('gray', 8): cv2.IMREAD_REDUCED_GRAYSCALE_8
+}
+
+# 解码结果缓存：Streamlit每次交互都重新运行脚本，同一张上传图片不必重复解码
+_decode_cache = PreprocessCache(max_bytes=256 * 1024 * 1024, max_entries=8)
+
+# 读取图像尺寸（只解析文件头，不解码像素）
+def image_size(data):
+    """
+    返回:
+        (宽, 高)，无法识别时返回None
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+# 选择缩小解码的倍数
+def reduce_factor(size, max_side=None):
+    """
+    参数:
+        size: 原图尺寸 (宽, 高)，为None时不缩小
+        max_side: 缩小后的最长边不低于该值，为None时不缩小
+
+    返回:
+        1、2、4或8，缩小后最长边仍不低于max_side的最大倍数
+    """
+    if not max_side or size is None:
+        return 1
+    for factor in REDUCE_FACTORS:
+        if max(size) / factor >= max_side:
+            return factor
+    return 1
+
+# 判断PNG是否带透明通道
+def _png_has_alpha(data):
+    if not data.startswith(PNG_SIGNATURE) or len(data) < 26:
+        return False
+    # IHDR中的颜色类型：4为灰度+透明，6为RGBA；调色板图像的透明度保存在IDAT之前的tRNS块中
+    color_type = data[25]
+    if color_type in (4, 6):
+        return True
+    idat = data.find(b'IDAT')
+    return b'tRNS' in data[:idat if idat > 0 else len(data)]
+
+# 把带透明通道的图像合成到白色背景上
+def _composite_on_white(image):
+    """
+    参数:
+        image: imdecode(IMREAD_UNCHANGED)得到的BGRA或灰度+透明图像，8位或16位
+
+    返回:
+        8位BGR图像，透明区域为白色（与测量使用的白色背景一致）
+    """
+    if image.dtype == np.uint16:
+        image = (image >> 8).astype(np.uint8)
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 2:
+        color, alpha = cv2.cvtColor(image[..., 0], cv2.COLOR_GRAY2BGR), image[..., 1]
+    elif image.shape[2] == 4:
+        color, alpha = image[..., :3], image[..., 3]
+    else:
+        return image
+    alpha = alpha.astype(np.uint16)[..., None]
+    # 整数运算的 color * a + 255 * (1 - a)，四舍五入
+    blended = (color.astype(np.uint16) * alpha + 255 * (255 - alpha) + 127) // 255
+    return blended.astype(np.uint8)
+
+# 从编码数据解码图像
+def decode_image(data, mode='rgb', max_side=None):
+    """
+    用OpenCV直接从编码数据（JPEG/PNG）解码，不经过PIL的完整彩色解码
+
+    - mode为'gray'时直接解码为灰度图，省去彩色图像的内存和颜色转换
+    - 提供max_side时按2/4/8倍缩小解码，JPEG在解码阶段缩小，解码时间和内存随之下降
+    - 按EXIF方向信息旋转（手机照片）
+    - 带透明通道的PNG合成到白色背景上，不会出现黑色背景或四通道图像
+
+    参数:
+        data: 编码后的图像数据（bytes）
+        mode: 'rgb' 或 'gray'
+        max_side: 缩小解码后最长边的下限（像素），为None时按原始分辨率解码
+
+    返回:
+        (image, scale)：RGB或灰度图像，以及相对原图的缩放比例（1、1/2、1/4或1/8），
+        无法解码时抛出ValueError
+    """
+    factor = reduce_factor(image_size(data), max_side) if max_side else 1
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if _png_has_alpha(data):
+        # 透明通道只能按原样解码；PNG一般不带EXIF方向信息
+        image = cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError('无法解码图像')
+        image = _composite_on_white(image)
+        if factor > 1:
+            image = cv2.resize(image, (image.shape[1] // factor, image.shape[0] // factor),
+                               interpolation=cv2.INTER_AREA)
+        code = cv2.COLOR_BGR2GRAY if mode == 'gray' else cv2.COLOR_BGR2RGB
+        return cv2.cvtColor(image, code), 1.0 / factor
+
+    image = cv2.imdecode(buffer, _DECODE_FLAGS[(mode, factor)])
+    if image is None:
+        raise ValueError('无法解码图像')
+    if mode == 'rgb':
+        # 就地转换为RGB，不再分配一张图像
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    return image, 1.0 / factor
+
+# 加载上传的图像（带缓存）
+def load_image(data, mode='rgb', max_side=None):
+    """
+    与decode_image相同，但按内容哈希缓存解码结果；同一张图片重复加载时直接返回缓存
+
+    参数:
+        data: 编码后的图像数据（bytes）
+        mode: 'rgb' 或 'gray'
+        max_side: 缩小解码后最长边的下限（像素）(可选)
+
+    返回:
+        (image, scale)，image为只读数组
+    """
+    key = hashlib.sha1(data).hexdigest()
+    return _decode_cache.get(key, f'{mode}_{max_side}', lambda: decode_image(data, mode, max_side))
+
+# 清空解码缓存
+def clear_cache():
+    _decode_cache.clear()
@@ -1,346 +1,906 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 from text_utils import put_chinese_text
+from preprocess_cache import preprocess_cache
+from frame_workspace import WorkspaceKey
+from stage_timer import stage_timer
+from contour_analysis import select_by_area, find_containers, suppress_overlaps, reading_order
+from measurement_result import CircleMeasurement, RectangleMeasurement
 
-# 圆形标定函数
-def calibrate_circle(image, actual_radius):
+# 轮廓筛选的最小面积阈值，避免小噪点
+MIN_CONTOUR_AREA = 1000
+
+# 矩形检测使用的二值化方法名称（按尝试顺序）
+RECTANGLE_METHODS = ['adaptive', 'otsu', 'canny', 'adaptive_large', 'red_filtered']
+
+# 矩形检测提前结束的置信度阈值（轮廓面积与最小外接矩形面积之比）：
+# 优先运行的方法找到足够规整的矩形时不再运行其余方法；设为0则总是比较所有方法
+RECTANGLE_EARLY_EXIT_CONFIDENCE = 0.95
+
+# 矩形检测各二值化方法共用的线程池；线程数为None时按CPU核数确定
+_strategy_pool = None
+_strategy_pool_workers = None
+_strategy_pool_lock = Lock()
+
+# 金字塔检测参数：粗检测图像的最长边，以及精检测ROI的扩展边距
+# 精检测在全分辨率ROI内进行，自适应二值化和Canny是局部运算，结果与全图检测一致；
+# Otsu类方法的阈值由ROI内的直方图决定，边缘位置可能相差约1个像素（约0.1%~0.5%）
+PYRAMID_MAX_SIDE = 1024
+PYRAMID_MARGIN_RATIO = 0.1
+PYRAMID_MIN_MARGIN = 32
+
+# 形态学操作的结构元素
+KERNEL_3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+KERNEL_5 = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+# 红色的HSV范围（色相在0和180附近）
+RED_RANGES = [(np.array([0, 70, 50]), np.array([10, 255, 255])),
+              (np.array([170, 70, 50]), np.array([180, 255, 255]))]
+
+# 计算图像键
+def _image_key(image, workspace=None):
     """
-    对圆形进行标定
-    
+    使用工作区时由工作区分配键（不计算哈希，中间结果只在本帧内共用），否则使用预处理缓存的内容哈希
+    """
+    if workspace is not None:
+        return workspace.image_key(image)
+    return preprocess_cache.image_key(image)
+
+# 获取某个处理阶段的结果（带缓存）
+def _cached(key, stage, compute):
+    if isinstance(key, WorkspaceKey):
+        return key.workspace.get(key, stage, compute)
+    return preprocess_cache.get(key, stage, compute)
+
+# 获取处理阶段的输出缓冲区
+def _buffer(key, name, shape):
+    """
+    返回:
+        使用工作区时返回预分配的缓冲区，作为OpenCV函数的dst参数；否则返回None，由OpenCV分配新数组
+    """
+    if isinstance(key, WorkspaceKey):
+        return key.workspace.buffer(name, shape)
+    return None
+
+# 获取灰度图（带缓存）
+def _get_gray(image, key):
+    def compute():
+        with stage_timer.stage('gray'):
+            if len(image.shape) == 3:
+                return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=_buffer(key, 'gray', image.shape[:2]))
+            if isinstance(key, WorkspaceKey):
+                # 工作区的结果不会被设为只读，直接使用输入的灰度图
+                return image
+            return image.copy()
+    return _cached(key, 'gray', compute)
+
+# 获取高斯模糊图（带缓存）
+def _get_blurred(image, key, ksize):
+    gray = _get_gray(image, key)
+
+    def compute():
+        with stage_timer.stage('blur'):
+            return cv2.GaussianBlur(gray, (ksize, ksize), 0, dst=_buffer(key, f'blur_{ksize}', gray.shape))
+    return _cached(key, f'blur_{ksize}', compute)
+
+# 查找轮廓（带缓存）
+def _get_contours(key, name, mask):
+    def compute():
+        with stage_timer.stage(f'contours.{name}'):
+            return cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+    return _cached(key, f'contours_{name}', compute)
+
+# 圆形检测的候选轮廓（标定和测量共用）
+def _circle_candidates(image, key, min_area=MIN_CONTOUR_AREA):
+    """
+    查找圆形检测的候选轮廓
+
     参数:
         image: 输入图像
-        actual_radius: 实际半径(mm)
-        
+        key: 预处理缓存键
+        min_area: 最小轮廓面积
+
     返回:
-        success: 是否成功
-        result_image: 标定结果图像
-        pixels_per_mm: 像素/毫米比例
+        通过筛选的候选轮廓列表
     """
-    # 转换为灰度图
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-    else:
-        gray = image.copy()
-    
     # 高斯模糊减少噪声
-    blurred = cv2.GaussianBlur(gray, (7, 7), 0)  # 增加高斯核大小
-    
-    # 尝试多种二值化方法
-    # 自适应二值化
-    thresh1 = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 15, 2)  # 增加块大小
-    
-    # 形态学操作改善轮廓
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
-    thresh = cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, kernel)
-    
+    blurred = _get_blurred(image, key, 7)  # 增加高斯核大小
+
+    def compute_thresh():
+        with stage_timer.stage('threshold.circle'):
+            # 自适应二值化
+            thresh1 = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 15, 2,
+                                            dst=_buffer(key, 'circle_thresh', blurred.shape))  # 增加块大小
+            # 形态学操作改善轮廓（原地进行）
+            return cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, KERNEL_3, dst=thresh1)
+
+    thresh = _cached(key, 'circle_thresh', compute_thresh)
+
     # 查找轮廓
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    # 根据矩形度筛选轮廓
-    valid_contours = []
-    min_area = 1000  # 增加最小面积阈值，避免小噪点
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-        if area < min_area:
-            continue
-        # 计算轮廓的周长
-        perimeter = cv2.arcLength(cnt, True)
-        # 对轮廓进行多边形近似
-        epsilon = 0.04 * perimeter  # 增加近似精度参数，更宽松的多边形近似
-        approx = cv2.approxPolyDP(cnt, epsilon, True)
-        # 判断是否为矩形（四边形）
-        if len(approx) >= 4 and len(approx) <= 6:  # 允许4-6个顶点，更宽松的四边形判断
-            # 计算最小外接矩形的面积
-            rect = cv2.minAreaRect(cnt)
-            box = cv2.boxPoints(rect)
-            box_area = cv2.contourArea(box)
-            # 计算轮廓面积与其最小外接矩形面积的比值
-            if box_area > 0:
-                rect_ratio = area / box_area
-                # 如果比值接近1，说明轮廓更接近矩形，降低阈值使检测更宽松
-                if rect_ratio > 0.7:
-                    valid_contours.append(cnt)
-    
+    contours = _get_contours(key, 'circle', thresh)
+
+    def compute_valid():
+        # 根据矩形度筛选轮廓，先向量化地按面积批量预筛选，排除大量小噪点
+        valid_contours = []
+        large_contours, stats = select_by_area(contours, min_area)
+        for cnt, area, perimeter in zip(large_contours, stats['area'], stats['perimeter']):
+            # 对轮廓进行多边形近似（周长已在预筛选时批量算出）
+            epsilon = 0.04 * perimeter  # 增加近似精度参数，更宽松的多边形近似
+            approx = cv2.approxPolyDP(cnt, epsilon, True)
+            # 判断是否为矩形（四边形）
+            if len(approx) >= 4 and len(approx) <= 6:  # 允许4-6个顶点，更宽松的四边形判断
+                # 计算最小外接矩形的面积
+                rect = cv2.minAreaRect(cnt)
+                box = cv2.boxPoints(rect)
+                box_area = cv2.contourArea(box)
+                # 计算轮廓面积与其最小外接矩形面积的比值
+                if box_area > 0:
+                    rect_ratio = area / box_area
+                    # 如果比值接近1，说明轮廓更接近矩形，降低阈值使检测更宽松
+                    if rect_ratio > 0.7:
+                        valid_contours.append(cnt)
+        return valid_contours
+
+    def timed_valid():
+        with stage_timer.stage('filter.circle'):
+            return compute_valid()
+
+    return _cached(key, f'circle_valid_{min_area}', timed_valid)
+
+# 矩形检测的二值化掩码
+def _rectangle_mask(image, key, method):
+    """
+    按方法名称生成矩形检测使用的二值化掩码（带缓存）
+
+    参数:
+        image: 输入图像
+        key: 预处理缓存键
+        method: RECTANGLE_METHODS中的方法名称
+
+    返回:
+        二值化掩码，灰度图像不支持红色过滤方法时返回None
+    """
+    blurred = _get_blurred(image, key, 5)
+    # 掩码写入该方法自己的缓冲区，形态学操作原地进行
+    mask = _buffer(key, f'mask_{method}', blurred.shape)
+
+    if method == 'adaptive':
+        # 方法1: 自适应二值化
+        def compute():
+            thresh1 = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2,
+                                            dst=mask)
+            return cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, KERNEL_3, dst=thresh1)
+    elif method == 'otsu':
+        # 方法2: Otsu二值化
+        def compute():
+            _, thresh2 = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, dst=mask)
+            return cv2.morphologyEx(thresh2, cv2.MORPH_CLOSE, KERNEL_3, dst=thresh2)
+    elif method == 'canny':
+        # 方法3: Canny边缘检测
+        def compute():
+            edges = cv2.Canny(blurred, 30, 150, edges=mask)
+            return cv2.dilate(edges, KERNEL_3, dst=edges, iterations=1)
+    elif method == 'adaptive_large':
+        # 方法4: 使用更大的结构元素进行形态学操作
+        def compute():
+            thresh1 = _rectangle_mask(image, key, 'adaptive')
+            with stage_timer.stage('threshold.adaptive_large'):
+                return cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, KERNEL_5, dst=mask)
+    elif method == 'red_filtered':
+        # 颜色过滤 - 如果是彩色图像，尝试过滤掉红色区域（如国徽）
+        if len(image.shape) != 3:
+            return None
+
+        def compute():
+            gray = _get_gray(image, key)
+            # 转换到HSV颜色空间
+            hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV, dst=_buffer(key, 'hsv', image.shape))
+
+            # 创建红色掩码（两个色相范围合并）
+            red_mask = cv2.inRange(hsv, *RED_RANGES[0], dst=_buffer(key, 'red_mask', gray.shape))
+            red_mask2 = cv2.inRange(hsv, *RED_RANGES[1], dst=_buffer(key, 'red_mask2', gray.shape))
+            red_mask = cv2.bitwise_or(red_mask, red_mask2, dst=red_mask)
+
+            # 反转掩码，保留非红色区域
+            non_red_mask = cv2.bitwise_not(red_mask, dst=red_mask)
+
+            # 应用掩码到灰度图（掩码为0/255，按位与即可，红色区域置0）
+            filtered_gray = cv2.bitwise_and(gray, non_red_mask, dst=red_mask2)
+
+            # 对过滤后的图像进行二值化
+            _, thresh_filtered = cv2.threshold(filtered_gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU,
+                                               dst=mask)
+            return cv2.morphologyEx(thresh_filtered, cv2.MORPH_CLOSE, KERNEL_3, dst=thresh_filtered)
+    else:
+        raise ValueError(f"未知的二值化方法: {method}")
+
+    if method == 'adaptive_large':
+        return _cached(key, f'mask_{method}', compute)
+
+    def timed():
+        with stage_timer.stage(f'threshold.{method}'):
+            return compute()
+    return _cached(key, f'mask_{method}', timed)
+
+# 矩形检测的候选轮廓（标定和测量共用）
+def _rectangle_candidates(image, key, method, min_area=MIN_CONTOUR_AREA):
+    """
+    在指定二值化方法的掩码中查找矩形候选轮廓（带缓存）
+
+    参数:
+        image: 输入图像
+        key: 预处理缓存键
+        method: RECTANGLE_METHODS中的方法名称
+        min_area: 最小轮廓面积
+
+    返回:
+        候选列表，每项为(轮廓, 面积, 最小外接矩形, 轴对齐外接矩形)，已按面积、顶点数和矩形度筛选
+    """
+    mask = _rectangle_mask(image, key, method)
+    if mask is None:
+        return []
+
+    # 查找轮廓
+    contours = _get_contours(key, method, mask)
+
+    def compute():
+        candidates = []
+        # 根据矩形度筛选轮廓，先向量化地按面积批量预筛选，过滤掉太小的轮廓
+        large_contours, stats = select_by_area(contours, min_area)
+        bounds = np.stack([stats['x'], stats['y'], stats['w'], stats['h']], axis=1).astype(int)
+        for cnt, area, perimeter, bound in zip(large_contours, stats['area'], stats['perimeter'], bounds):
+            area = float(area)
+
+            # 对轮廓进行多边形近似（周长已在预筛选时批量算出）
+            epsilon = 0.02 * perimeter
+            approx = cv2.approxPolyDP(cnt, epsilon, True)
+
+            # 判断是否为矩形（四边形）
+            if len(approx) >= 4 and len(approx) <= 10:  # 放宽顶点数量限制
+                # 计算最小外接矩形
+                rect = cv2.minAreaRect(cnt)
+                box = cv2.boxPoints(rect)
+                box = np.int0(box)
+                box_area = cv2.contourArea(box)
+
+                # 计算轮廓面积与其最小外接矩形面积的比值，要求矩形度合理
+                if box_area > 0 and area / box_area > 0.5:
+                    candidates.append((cnt, area, rect, tuple(bound)))
+        return candidates
+
+    def timed():
+        with stage_timer.stage(f'filter.{method}'):
+            return compute()
+    return _cached(key, f'rect_candidates_{method}_{min_area}', timed)
+
+# 选择最大的圆形候选轮廓
+def _select_circle(image, key, min_area=MIN_CONTOUR_AREA):
+    valid_contours = _circle_candidates(image, key, min_area)
     if not valid_contours:
-        return False, image, 0
-    
+        return None
     # 找到最合适的轮廓（假设是圆形）
-    max_contour = max(valid_contours, key=cv2.contourArea)
-    
-    # 计算最小外接圆
-    (x, y), radius = cv2.minEnclosingCircle(max_contour)
-    center = (int(x), int(y))
-    radius = int(radius)
-    
-    # 计算像素/毫米比例
-    pixels_per_mm = radius / actual_radius
-    
-    # 创建结果图像
-    result_image = image.copy() if len(image.shape) == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-    cv2.circle(result_image, center, radius, (0, 255, 0), 2)
+    return max(valid_contours, key=cv2.contourArea)
+
+# 获取策略线程池（延迟创建，进程内共享）
+def _get_strategy_pool():
+    global _strategy_pool
+    with _strategy_pool_lock:
+        if _strategy_pool is None:
+            # 线程数不超过CPU核数：单核机器上各方法按顺序执行
+            workers = _strategy_pool_workers or min(len(RECTANGLE_METHODS), os.cpu_count() or 1)
+            _strategy_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rect-strategy')
+        return _strategy_pool
+
+# 设置策略线程池的线程数
+def set_strategy_workers(workers):
+    """
+    多进程批量测量时每个进程已占用一个核，各进程应设为1，二值化方法按顺序执行，
+    避免进程数×方法数个线程争抢CPU
+
+    参数:
+        workers: 线程数，为None时按CPU核数确定
+    """
+    global _strategy_pool, _strategy_pool_workers
+    with _strategy_pool_lock:
+        _strategy_pool_workers = workers
+        if _strategy_pool is not None:
+            # 已提交的任务在原线程池中执行完毕
+            _strategy_pool.shutdown(wait=False)
+            _strategy_pool = None
+
+# 并行生成各二值化方法的结果
+def _map_rectangle_methods(image, key, func, methods=None):
+    """
+    在线程池中对每种二值化方法并行执行func（OpenCV运算时会释放GIL）
+
+    参数:
+        image: 输入图像
+        key: 预处理缓存键
+        func: 函数 func(method)
+        methods: 要运行的方法列表，默认RECTANGLE_METHODS
+
+    返回:
+        (方法名称, Future) 列表，顺序与methods一致
+    """
+    if methods is None:
+        methods = RECTANGLE_METHODS
+    methods = [m for m in methods if m != 'red_filtered' or len(image.shape) == 3]
+    if key is not None:
+        # 先在当前线程计算各方法共用的模糊图，避免多个线程重复计算
+        _get_blurred(image, key, 5)
+        if 'adaptive_large' in methods:
+            # adaptive_large在adaptive掩码的基础上计算
+            _rectangle_mask(image, key, 'adaptive')
+    pool = _get_strategy_pool()
+    # 策略线程中的阶段耗时计入当前测量
+    func = stage_timer.bind(func)
+    return [(method, pool.submit(func, method)) for method in methods]
+
+# 单个二值化方法中的最佳矩形候选
+def _best_rectangle_candidate(image, key, method, expected_ratio=None, min_area=MIN_CONTOUR_AREA):
+    """
+    在一种二值化方法的候选中选择面积最大的矩形轮廓并计算置信度
+
+    返回:
+        (轮廓, 面积, 置信度)，未找到时返回None
+    """
+    best = None
+    for cnt, area, rect, _ in _rectangle_candidates(image, key, method, min_area):
+        # 获取矩形的宽度和高度
+        width = max(rect[1][0], rect[1][1])
+        height = min(rect[1][0], rect[1][1])
+
+        if expected_ratio is not None:
+            # 计算宽高比
+            aspect_ratio = width / height if height > 0 else 0
+
+            # 检查宽高比是否接近预期值（允许一定误差）
+            ratio_diff = abs(aspect_ratio - expected_ratio) / expected_ratio
+            if ratio_diff >= 0.3:
+                continue
+
+        # 如果面积更大，则更新最佳轮廓
+        if best is None or area > best[1]:
+            rect_area = width * height
+            confidence = min(area / rect_area, 1.0) if rect_area > 0 else 0.0
+            best = (cnt, area, confidence)
+    return best
+
+# 选择最佳的矩形候选轮廓
+def _select_rectangle(image, key, expected_ratio=None, min_area=MIN_CONTOUR_AREA,
+                      early_exit_confidence=None, methods=None):
+    """
+    在所有二值化方法的候选中选择最佳矩形轮廓
+
+    各方法在线程池中并行计算，选择所有方法中面积最大的轮廓。不同方法找到的边缘不同
+    （Canny取外边缘，阈值类方法取内边缘，相差1~2像素），因此只允许methods中的第一个方法
+    提前结束：它单独先运行，最佳候选的置信度达到early_exit_confidence时直接采用，
+    其余方法完全不运行；否则比较所有方法。结果只取决于图像和第一个方法，
+    与其余方法的顺序和线程完成的先后无关。
+
+    参数:
+        image: 输入图像
+        key: 预处理缓存键
+        expected_ratio: 预期宽高比，标定时用于排除宽高比不符的轮廓 (可选)
+        min_area: 最小轮廓面积
+        early_exit_confidence: 提前结束的置信度阈值，为None时使用RECTANGLE_EARLY_EXIT_CONFIDENCE
+        methods: 方法的尝试顺序 (可选)，第一个方法优先单独运行；默认RECTANGLE_METHODS且所有方法同时开始
+
+    返回:
+        (最佳轮廓, 方法名称)，未找到时返回(None, None)
+    """
+    if early_exit_confidence is None:
+        early_exit_confidence = RECTANGLE_EARLY_EXIT_CONFIDENCE
+
+    results = []
+    if methods:
+        # 优先的方法先单独运行，稳定的工位上通常只需要这一种方法
+        preferred, methods = methods[0], methods[1:]
+        best = _best_rectangle_candidate(image, key, preferred, expected_ratio, min_area)
+        if best is not None and early_exit_confidence and best[2] >= early_exit_confidence:
+            return best[0], preferred
+        results.append((preferred, best))
+
+    futures = _map_rectangle_methods(
+        image, key, lambda method: _best_rectangle_candidate(image, key, method, expected_ratio, min_area), methods)
+
+    try:
+        for method, future in futures:
+            # 其余方法不提前结束：边缘位置不同的方法不能仅因排在前面而被选中
+            results.append((method, future.result()))
+    finally:
+        # 取消尚未开始的方法（已在运行的方法结果直接丢弃）
+        running = [future for _, future in futures if not future.cancel()]
+        if isinstance(key, WorkspaceKey):
+            # 工作区的缓冲区在下一帧复用，等已在运行的方法结束，避免它们改写下一帧的掩码
+            wait(running)
+
+    # 比较所有方法找到最佳轮廓
+    best_contour = None
+    best_method = None
+    max_area = 0
+    for method, best in results:
+        if best is not None and best[1] > max_area:
+            max_area = best[1]
+            best_contour = best[0]
+            best_method = method
+
+    return best_contour, best_method
+
+# 在指定区域内查找轮廓
+def _select_in_roi(image, select, roi, min_area=MIN_CONTOUR_AREA, workspace=None):
+    """
+    只在ROI区域内运行检测，返回整幅图像坐标系下的轮廓
+
+    参数:
+        image: 输入图像
+        select: 选择函数 select(image, key, min_area=...)
+        roi: 区域 (x, y, w, h)
+        min_area: 最小轮廓面积
+        workspace: FrameWorkspace实例 (可选)
+
+    返回:
+        轮廓，未找到或轮廓被ROI边界截断时返回None
+    """
+    x, y, w, h = roi
+    crop = image[y:y + h, x:x + w]
+    contour = select(crop, _image_key(crop, workspace), min_area=min_area)
+    if contour is None:
+        return None
+    # 轮廓贴着ROI内部边界说明零件可能被截断，交由全图检测
+    cx, cy, cw, ch = cv2.boundingRect(contour)
+    img_h, img_w = image.shape[:2]
+    if (cx <= 0 and x > 0) or (cy <= 0 and y > 0) or \
+            (cx + cw >= w and x + w < img_w) or (cy + ch >= h and y + h < img_h):
+        return None
+    return contour + np.array([x, y], dtype=contour.dtype)
+
+# 扩展并裁剪区域
+def expand_roi(bounding_rect, margin, image_shape):
+    """
+    将外接矩形向四周扩展margin像素，并裁剪到图像范围内
+
+    返回:
+        整数区域 (x, y, w, h)
+    """
+    x, y, w, h = bounding_rect
+    img_h, img_w = image_shape[:2]
+    x0 = max(int(x - margin), 0)
+    y0 = max(int(y - margin), 0)
+    x1 = min(int(x + w + margin), img_w)
+    y1 = min(int(y + h + margin), img_h)
+    return x0, y0, x1 - x0, y1 - y0
+
+# 由粗到精的金字塔检测
+def _pyramid_roi(image, select, workspace=None):
+    """
+    在缩小的图像上定位候选零件，返回全分辨率下的候选区域
+
+    参数:
+        image: 输入图像
+        select: 选择函数 select(image, key, min_area=...)
+        workspace: FrameWorkspace实例 (可选)
+
+    返回:
+        全分辨率图像中的ROI (x, y, w, h)，图像不够大或粗检测失败时返回None
+    """
+    # 使用整数缩小倍数，INTER_AREA在整数倍时走快速路径
+    factor = -(-max(image.shape[:2]) // PYRAMID_MAX_SIDE)
+    if factor < 2:
+        # 图像本身不大，金字塔没有收益
+        return None
+    scale = 1.0 / factor
+    with stage_timer.stage('pyramid'):
+        dst = None
+        if workspace is not None:
+            # 与cv2.resize按比例缩放时的输出尺寸一致
+            small_shape = (int(round(image.shape[0] * scale)), int(round(image.shape[1] * scale))) + image.shape[2:]
+            dst = workspace.buffer('pyramid', small_shape)
+        small = cv2.resize(image, None, dst=dst, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    # 面积阈值随缩放比例调整
+    contour = select(small, _image_key(small, workspace), min_area=MIN_CONTOUR_AREA * scale * scale)
+    if contour is None:
+        return None
+    x, y, w, h = cv2.boundingRect(contour)
+    bounding_rect = (x / scale, y / scale, (w + 1) / scale, (h + 1) / scale)
+    margin = max(PYRAMID_MIN_MARGIN, PYRAMID_MARGIN_RATIO * max(bounding_rect[2], bounding_rect[3]))
+    return expand_roi(bounding_rect, margin, image.shape)
+
+# 检测单个零件轮廓
+def _detect(image, select, pyramid=False, roi=None, workspace=None):
+    """
+    检测图像中的最佳零件轮廓
+
+    参数:
+        image: 输入图像
+        select: 选择函数 select(image, key, min_area=...)
+        pyramid: 是否使用由粗到精的金字塔检测
+        roi: 优先搜索的区域 (x, y, w, h)，在区域内未找到时回退到全图检测 (可选)
+        workspace: FrameWorkspace实例，提供时中间结果写入预分配的缓冲区、不使用预处理缓存 (可选)
+
+    返回:
+        整幅图像坐标系下的轮廓，未找到时返回None
+    """
+    if roi is not None:
+        roi = expand_roi(roi, 0, image.shape)
+        if roi[2] > 0 and roi[3] > 0:
+            contour = _select_in_roi(image, select, roi, workspace=workspace)
+            if contour is not None:
+                return contour
+    if pyramid:
+        roi = _pyramid_roi(image, select, workspace)
+        if roi is not None:
+            contour = _select_in_roi(image, select, roi, workspace=workspace)
+            if contour is not None:
+                return contour
+    # 全分辨率检测
+    return select(image, _image_key(image, workspace))
+
+# 定位圆形零件
+def locate_circle(image, roi=None, pyramid=False, workspace=None):
+    """
+    定位图像中的圆形零件轮廓（不做测量和标注）
     
-    # 使用支持中文的文本绘制函数
-    result_image = put_chinese_text(result_image, f"半径: {radius} pixels = {actual_radius} mm", 
-                (center[0] - 100, center[1] + radius + 30), 30, (0, 0, 255))
-    result_image = put_chinese_text(result_image, f"比例: {pixels_per_mm:.4f} pixels/mm", 
-                (center[0] - 100, center[1] + radius + 60), 30, (0, 0, 255))
+    参数:
+        image: 输入图像
+        roi: 优先搜索的区域 (x, y, w, h)，区域内未找到时回退到全图检测 (可选)
+        pyramid: 是否使用由粗到精的金字塔检测
+        workspace: FrameWorkspace实例，用于摄像头连续测量 (可选)
+        
+    返回:
+        零件轮廓，未找到时返回None
+    """
+    return _detect(image, _select_circle, pyramid, roi, workspace)
+
+# 定位矩形零件
+def locate_rectangle(image, roi=None, pyramid=False, expected_ratio=None, early_exit_confidence=None,
+                     workspace=None):
+    """
+    定位图像中的矩形零件轮廓（不做测量和标注）
     
-    return True, result_image, pixels_per_mm
+    参数:
+        image: 输入图像
+        roi: 优先搜索的区域 (x, y, w, h)，区域内未找到时回退到全图检测 (可选)
+        pyramid: 是否使用由粗到精的金字塔检测
+        expected_ratio: 预期宽高比 (可选)
+        early_exit_confidence: 提前结束的置信度阈值，默认RECTANGLE_EARLY_EXIT_CONFIDENCE，0表示比较所有方法
+        workspace: FrameWorkspace实例，用于摄像头连续测量 (可选)
+        
+    返回:
+        零件轮廓，未找到时返回None
+    """
+    return _locate_rectangle(image, roi, pyramid, expected_ratio, early_exit_confidence, workspace=workspace)[0]
 
-# 矩形标定函数
-def calibrate_rectangle(image, actual_width, actual_height):
+# 定位矩形零件，同时返回选中的二值化方法
+def _locate_rectangle(image, roi=None, pyramid=False, expected_ratio=None, early_exit_confidence=None,
+                      methods=None, workspace=None):
     """
-    对矩形进行标定
+    返回:
+        (零件轮廓, 二值化方法名称)，未找到时返回(None, None)
+    """
+    selected = {}
+
+    def select(img, key, min_area=MIN_CONTOUR_AREA):
+        # 最终采用的轮廓总是来自最后一次选择
+        contour, selected['method'] = _select_rectangle(img, key, expected_ratio, min_area,
+                                                        early_exit_confidence, methods)
+        return contour
+
+    contour = _detect(image, select, pyramid, roi, workspace)
+    if contour is None:
+        return None, None
+    return contour, selected['method']
+
+# 按相机几何校正轮廓点
+def _correct_contour(contour, image_shape, geometry):
+    """
+    参数:
+        contour: 原图坐标系下的轮廓
+        image_shape: 图像的shape
+        geometry: CameraGeometry实例 (可选)
+
+    返回:
+        校正坐标下的轮廓点（float32）；未提供几何校正或图像分辨率与标定时不同时返回原轮廓
+    """
+    if geometry is None or not geometry.applies_to(image_shape):
+        return contour
+    with stage_timer.stage('geometry'):
+        return geometry.correct_points(contour)
+
+# 组装结果中的耗时字典
+def _timings(start_time, detect_time, end_time, stage_timings):
+    """
+    返回:
+        {'detect_ms', 'total_ms'}，开启分阶段计时时还包含各阶段的 '<阶段>_ms'
+    """
+    timings = {'detect_ms': (detect_time - start_time) * 1000, 'total_ms': (end_time - start_time) * 1000}
+    for name, elapsed_ms in stage_timings.items():
+        timings[f'{name}_ms'] = elapsed_ms
+    return timings
+
+# 圆形检测与测量（纯计算，不生成图像）
+def analyze_circle(image, pixels_per_mm=None, pyramid=False, roi=None, workspace=None, geometry=None):
+    """
+    检测并测量圆形零件，只返回数值结果，不复制图像也不绘制标注
     
     参数:
         image: 输入图像
-        actual_width: 实际宽度(mm)
-        actual_height: 实际高度(mm)
+        pixels_per_mm: 像素/毫米比例，为None时只计算像素尺寸（用于标定）
+        pyramid: 是否使用由粗到精的金字塔检测（适合高分辨率图像）
+        roi: 优先搜索的区域 (x, y, w, h) (可选)
+        workspace: FrameWorkspace实例，摄像头连续测量时复用预分配的缓冲区 (可选)
+        geometry: CameraGeometry实例 (可选)，提供时在校正后的轮廓点上计算半径；圆心仍为原图坐标
         
     返回:
-        success: 是否成功
-        result_image: 标定结果图像
-        pixels_per_mm_width: 宽度方向像素/毫米比例
-        pixels_per_mm_height: 高度方向像素/毫米比例
+        CircleMeasurement
     """
-    # 保存原始图像用于结果显示
-    original_image = image.copy()
+    start_time = time.perf_counter()
+    with stage_timer.collect() as stage_timings:
+        contour = locate_circle(image, roi, pyramid, workspace)
+    detect_time = time.perf_counter()
     
-    # 转换为灰度图
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-    else:
-        gray = image.copy()
+    if contour is None:
+        return CircleMeasurement(timings=_timings(start_time, detect_time, detect_time, stage_timings))
     
-    # 高斯模糊减少噪声
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # 尝试多种边缘检测和二值化方法
-    methods = []
-    
-    # 方法1: 自适应二值化
-    thresh1 = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-    thresh1 = cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, kernel)
-    methods.append(thresh1)
-    
-    # 方法2: Otsu二值化
-    _, thresh2 = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    thresh2 = cv2.morphologyEx(thresh2, cv2.MORPH_CLOSE, kernel)
-    methods.append(thresh2)
-    
-    # 方法3: Canny边缘检测
-    edges = cv2.Canny(blurred, 30, 150)
-    dilated_edges = cv2.dilate(edges, kernel, iterations=1)
-    methods.append(dilated_edges)
-    
-    # 方法4: 使用更大的结构元素进行形态学操作
-    kernel_large = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-    thresh3 = cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, kernel_large)
-    methods.append(thresh3)
-    
-    # 颜色过滤 - 如果是彩色图像，尝试过滤掉红色区域（如国徽）
-    if len(image.shape) == 3:
-        # 转换到HSV颜色空间
-        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        
-        # 定义红色范围
-        lower_red1 = np.array([0, 70, 50])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([170, 70, 50])
-        upper_red2 = np.array([180, 255, 255])
-        
-        # 创建红色掩码
-        mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-        mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-        red_mask = cv2.bitwise_or(mask1, mask2)
-        
-        # 反转掩码，保留非红色区域
-        non_red_mask = cv2.bitwise_not(red_mask)
-        
-        # 应用掩码到灰度图
-        filtered_gray = cv2.bitwise_and(gray, gray, mask=non_red_mask)
-        
-        # 对过滤后的图像进行二值化
-        _, thresh_filtered = cv2.threshold(filtered_gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        thresh_filtered = cv2.morphologyEx(thresh_filtered, cv2.MORPH_CLOSE, kernel)
-        methods.append(thresh_filtered)
+    # 计算最小外接圆
+    (x, y), radius = cv2.minEnclosingCircle(contour)
+    points = _correct_contour(contour, image.shape, geometry)
+    if points is not contour:
+        # 半径在校正坐标中计算，消除镜头畸变和透视造成的随位置变化
+        _, radius = cv2.minEnclosingCircle(points)
+    radius = int(radius)
     
-    # 尝试所有方法找到最佳轮廓
-    best_contour = None
-    max_area = 0
-    min_area_threshold = 1000  # 最小面积阈值，避免小噪点
+    # 轮廓面积与外接圆面积之比作为置信度
+    circle_area = np.pi * radius * radius
+    confidence = min(cv2.contourArea(points) / circle_area, 1.0) if circle_area > 0 else 0.0
+    
+    end_time = time.perf_counter()
+    return CircleMeasurement(
+        success=True,
+        center=(int(x), int(y)),
+        radius_pixels=radius,
+        # 计算实际半径(mm)
+        measured_radius=radius / pixels_per_mm if pixels_per_mm else 0,
+        contour=contour,
+        confidence=confidence,
+        timings=_timings(start_time, detect_time, end_time, stage_timings)
+    )
+
+# 矩形检测与测量（纯计算，不生成图像）
+def analyze_rectangle(image, pixels_per_mm_width=None, pixels_per_mm_height=None, pyramid=False, roi=None,
+                      expected_ratio=None, early_exit_confidence=None, strategy_stats=None, workspace=None,
+                      geometry=None, calibrated_method=None):
+    """
+    检测并测量矩形零件，只返回数值结果，不复制图像也不绘制标注
     
-    for method_img in methods:
-        # 查找轮廓
-        contours, _ = cv2.findContours(method_img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    参数:
+        image: 输入图像
+        pixels_per_mm_width: 宽度方向像素/毫米比例，为None时只计算像素尺寸（用于标定）
+        pixels_per_mm_height: 高度方向像素/毫米比例
+        pyramid: 是否使用由粗到精的金字塔检测（适合高分辨率图像）
+        roi: 优先搜索的区域 (x, y, w, h) (可选)
+        expected_ratio: 预期宽高比，用于排除宽高比不符的轮廓 (可选)
+        early_exit_confidence: 提前结束的置信度阈值，默认RECTANGLE_EARLY_EXIT_CONFIDENCE，0表示比较所有方法
+        strategy_stats: StrategyStats实例 (可选)，按历史胜出次数决定标定方法之后其余方法的顺序，并记录本次胜出的方法
+        workspace: FrameWorkspace实例，摄像头连续测量时复用预分配的缓冲区 (可选)
+        geometry: CameraGeometry实例 (可选)，提供时在校正后的轮廓点上计算长宽；标注用的中心、角度和顶点仍为原图坐标
+        calibrated_method: 标定时选中的二值化方法 (可选)。不同方法找到的边缘相差1~2像素，
+            测量时先单独运行该方法，达到置信度阈值时直接采用，使测量与标定量的是同一条边缘；
+            未提供时（标定本身或旧的标定数据）比较所有方法，选择面积最大的轮廓
         
-        # 根据矩形度筛选轮廓
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            
-            # 过滤掉太小的轮廓
-            if area < min_area_threshold:
-                continue
-            
-            # 计算轮廓的周长
-            perimeter = cv2.arcLength(cnt, True)
-            
-            # 对轮廓进行多边形近似
-            epsilon = 0.02 * perimeter
-            approx = cv2.approxPolyDP(cnt, epsilon, True)
-            
-            # 判断是否为矩形（四边形）
-            if len(approx) >= 4 and len(approx) <= 10:  # 放宽顶点数量限制
-                # 计算最小外接矩形
-                rect = cv2.minAreaRect(cnt)
-                box = cv2.boxPoints(rect)
-                box = np.int0(box)
-                box_area = cv2.contourArea(box)
-                
-                # 计算轮廓面积与其最小外接矩形面积的比值
-                if box_area > 0:
-                    rect_ratio = area / box_area
-                    
-                    # 获取矩形的宽度和高度
-                    width = max(rect[1][0], rect[1][1])
-                    height = min(rect[1][0], rect[1][1])
-                    
-                    # 计算宽高比，身份证和信用卡的宽高比约为1.6
-                    aspect_ratio = width / height if height > 0 else 0
-                    
-                    # 检查宽高比是否接近预期值（允许一定误差）
-                    expected_ratio = actual_width / actual_height
-                    ratio_diff = abs(aspect_ratio - expected_ratio) / expected_ratio
-                    
-                    # 综合考虑面积、矩形度和宽高比
-                    if rect_ratio > 0.5 and ratio_diff < 0.3 and area > max_area:
-                        max_area = area
-                        best_contour = cnt
-    
-    if best_contour is None:
-        return False, image, 0, 0
+    返回:
+        RectangleMeasurement
+    """
+    start_time = time.perf_counter()
+    methods = None
+    if calibrated_method in RECTANGLE_METHODS:
+        # 历史统计只决定标定方法之后其余方法的顺序，不改变优先运行的方法
+        order = strategy_stats.ordered_methods() if strategy_stats is not None else None
+        methods = [calibrated_method] + [m for m in order or RECTANGLE_METHODS if m != calibrated_method]
+    with stage_timer.collect() as stage_timings:
+        contour, method = _locate_rectangle(image, roi, pyramid, expected_ratio, early_exit_confidence, methods,
+                                            workspace)
+    if strategy_stats is not None:
+        strategy_stats.record(method)
+    detect_time = time.perf_counter()
+    
+    if contour is None:
+        return RectangleMeasurement(timings=_timings(start_time, detect_time, detect_time, stage_timings))
     
     # 计算最小外接矩形
-    rect = cv2.minAreaRect(best_contour)
+    rect = cv2.minAreaRect(contour)
     box = cv2.boxPoints(rect)
     box = np.int0(box)
     
-    # 获取矩形的宽度和高度（像素）
-    width = rect[1][0]
-    height = rect[1][1]
+    # 获取矩形的宽度和高度（像素），有几何校正时在校正坐标中计算
+    points = _correct_contour(contour, image.shape, geometry)
+    width, height = rect[1] if points is contour else cv2.minAreaRect(points)[1]
     
     # 确保宽度大于高度
     if width < height:
         width, height = height, width
     
-    # 计算像素/毫米比例
-    pixels_per_mm_width = width / actual_width
-    pixels_per_mm_height = height / actual_height
+    # 轮廓面积与最小外接矩形面积之比作为置信度
+    rect_area = width * height
+    confidence = min(cv2.contourArea(points) / rect_area, 1.0) if rect_area > 0 else 0.0
+    
+    end_time = time.perf_counter()
+    return RectangleMeasurement(
+        success=True,
+        center=(int(rect[0][0]), int(rect[0][1])),
+        angle=rect[2],
+        width_pixels=width,
+        height_pixels=height,
+        # 计算实际尺寸(mm)
+        measured_width=width / pixels_per_mm_width if pixels_per_mm_width else 0,
+        measured_height=height / pixels_per_mm_height if pixels_per_mm_height else 0,
+        box=box,
+        contour=contour,
+        method=method,
+        confidence=confidence,
+        timings=_timings(start_time, detect_time, end_time, stage_timings)
+    )
+
+# 绘制圆形测量结果
+def annotate_circle(image, result, labels=None):
+    """
+    按测量结果生成标注图像（按需调用，纯计算接口不会生成图像）
+    
+    参数:
+        image: 输入图像
+        result: CircleMeasurement
+        labels: 标注文本列表，默认显示测量半径
+        
+    返回:
+        标注后的图像副本
+    """
+    if labels is None:
+        labels = [f"半径: {result.radius_pixels} pixels = {result.measured_radius:.2f} mm"]
     
     # 创建结果图像
-    result_image = image.copy() if len(image.shape) == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-    cv2.drawContours(result_image, [box], 0, (0, 255, 0), 2)
+    with stage_timer.stage('draw'):
+        result_image = image.copy() if len(image.shape) == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        center, radius = result.center, result.radius_pixels
+        cv2.circle(result_image, center, radius, (0, 255, 0), 2)
     
-    # 计算矩形中心点
-    center_x = int(rect[0][0])
-    center_y = int(rect[0][1])
+    # 使用支持中文的文本绘制函数
+    with stage_timer.stage('text'):
+        for i, text in enumerate(labels, start=1):
+            put_chinese_text(result_image, text, (center[0] - 100, center[1] + radius + 30 * i), 30, (0, 0, 255),
+                             inplace=True)
+    return result_image
+
+# 绘制矩形测量结果
+def annotate_rectangle(image, result, labels=None):
+    """
+    按测量结果生成标注图像（按需调用，纯计算接口不会生成图像）
+    
+    参数:
+        image: 输入图像
+        result: RectangleMeasurement
+        labels: 标注文本列表，默认显示测量长度和宽度
+        
+    返回:
+        标注后的图像副本
+    """
+    if labels is None:
+        labels = [f"长度: {result.width_pixels:.1f} pixels = {result.measured_width:.2f} mm",
+                  f"宽度: {result.height_pixels:.1f} pixels = {result.measured_height:.2f} mm"]
+    
+    # 创建结果图像
+    with stage_timer.stage('draw'):
+        result_image = image.copy() if len(image.shape) == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        cv2.drawContours(result_image, [result.box], 0, (0, 255, 0), 2)
     
     # 添加标注，使用支持中文的文本绘制函数
-    result_image = put_chinese_text(result_image, f"长度: {width:.1f} pixels = {actual_width} mm", 
-                (center_x - 100, center_y + int(height/2) + 30), 30, (0, 0, 255))
-    result_image = put_chinese_text(result_image, f"宽度: {height:.1f} pixels = {actual_height} mm", 
-                (center_x - 100, center_y + int(height/2) + 60), 30, (0, 0, 255))
-    result_image = put_chinese_text(result_image, f"比例 宽: {pixels_per_mm_width:.4f} px/mm, 高: {pixels_per_mm_height:.4f} px/mm", 
-                (center_x - 100, center_y + int(height/2) + 90), 30, (0, 0, 255))
+    center_x, center_y = result.center
+    with stage_timer.stage('text'):
+        for i, text in enumerate(labels, start=1):
+            put_chinese_text(result_image, text, (center_x - 100, center_y + int(result.height_pixels/2) + 30 * i),
+                             30, (0, 0, 255), inplace=True)
+    return result_image
+
+# 圆形标定函数
+def calibrate_circle(image, actual_radius, pyramid=False, roi=None, geometry=None):
+    """
+    对圆形进行标定
     
-    return True, result_image, pixels_per_mm_width, pixels_per_mm_height
+    参数:
+        image: 输入图像
+        actual_radius: 实际半径(mm)
+        pyramid: 是否使用由粗到精的金字塔检测（适合高分辨率图像）
+        roi: 优先搜索的区域 (x, y, w, h)，用于摄像头连续测量时只在上次检测位置附近搜索 (可选)
+        geometry: CameraGeometry实例 (可选)，提供时得到校正坐标下的比例
+        
+    返回:
+        success: 是否成功
+        result_image: 标定结果图像
+        pixels_per_mm: 像素/毫米比例
+    """
+    result = analyze_circle(image, None, pyramid, roi, geometry=geometry)
+    if not result.success:
+        return False, image, 0
+    
+    # 计算像素/毫米比例
+    pixels_per_mm = result.radius_pixels / actual_radius
+    
+    result_image = annotate_circle(image, result, [
+        f"半径: {result.radius_pixels} pixels = {actual_radius} mm",
+        f"比例: {pixels_per_mm:.4f} pixels/mm"
+    ])
+    return True, result_image, pixels_per_mm
+
+# 矩形标定函数
+def calibrate_rectangle(image, actual_width, actual_height, pyramid=False, roi=None, strategy_stats=None,
+                        geometry=None):
+    """
+    对矩形进行标定
+    
+    参数:
+        image: 输入图像
+        actual_width: 实际宽度(mm)
+        actual_height: 实际高度(mm)
+        pyramid: 是否使用由粗到精的金字塔检测（适合高分辨率图像）
+        roi: 优先搜索的区域 (x, y, w, h)，用于摄像头连续测量时只在上次检测位置附近搜索 (可选)
+        strategy_stats: StrategyStats实例，记录本次选中的二值化方法 (可选)
+        geometry: CameraGeometry实例 (可选)，提供时得到校正坐标下的比例
+        
+    返回:
+        success: 是否成功
+        result_image: 标定结果图像
+        pixels_per_mm_width: 宽度方向像素/毫米比例
+        pixels_per_mm_height: 高度方向像素/毫米比例
+        method: 选中的二值化方法，应随标定数据保存，测量时作为calibrated_method传入
+    """
+    # 综合考虑面积、矩形度和宽高比找到最佳轮廓，身份证和信用卡的宽高比约为1.6；
+    # 比较所有二值化方法，结果与历史统计的方法顺序无关
+    result = analyze_rectangle(image, None, None, pyramid, roi, expected_ratio=actual_width / actual_height,
+                               strategy_stats=strategy_stats, geometry=geometry)
+    if not result.success:
+        return False, image, 0, 0, None
+    
+    # 计算像素/毫米比例
+    pixels_per_mm_width = result.width_pixels / actual_width
+    pixels_per_mm_height = result.height_pixels / actual_height
+    
+    result_image = annotate_rectangle(image, result, [
+        f"长度: {result.width_pixels:.1f} pixels = {actual_width} mm",
+        f"宽度: {result.height_pixels:.1f} pixels = {actual_height} mm",
+        f"比例 宽: {pixels_per_mm_width:.4f} px/mm, 高: {pixels_per_mm_height:.4f} px/mm"
+    ])
+    return True, result_image, pixels_per_mm_width, pixels_per_mm_height, result.method
 
 # 圆形测量函数
-def measure_circle(image, pixels_per_mm):
+def measure_circle(image, pixels_per_mm, pyramid=False, roi=None, geometry=None):
     """
     测量圆形
     
     参数:
         image: 输入图像
         pixels_per_mm: 像素/毫米比例
+        pyramid: 是否使用由粗到精的金字塔检测（适合高分辨率图像）
+        roi: 优先搜索的区域 (x, y, w, h)，用于摄像头连续测量时只在上次检测位置附近搜索 (可选)
+        geometry: CameraGeometry实例 (可选)，校正镜头畸变和透视
         
     返回:
         success: 是否成功
         result_image: 测量结果图像
         measured_radius: 测量半径(mm)
     """
-    # 转换为灰度图
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-    else:
-        gray = image.copy()
-    
-    # 高斯模糊减少噪声
-    blurred = cv2.GaussianBlur(gray, (7, 7), 0)  # 增加高斯核大小
-    
-    # 尝试多种二值化方法
-    # 自适应二值化
-    thresh1 = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 15, 2)  # 增加块大小
-    
-    # 形态学操作改善轮廓
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
-    thresh = cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, kernel)
-    
-    # 查找轮廓
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    # 根据矩形度筛选轮廓
-    valid_contours = []
-    min_area = 1000  # 增加最小面积阈值，避免小噪点
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-        if area < min_area:
-            continue
-        # 计算轮廓的周长
-        perimeter = cv2.arcLength(cnt, True)
-        # 对轮廓进行多边形近似
-        epsilon = 0.04 * perimeter  # 增加近似精度参数，更宽松的多边形近似
-        approx = cv2.approxPolyDP(cnt, epsilon, True)
-        # 判断是否为矩形（四边形）
-        if len(approx) >= 4 and len(approx) <= 6:  # 允许4-6个顶点，更宽松的四边形判断
-            # 计算最小外接矩形的面积
-            rect = cv2.minAreaRect(cnt)
-            box = cv2.boxPoints(rect)
-            box_area = cv2.contourArea(box)
-            # 计算轮廓面积与其最小外接矩形面积的比值
-            if box_area > 0:
-                rect_ratio = area / box_area
-                # 如果比值接近1，说明轮廓更接近矩形，降低阈值使检测更宽松
-                if rect_ratio > 0.7:
-                    valid_contours.append(cnt)
-    
-    if not valid_contours:
+    result = analyze_circle(image, pixels_per_mm, pyramid, roi, geometry=geometry)
+    if not result.success:
         return False, image, 0
-    
-    # 找到最合适的轮廓（假设是圆形）
-    max_contour = max(valid_contours, key=cv2.contourArea)
-    
-    # 计算最小外接圆
-    (x, y), radius = cv2.minEnclosingCircle(max_contour)
-    center = (int(x), int(y))
-    radius = int(radius)
-    
-    # 计算实际半径(mm)
-    measured_radius = radius / pixels_per_mm
-    
-    # 创建结果图像
-    result_image = image.copy() if len(image.shape) == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-    cv2.circle(result_image, center, radius, (0, 255, 0), 2)
-    # 使用支持中文的文本绘制函数
-    result_image = put_chinese_text(result_image, f"半径: {radius} pixels = {measured_radius:.2f} mm", 
-                (center[0] - 100, center[1] + radius + 30), 30, (0, 0, 255))
-    
-    return True, result_image, measured_radius
+    return True, annotate_circle(image, result), result.measured_radius
 
 # 矩形测量函数
-def measure_rectangle(image, pixels_per_mm_width, pixels_per_mm_height):
+def measure_rectangle(image, pixels_per_mm_width, pixels_per_mm_height, pyramid=False, roi=None, strategy_stats=None,
+                      geometry=None, calibrated_method=None):
     """
     测量矩形
     
@@ -348,6 +908,11 @@ def measure_rectangle(image, pixels_per_mm_width, pixels_per_mm_height):
         image: 输入图像
         pixels_per_mm_width: 宽度方向像素/毫米比例
         pixels_per_mm_height: 高度方向像素/毫米比例
+        pyramid: 是否使用由粗到精的金字塔检测（适合高分辨率图像）
+        roi: 优先搜索的区域 (x, y, w, h)，用于摄像头连续测量时只在上次检测位置附近搜索 (可选)
+        strategy_stats: StrategyStats实例，按历史胜出次数决定二值化方法的顺序 (可选)
+        geometry: CameraGeometry实例 (可选)，校正镜头畸变和透视
+        calibrated_method: 标定时选中的二值化方法 (可选)，测量时优先使用
         
     返回:
         success: 是否成功
@@ -355,146 +920,143 @@ def measure_rectangle(image, pixels_per_mm_width, pixels_per_mm_height):
         measured_width: 测量宽度(mm)
         measured_height: 测量高度(mm)
     """
-    # 保存原始图像用于结果显示
-    original_image = image.copy()
-    
-    # 转换为灰度图
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-    else:
-        gray = image.copy()
-    
-    # 高斯模糊减少噪声
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # 尝试多种边缘检测和二值化方法
-    methods = []
-    
-    # 方法1: 自适应二值化
-    thresh1 = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-    thresh1 = cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, kernel)
-    methods.append(thresh1)
-    
-    # 方法2: Otsu二值化
-    _, thresh2 = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    thresh2 = cv2.morphologyEx(thresh2, cv2.MORPH_CLOSE, kernel)
-    methods.append(thresh2)
-    
-    # 方法3: Canny边缘检测
-    edges = cv2.Canny(blurred, 30, 150)
-    dilated_edges = cv2.dilate(edges, kernel, iterations=1)
-    methods.append(dilated_edges)
-    
-    # 方法4: 使用更大的结构元素进行形态学操作
-    kernel_large = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-    thresh3 = cv2.morphologyEx(thresh1, cv2.MORPH_CLOSE, kernel_large)
-    methods.append(thresh3)
-    
-    # 颜色过滤 - 如果是彩色图像，尝试过滤掉红色区域（如国徽）
-    if len(image.shape) == 3:
-        # 转换到HSV颜色空间
-        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        
-        # 定义红色范围
-        lower_red1 = np.array([0, 70, 50])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([170, 70, 50])
-        upper_red2 = np.array([180, 255, 255])
-        
-        # 创建红色掩码
-        mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-        mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-        red_mask = cv2.bitwise_or(mask1, mask2)
-        
-        # 反转掩码，保留非红色区域
-        non_red_mask = cv2.bitwise_not(red_mask)
-        
-        # 应用掩码到灰度图
-        filtered_gray = cv2.bitwise_and(gray, gray, mask=non_red_mask)
-        
-        # 对过滤后的图像进行二值化
-        _, thresh_filtered = cv2.threshold(filtered_gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        thresh_filtered = cv2.morphologyEx(thresh_filtered, cv2.MORPH_CLOSE, kernel)
-        methods.append(thresh_filtered)
-    
-    # 尝试所有方法找到最佳轮廓
-    best_contour = None
-    max_area = 0
-    min_area_threshold = 1000  # 最小面积阈值，避免小噪点
-    
-    for method_img in methods:
-        # 查找轮廓
-        contours, _ = cv2.findContours(method_img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # 根据矩形度筛选轮廓
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            
-            # 过滤掉太小的轮廓
-            if area < min_area_threshold:
-                continue
-            
-            # 计算轮廓的周长
-            perimeter = cv2.arcLength(cnt, True)
-            
-            # 对轮廓进行多边形近似
-            epsilon = 0.02 * perimeter
-            approx = cv2.approxPolyDP(cnt, epsilon, True)
-            
-            # 判断是否为矩形（四边形）
-            if len(approx) >= 4 and len(approx) <= 10:  # 放宽顶点数量限制
-                # 计算最小外接矩形
-                rect = cv2.minAreaRect(cnt)
-                box = cv2.boxPoints(rect)
-                box = np.int0(box)
-                box_area = cv2.contourArea(box)
-                
-                # 计算轮廓面积与其最小外接矩形面积的比值
-                if box_area > 0:
-                    rect_ratio = area / box_area
-                    
-                    # 获取矩形的宽度和高度
-                    width = max(rect[1][0], rect[1][1])
-                    height = min(rect[1][0], rect[1][1])
-                    
-                    # 如果面积更大且矩形度合理，则更新最佳轮廓
-                    if rect_ratio > 0.5 and area > max_area:
-                        max_area = area
-                        best_contour = cnt
-    
-    if best_contour is None:
+    result = analyze_rectangle(image, pixels_per_mm_width, pixels_per_mm_height, pyramid, roi,
+                               strategy_stats=strategy_stats, geometry=geometry, calibrated_method=calibrated_method)
+    if not result.success:
         return False, image, 0, 0
+    return True, annotate_rectangle(image, result), result.measured_width, result.measured_height
+
+# 多零件圆形测量函数
+def measure_circles(image, pixels_per_mm, geometry=None):
+    """
+    一次检测并测量画面中的所有圆形零件
     
-    # 计算最小外接矩形
-    rect = cv2.minAreaRect(best_contour)
-    box = cv2.boxPoints(rect)
-    box = np.int0(box)
-    
-    # 获取矩形的宽度和高度（像素）
-    width = rect[1][0]
-    height = rect[1][1]
-    
-    # 确保宽度大于高度
-    if width < height:
-        width, height = height, width
+    参数:
+        image: 输入图像
+        pixels_per_mm: 像素/毫米比例
+        geometry: CameraGeometry实例 (可选)，校正镜头畸变和透视
+        
+    返回:
+        success: 是否至少检测到一个零件
+        result_image: 标注了编号和尺寸的测量结果图像
+        parts: 零件列表，每项为字典 {index, center, radius_pixels, measured_radius}
+    """
+    key = preprocess_cache.image_key(image)
+    valid_contours = _circle_candidates(image, key)
     
-    # 计算实际尺寸(mm)
-    measured_width = width / pixels_per_mm_width
-    measured_height = height / pixels_per_mm_height
+    if not valid_contours:
+        return False, image, []
+    
+    # 仅对通过筛选的少量轮廓计算最小外接圆
+    circles = [cv2.minEnclosingCircle(cnt) for cnt in valid_contours]
+    centers = np.array([center for center, _ in circles])
+    radii = np.array([radius for _, radius in circles])
+    
+    # 按阅读顺序编号
+    order = reading_order(centers, row_tolerance=float(np.median(radii)))
+    
+    parts = []
+    for index, i in enumerate(order, start=1):
+        radius = int(radii[i])
+        points = _correct_contour(valid_contours[i], image.shape, geometry)
+        if points is not valid_contours[i]:
+            # 标注使用原图中的圆，尺寸在校正坐标中计算
+            radius_pixels = int(cv2.minEnclosingCircle(points)[1])
+        else:
+            radius_pixels = radius
+        parts.append({
+            'index': index,
+            'center': (int(centers[i][0]), int(centers[i][1])),
+            'radius_pixels': radius_pixels,
+            'measured_radius': radius_pixels / pixels_per_mm,
+            'draw_radius': radius
+        })
     
     # 创建结果图像
     result_image = image.copy() if len(image.shape) == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-    cv2.drawContours(result_image, [box], 0, (0, 255, 0), 2)
+    for part in parts:
+        center, radius = part['center'], part.pop('draw_radius')
+        cv2.circle(result_image, center, radius, (0, 255, 0), 2)
+        result_image = put_chinese_text(result_image, f"#{part['index']}",
+                    (center[0] - 15, center[1] - 15), 30, (0, 0, 255), inplace=True)
+        result_image = put_chinese_text(result_image, f"#{part['index']} 半径: {part['measured_radius']:.2f} mm",
+                    (center[0] - 100, center[1] + radius + 10), 30, (0, 0, 255), inplace=True)
+    
+    return True, result_image, parts
+
+# 多零件矩形测量函数
+def measure_rectangles(image, pixels_per_mm_width, pixels_per_mm_height, geometry=None):
+    """
+    一次检测并测量画面中的所有矩形零件
     
-    # 计算矩形中心点
-    center_x = int(rect[0][0])
-    center_y = int(rect[0][1])
+    所有二值化方法的候选轮廓合并后，先去掉包围多个零件的外框（如整张A4纸），再做非极大值抑制，
+    同一零件只保留面积最大的一次检测，零件内部的印刷区域也一并去掉。
     
-    # 添加标注，使用支持中文的文本绘制函数
-    result_image = put_chinese_text(result_image, f"长度: {width:.1f} pixels = {measured_width:.2f} mm", 
-                (center_x - 100, center_y + int(height/2) + 30), 30, (0, 0, 255))
-    result_image = put_chinese_text(result_image, f"宽度: {height:.1f} pixels = {measured_height:.2f} mm", 
-                (center_x - 100, center_y + int(height/2) + 60), 30, (0, 0, 255))
+    参数:
+        image: 输入图像
+        pixels_per_mm_width: 宽度方向像素/毫米比例
+        pixels_per_mm_height: 高度方向像素/毫米比例
+        geometry: CameraGeometry实例 (可选)，校正镜头畸变和透视
+        
+    返回:
+        success: 是否至少检测到一个零件
+        result_image: 标注了编号和尺寸的测量结果图像
+        parts: 零件列表，每项为字典 {index, center, angle, width_pixels, height_pixels,
+               measured_width, measured_height}
+    """
+    key = preprocess_cache.image_key(image)
+    
+    candidates = []
+    futures = _map_rectangle_methods(image, key, lambda method: _rectangle_candidates(image, key, method))
+    for _, future in futures:
+        candidates.extend(future.result())
+    
+    if not candidates:
+        return False, image, []
+    
+    # 去掉包围多个零件的外框，再合并各方法的重复检测和零件内部的区域
+    containers = set(find_containers([bound for _, _, _, bound in candidates]))
+    candidates = [candidate for i, candidate in enumerate(candidates) if i not in containers]
+    boxes = [bound for _, _, _, bound in candidates]
+    areas = [area for _, area, _, _ in candidates]
+    keep = suppress_overlaps(boxes, areas)
+    rects = [candidates[i][2] for i in keep]
+    contours = [candidates[i][0] for i in keep]
+    
+    # 按阅读顺序编号
+    centers = np.array([rect[0] for rect in rects])
+    heights = np.array([min(rect[1]) for rect in rects])
+    order = reading_order(centers, row_tolerance=float(np.median(heights)))
+    
+    parts = []
+    for index, i in enumerate(order, start=1):
+        rect = rects[i]
+        # 有几何校正时在校正坐标中计算长宽，标注仍使用原图中的外接矩形
+        points = _correct_contour(contours[i], image.shape, geometry)
+        size = rect[1] if points is contours[i] else cv2.minAreaRect(points)[1]
+        # 确保宽度大于高度
+        width = max(size[0], size[1])
+        height = min(size[0], size[1])
+        parts.append({
+            'index': index,
+            'center': (int(rect[0][0]), int(rect[0][1])),
+            'angle': rect[2],
+            'width_pixels': width,
+            'height_pixels': height,
+            'measured_width': width / pixels_per_mm_width,
+            'measured_height': height / pixels_per_mm_height,
+            'box': cv2.boxPoints(rect).astype(np.int32)
+        })
     
-    return True, result_image, measured_width, measured_height
\ No newline at end of file
+    # 创建结果图像
+    result_image = image.copy() if len(image.shape) == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    for part in parts:
+        cv2.drawContours(result_image, [part['box']], 0, (0, 255, 0), 2)
+        center_x, center_y = part['center']
+        result_image = put_chinese_text(result_image, f"#{part['index']}",
+                    (center_x - 15, center_y - 15), 30, (0, 0, 255), inplace=True)
+        result_image = put_chinese_text(result_image,
+                    f"#{part['index']} {part['measured_width']:.2f} x {part['measured_height']:.2f} mm",
+                    (center_x - 100, center_y + int(part['height_pixels']/2) + 10), 30, (0, 0, 255), inplace=True)
+    
+    return True, result_image, parts
@@ -0,0 +1,149 @@
+import time
+from threading import Thread, Lock
+
+import cv2
+
+from text_utils import put_chinese_text
+
+class LiveMeasurementScheduler:
+    """实时测量调度器
+
+    在独立线程中运行测量，每次只取摄像头的最新帧，处理期间到达的旧帧直接丢弃；
+    处理速率不超过target_fps。测量线程与摄像头捕获线程互不等待，
+    分析再慢也不会拖慢画面采集。
+    """
+    def __init__(self, camera, tracker, target_fps=5):
+        """
+        参数:
+            camera: CameraCapture实例
+            tracker: RoiTracker实例，负责测量并跟踪零件位置
+            target_fps: 最大测量速率（次/秒）
+        """
+        self.camera = camera
+        self.tracker = tracker
+        self.target_fps = target_fps
+        self.is_running = False
+        self.thread = None
+        self._lock = Lock()
+        self._latest = None
+        # 统计信息
+        self.processed_frames = 0
+        self.skipped_frames = 0
+        # 测量期间被捕获线程覆盖、结果作废的帧数
+        self.discarded_frames = 0
+        self.processing_time = 0
+
+    def start(self):
+        """启动测量线程"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = Thread(target=self._measure_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """停止测量线程"""
+        self.is_running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def _measure_loop(self):
+        """测量循环，在单独的线程中运行"""
+        last_seq = -1
+        # 圆形检测只用灰度图，只做灰度转换；矩形检测的红色过滤方法需要彩色图
+        mode = 'gray' if self.tracker.measurement_type == 'circle' else 'rgb'
+        while self.is_running and self.camera.is_running:
+            start_time = time.time()
+            # 等待比上次处理更新的帧，直接取最新一帧，中间的旧帧全部跳过
+            frame, seq, frame_time = self.camera.wait_for_frame(last_seq, timeout=0.5, mode=mode)
+            if frame is None:
+                continue
+
+            if last_seq >= 0:
+                self.skipped_frames += seq - last_seq - 1
+            last_seq = seq
+
+            # 直接在环形缓冲区的只读视图上测量，不复制帧
+            result, search_roi = self.tracker.detect(frame)
+            if self.camera.buffer.is_valid(seq):
+                self.tracker.commit(result, search_roi, frame.shape)
+                with self._lock:
+                    self._latest = result
+                self.processed_frames += 1
+            else:
+                # 测量期间该帧已被捕获线程覆盖，结果不可信，跟踪区域也不更新；
+                # 仍然按下面的速率限制等待，检测比环形缓冲区一轮还慢时不会空转占满CPU
+                self.discarded_frames += 1
+
+            elapsed = time.time() - start_time
+            self.processing_time = elapsed
+
+            # 限制测量速率，让出CPU给捕获和显示
+            min_interval = 1.0 / self.target_fps if self.target_fps else 0
+            if elapsed < min_interval:
+                time.sleep(min_interval - elapsed)
+
+    def latest(self):
+        """获取最新的测量结果，尚无结果时返回None"""
+        with self._lock:
+            return self._latest
+
+    def stats(self):
+        """返回调度统计信息"""
+        return {
+            'processed_frames': self.processed_frames,
+            'skipped_frames': self.skipped_frames,
+            'discarded_frames': self.discarded_frames,
+            'processing_ms': self.processing_time * 1000
+        }
+
+def draw_live_overlay(frame, measurement, measurement_type):
+    """
+    在实时画面上叠加最新的测量结果
+
+    参数:
+        frame: 当前摄像头帧（RGB）
+        measurement: LiveMeasurementScheduler.latest()的返回值（CircleMeasurement / RectangleMeasurement）
+        measurement_type: 'circle' 或 'rectangle'
+
+    返回:
+        叠加标注后的图像
+    """
+    display_frame = frame.copy()
+    if measurement is None or not measurement.success:
+        return put_chinese_text(display_frame, "未检测到零件", (10, 10), 24, (255, 0, 0), inplace=True)
+
+    if measurement_type == 'circle':
+        cv2.circle(display_frame, measurement.center, measurement.radius_pixels, (0, 255, 0), 2)
+        text = f"半径: {measurement.measured_radius:.2f} mm"
+    else:
+        cv2.drawContours(display_frame, [measurement.box], 0, (0, 255, 0), 2)
+        text = f"长度: {measurement.measured_width:.2f} mm  宽度: {measurement.measured_height:.2f} mm"
+    return put_chinese_text(display_frame, text, (10, 10), 24, (0, 0, 255), inplace=True)
+
+def run_live_view(placeholder, scheduler, measurement_type, display_fps=15, heartbeat=None):
+    """
+    持续刷新带测量标注的摄像头画面，直到Streamlit重新运行脚本或摄像头停止
+
+    参数:
+        placeholder: streamlit占位符
+        scheduler: 已启动的LiveMeasurementScheduler
+        measurement_type: 'circle' 或 'rectangle'
+        display_fps: 画面刷新速率
+        heartbeat: 每次刷新时调用的无参数函数 (可选)，用于保持会话对摄像头的占用
+    """
+    camera = scheduler.camera
+    while camera.is_running and scheduler.is_running:
+        frame, fps = camera.get_frame()
+        if frame is not None:
+            display_frame = draw_live_overlay(frame, scheduler.latest(), measurement_type)
+            stats = scheduler.stats()
+            placeholder.image(display_frame, channels="RGB", use_column_width=True,
+                              caption=f"FPS: {fps}  测量耗时: {stats['processing_ms']:.0f} ms  "
+                                      f"已测量 {stats['processed_frames']} 帧，跳过 {stats['skipped_frames']} 帧，"
+                                      f"作废 {stats['discarded_frames']} 帧")
+        if heartbeat is not None:
+            heartbeat()
+        time.sleep(1.0 / display_fps)
@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import BoundedSemaphore, Lock
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+
+# 导入图像处理模块
+from image_processing import analyze_circle, analyze_rectangle, set_strategy_workers
+from image_loader import decode_image
+from preprocess_cache import preprocess_cache
+from strategy_stats import StrategyStats
+from calibration_store import CalibrationStore, DEFAULT_PROFILE
+from stage_timer import stage_timer
+
+# 获取当前脚本的绝对路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 默认标定数据文件
+DEFAULT_CALIBRATION_FILE = os.path.join(current_dir, 'calibration', 'calibration_data.json')
+
+# 请求体（图像）的最大字节数
+MAX_BODY_BYTES = 50 * 1024 * 1024
+
+# 工作进程初始化
+def _init_worker(stage_timing=False):
+    # 每个请求的图像都不同，预处理缓存只会占用内存
+    preprocess_cache.enabled = False
+    # 开启后结果的timings中包含各处理阶段的耗时
+    stage_timer.enabled = stage_timing
+    # 进程数已与CPU核数相当，进程内不再开线程：OpenCV单线程运算，二值化方法按顺序执行
+    cv2.setNumThreads(1)
+    set_strategy_workers(1)
+
+# 在工作进程中解码并分析图像
+def analyze_image(image_bytes, measurement_type, calibration=None, expected_ratio=None, pyramid=False):
+    """
+    解码图像并检测测量零件（在工作进程中运行）
+
+    参数:
+        image_bytes: 编码后的图像数据（JPEG/PNG等）
+        measurement_type: 'circle' 或 'rectangle'
+        calibration: 对应类型的标定数据字典，为None时只计算像素尺寸（用于标定）
+        expected_ratio: 矩形预期宽高比 (可选)
+        pyramid: 是否使用由粗到精的金字塔检测
+
+    返回:
+        结果字典（CircleMeasurement / RectangleMeasurement.to_dict()）
+    """
+    # 圆形检测只用灰度图，直接解码为灰度；无法解码时抛出ValueError
+    image, _ = decode_image(image_bytes, 'gray' if measurement_type == 'circle' else 'rgb')
+    calibration = calibration or {}
+    if measurement_type == 'circle':
+        result = analyze_circle(image, calibration.get('pixels_per_mm'), pyramid=pyramid)
+    else:
+        result = analyze_rectangle(image, calibration.get('pixels_per_mm_width'),
+                                   calibration.get('pixels_per_mm_height'), pyramid=pyramid,
+                                   expected_ratio=expected_ratio,
+                                   strategy_stats=StrategyStats.from_calibration(calibration) if calibration else None,
+                                   calibrated_method=calibration.get('method'))
+    return result.to_dict()
+
+class ServiceBusy(Exception):
+    """工作进程池已满"""
+
+class RequestError(Exception):
+    """请求参数错误"""
+
+class MeasurementService:
+    """测量服务：把请求分发到有界的进程池，并管理标定数据"""
+    def __init__(self, calibration_file=DEFAULT_CALIBRATION_FILE, workers=None, max_pending=None,
+                 stage_timing=False):
+        """
+        参数:
+            calibration_file: 标定数据文件
+            workers: 工作进程数，默认为CPU核心数
+            max_pending: 同时处理（含排队）的最大请求数，默认为工作进程数的4倍
+            stage_timing: 是否记录各处理阶段的耗时
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.calibration_store = CalibrationStore(calibration_file)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(stage_timing,))
+        self._slots = BoundedSemaphore(self.max_pending)
+        self._lock = Lock()
+        # 统计信息
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def run(self, *args):
+        """
+        在进程池中运行analyze_image并等待结果
+
+        异常:
+            ServiceBusy: 同时处理的请求数已达上限
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ServiceBusy()
+        with self._lock:
+            self.pending += 1
+        try:
+            return self.executor.submit(analyze_image, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+            self._slots.release()
+
+    def measure(self, image_bytes, measurement_type, profile=DEFAULT_PROFILE, pyramid=False, expected=None):
+        """
+        测量零件尺寸
+
+        参数:
+            image_bytes: 编码后的图像数据
+            measurement_type: 'circle' 或 'rectangle'
+            profile: 标定配置名称
+            pyramid: 是否使用金字塔检测
+            expected: 期望尺寸字典 {radius} 或 {width, height} (可选)
+
+        返回:
+            结果字典，提供期望尺寸时包含误差百分比
+        """
+        calibration = self.calibration_store.load_profile(profile)[measurement_type]
+        if measurement_type == 'circle' and not calibration.get('pixels_per_mm'):
+            raise RequestError("请先进行圆形标定！")
+        if measurement_type == 'rectangle' and not calibration.get('pixels_per_mm_width'):
+            raise RequestError("请先进行矩形标定！")
+        if calibration.get('geometry_corrected'):
+            # 比例属于几何校正后的摄像头坐标，用于未校正的图片会随相机倾斜产生误差
+            raise RequestError("该标定配置是在几何校正后的摄像头画面上标定的，不能用于上传的图片，请另建配置标定")
+
+        result = self.run(image_bytes, measurement_type, calibration, None, pyramid)
+        expected = expected or {}
+        if result['success']:
+            if measurement_type == 'circle' and expected.get('radius'):
+                result['error_percentage'] = (result['measured_radius'] - expected['radius']) / expected['radius'] * 100
+            if measurement_type == 'rectangle' and expected.get('width') and expected.get('height'):
+                result['width_error_percentage'] = (result['measured_width'] - expected['width']) / expected['width'] * 100
+                result['height_error_percentage'] = (result['measured_height'] - expected['height']) / expected['height'] * 100
+        return result
+
+    def calibrate(self, image_bytes, measurement_type, actual, profile=DEFAULT_PROFILE, pyramid=False, save=False):
+        """
+        标定
+
+        参数:
+            image_bytes: 编码后的图像数据
+            measurement_type: 'circle' 或 'rectangle'
+            actual: 实际尺寸字典 {radius} 或 {width, height}
+            profile: 标定配置名称
+            pyramid: 是否使用金字塔检测
+            save: 是否把标定结果保存到标定配置
+
+        返回:
+            结果字典，成功时包含像素/毫米比例
+        """
+        if measurement_type == 'circle':
+            if not actual.get('radius'):
+                raise RequestError("缺少参数 radius")
+            result = self.run(image_bytes, measurement_type, None, None, pyramid)
+            if result['success']:
+                values = {'radius': actual['radius'], 'pixels_per_mm': result['radius_pixels'] / actual['radius'],
+                          'geometry_corrected': False}
+        else:
+            if not actual.get('width') or not actual.get('height'):
+                raise RequestError("缺少参数 width 和 height")
+            result = self.run(image_bytes, measurement_type, None, actual['width'] / actual['height'], pyramid)
+            if result['success']:
+                values = {'width': actual['width'], 'height': actual['height'],
+                          'pixels_per_mm_width': result['width_pixels'] / actual['width'],
+                          'pixels_per_mm_height': result['height_pixels'] / actual['height'],
+                          # 测量时优先使用标定时的二值化方法
+                          'method': result['method'],
+                          'geometry_corrected': False}
+        if result['success']:
+            result['calibration'] = values
+            if save:
+                self.calibration_store.record_calibration(profile, measurement_type, values, operator='http')
+        return result
+
+    def status(self):
+        """服务状态"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                # 标定数据文件损坏时的备份路径
+                'calibration_backup': self.calibration_store.corrupt_backup
+            }
+
+    def shutdown(self):
+        """关闭进程池"""
+        self.executor.shutdown(wait=True)
+
+# 解析查询参数中的数值
+def _float_param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise RequestError(f"参数 {name} 不是数字: {value}")
+
+class MeasurementHTTPServer(ThreadingHTTPServer):
+    """每个连接一个线程的HTTP服务器"""
+    daemon_threads = True
+    # 默认监听队列只有5，突发的并发连接会被直接重置；超出处理能力的请求应返回503而不是连接失败
+    request_queue_size = 128
+
+# 生成请求处理类
+def make_handler(service):
+    class MeasurementHandler(BaseHTTPRequestHandler):
+        """
+        接口:
+            GET  /health
+            POST /measure?type=circle|rectangle[&profile=][&pyramid=1][&expected_radius=|&expected_width=&expected_height=]
+            POST /calibrate?type=circle&radius=... 或 type=rectangle&width=...&height=...[&profile=][&save=1]
+        请求体为图像文件的原始字节，返回JSON。
+        """
+        # 支持长连接，压测时不必每个请求重新建立连接
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if urlparse(self.path).path == '/health':
+                self._send_json(200, dict(status='ok', **service.status()))
+            else:
+                self._send_json(404, {'error': '未知的接口'})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            start_time = time.perf_counter()
+            try:
+                # 先读完请求体，连接才能继续复用
+                image_bytes = self._read_body()
+                measurement_type = params.get('type')
+                if measurement_type not in ('circle', 'rectangle'):
+                    raise RequestError("参数 type 必须为 circle 或 rectangle")
+                profile = params.get('profile', DEFAULT_PROFILE)
+                pyramid = params.get('pyramid', '0') in ('1', 'true')
+
+                if url.path == '/measure':
+                    expected = {'radius': _float_param(params, 'expected_radius'),
+                                'width': _float_param(params, 'expected_width'),
+                                'height': _float_param(params, 'expected_height')}
+                    result = service.measure(image_bytes, measurement_type, profile, pyramid, expected)
+                elif url.path == '/calibrate':
+                    actual = {'radius': _float_param(params, 'radius'),
+                              'width': _float_param(params, 'width'),
+                              'height': _float_param(params, 'height')}
+                    save = params.get('save', '0') in ('1', 'true')
+                    result = service.calibrate(image_bytes, measurement_type, actual, profile, pyramid, save)
+                else:
+                    self._send_json(404, {'error': '未知的接口'})
+                    return
+            except ServiceBusy:
+                self._send_json(503, {'error': '服务繁忙，请稍后重试'}, {'Retry-After': '1'})
+                return
+            except RequestError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            except ValueError as e:
+                # 图像无法解码等
+                self._send_json(422, {'error': str(e)})
+                return
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+                return
+            result['elapsed_ms'] = (time.perf_counter() - start_time) * 1000
+            self._send_json(200, result)
+
+        def _read_body(self):
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length <= 0 or length > MAX_BODY_BYTES:
+                # 请求体没有读取（长度未知、分块传输或过大），剩余数据不能当作下一个请求解析，回复后关闭连接
+                self.close_connection = True
+                if length < 0:
+                    raise RequestError(f"Content-Length 无效: {self.headers.get('Content-Length')}")
+                if length == 0:
+                    raise RequestError("请求体为空，请上传图像数据")
+                raise RequestError(f"图像数据超过 {MAX_BODY_BYTES // (1024 * 1024)} MB")
+            return self.rfile.read(length)
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 高并发时逐条打印访问日志开销较大，只在出错时输出
+            pass
+
+        def log_error(self, format, *args):
+            sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+    return MeasurementHandler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="零件测量HTTP服务")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('--port', type=int, default=8600, help="监听端口")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认为CPU核心数")
+    parser.add_argument('--max-pending', type=int, default=None, help="同时处理的最大请求数，超出时返回503")
+    parser.add_argument('--calibration', default=DEFAULT_CALIBRATION_FILE, help="标定数据文件")
+    parser.add_argument('--timings', action='store_true', help="在返回结果的timings中附带各处理阶段的耗时")
+    args = parser.parse_args(argv)
+
+    service = MeasurementService(args.calibration, args.workers, args.max_pending, args.timings)
+    server = MeasurementHTTPServer((args.host, args.port), make_handler(service))
+    print(f"测量服务已启动: http://{args.host}:{args.port} "
+          f"（{service.workers} 个工作进程，最多同时处理 {service.max_pending} 个请求）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import cv2
+
+class _MeasurementResult:
+    """测量结果基类：只保存数值和轮廓几何信息，不包含图像"""
+    __slots__ = ()
+    # to_dict中不输出的字段（numpy数组）
+    _array_fields = ('contour', 'box')
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise TypeError(f"未知的字段: {', '.join(values)}")
+        if self.success is None:
+            self.success = False
+        if self.timings is None:
+            self.timings = {}
+
+    @property
+    def bounding_rect(self):
+        """零件轮廓的轴对齐外接矩形 (x, y, w, h)，未检测到时为None"""
+        if self.contour is None:
+            return None
+        return cv2.boundingRect(self.contour)
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典（不含轮廓点）"""
+        return {name: getattr(self, name) for name in self.__slots__ if name not in self._array_fields}
+
+    def __repr__(self):
+        values = ', '.join(f"{name}={value!r}" for name, value in self.to_dict().items())
+        return f"{type(self).__name__}({values})"
+
+class CircleMeasurement(_MeasurementResult):
+    """圆形测量结果
+
+    属性:
+        success: 是否检测到零件
+        center: 最小外接圆圆心 (x, y)
+        radius_pixels: 半径（像素，取整）
+        measured_radius: 半径(mm)，未提供像素/毫米比例时为0
+        contour: 零件轮廓
+        confidence: 置信度，轮廓面积与外接圆面积之比 (0~1)
+        timings: 各阶段耗时(ms)
+    """
+    __slots__ = ('success', 'center', 'radius_pixels', 'measured_radius', 'contour', 'confidence', 'timings')
+
+class RectangleMeasurement(_MeasurementResult):
+    """矩形测量结果
+
+    属性:
+        success: 是否检测到零件
+        center: 最小外接矩形中心 (x, y)
+        angle: 最小外接矩形旋转角度
+        width_pixels: 长边长度（像素）
+        height_pixels: 短边长度（像素）
+        measured_width: 长度(mm)，未提供像素/毫米比例时为0
+        measured_height: 宽度(mm)，未提供像素/毫米比例时为0
+        box: 最小外接矩形的四个顶点（整数）
+        contour: 零件轮廓
+        method: 选中该轮廓的二值化方法名称
+        confidence: 置信度，轮廓面积与最小外接矩形面积之比 (0~1)
+        timings: 各阶段耗时(ms)
+    """
+    __slots__ = ('success', 'center', 'angle', 'width_pixels', 'height_pixels', 'measured_width',
+                 'measured_height', 'box', 'contour', 'method', 'confidence', 'timings')
@@ -0,0 +1,123 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from stage_timer import stage_timer
+
+class PreprocessCache:
+    """图像预处理缓存，按图像内容哈希缓存灰度图、模糊图、二值掩码和轮廓等中间结果
+
+    Streamlit每次交互都会重新运行脚本，同一张图片会被反复处理。
+    缓存以图像内容哈希为键，每张图片对应一个条目，条目内按处理阶段名称保存结果，
+    超出内存预算时按最近最少使用(LRU)原则整条淘汰。
+    """
+    def __init__(self, max_bytes=512 * 1024 * 1024, max_entries=16):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 图像键 -> {阶段名: 结果}
+        self._entry_bytes = {}  # 图像键 -> 占用字节数
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    def image_key(self, image):
+        """计算图像内容哈希，作为缓存键"""
+        if not self.enabled:
+            return None
+        with stage_timer.stage('hash'):
+            data = np.ascontiguousarray(image)
+            # 仅作缓存键使用，选用有硬件加速的sha1以降低大图哈希开销
+            digest = hashlib.sha1(data.data)
+            digest.update(f"{data.shape}{data.dtype}".encode())
+            return digest.hexdigest()
+
+    def get(self, key, stage, compute):
+        """获取某张图像某个处理阶段的结果，未命中时调用compute计算并缓存
+
+        参数:
+            key: image_key返回的图像键，为None时不使用缓存
+            stage: 处理阶段名称
+            compute: 无参数的计算函数
+
+        返回:
+            该阶段的处理结果（数组为只读）
+        """
+        if key is None or not self.enabled:
+            return compute()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and stage in entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[stage]
+            self.misses += 1
+
+        # 在锁外计算，避免阻塞其他线程
+        value = _freeze(compute())
+        size = _estimate_nbytes(value)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {}
+                self._entries[key] = entry
+                self._entry_bytes[key] = 0
+            if stage not in entry:
+                entry[stage] = value
+                self._entry_bytes[key] += size
+                self._total_bytes += size
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+            return entry[stage]
+
+    def _evict(self, keep):
+        """淘汰最久未使用的条目，直到满足内存预算（当前图像的条目保留）"""
+        while self._entries and (self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._entries.pop(oldest)
+            self._total_bytes -= self._entry_bytes.pop(oldest)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._entry_bytes.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+def _freeze(value):
+    """将缓存结果中的数组设为只读，防止调用方意外修改共享数据"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _freeze(item)
+    return value
+
+def _estimate_nbytes(value):
+    """估算缓存结果占用的内存字节数"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_nbytes(item) for item in value) + 8 * len(value)
+    return 64
+
+# 全局共享的预处理缓存，标定和测量函数共用
+preprocess_cache = PreprocessCache()
@@ -0,0 +1,145 @@
+import time
+from queue import Queue, Empty, Full
+from threading import Thread, Lock
+
+# 导入测量结果库
+from results_store import encode_image
+
+class BackgroundResultWriter:
+    """后台保存测量结果
+
+    界面线程只把测量记录和结果图像放入有界队列后立即返回；后台线程负责JPEG编码、
+    写入图像文件和数据库。队列中积压的多条记录合并为一批：图像文件统一同步到磁盘，
+    数据库在一个事务中插入。队列满时submit返回False，由界面提示操作员稍候。
+    """
+    def __init__(self, store, max_queue=64, batch_size=16):
+        """
+        参数:
+            store: ResultsStore实例
+            max_queue: 队列容量（最多积压的记录数）
+            batch_size: 每批最多写入的记录数
+        """
+        self.store = store
+        self.batch_size = batch_size
+        self.queue = Queue(maxsize=max_queue)
+        self.is_running = True
+        self._lock = Lock()
+        # 统计信息
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_error = None
+        self.thread = Thread(target=self._write_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, measurement_type, data, image=None, operator=None, passed=None, created_at=None):
+        """
+        提交一条测量记录（不阻塞）
+
+        参数:
+            measurement_type: 测量类型
+            data: 测量数据字典
+            image: 结果图像（numpy数组或JPEG字节），提交后不应再修改 (可选)
+            operator: 操作员用户名 (可选)
+            passed: 是否合格 (可选)
+            created_at: 测量时间，默认提交时的时间
+
+        返回:
+            是否已加入队列，队列已满或写入线程已停止时返回False
+        """
+        if not self.is_running:
+            return False
+        if created_at is None:
+            # 记录提交时的时间，而不是实际写入的时间
+            created_at = time.time()
+        try:
+            self.queue.put_nowait((measurement_type, data, image, operator, passed, created_at))
+        except Full:
+            return False
+        return True
+
+    def _write_loop(self):
+        """写入循环，在单独的线程中运行"""
+        while self.is_running or not self.queue.empty():
+            try:
+                first = self.queue.get(timeout=0.5)
+            except Empty:
+                continue
+            # 取出队列中已积压的记录，合并为一批写入
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write_batch(self, batch):
+        """编码并写入一批记录"""
+        records = []
+        sha1s = []
+        for measurement_type, data, image, operator, passed, created_at in batch:
+            try:
+                image_sha1 = None
+                if image is not None:
+                    encoded = image if isinstance(image, bytes) else encode_image(image)
+                    # 先只写文件，整批写完后统一同步到磁盘
+                    image_sha1 = self.store.put_blob(encoded, fsync=False)
+                    sha1s.append(image_sha1)
+                records.append((measurement_type, data, image_sha1, operator, passed, created_at))
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                    self.last_error = f"图像保存失败: {e}"
+        if not records:
+            return
+        try:
+            # 图像落盘后再插入数据库记录，数据库中的记录总能找到对应图像
+            self.store.sync_blobs(sha1s)
+            self.store.insert_many(records)
+            with self._lock:
+                self.written += len(records)
+                self.batches += 1
+        except Exception as e:
+            with self._lock:
+                self.failed += len(records)
+                self.last_error = f"写入数据库失败: {e}"
+
+    def flush(self, timeout=None):
+        """
+        等待队列中的记录全部写入
+
+        参数:
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        返回:
+            是否已全部写入
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=5.0):
+        """停止写入线程（先写完队列中已有的记录）"""
+        self.is_running = False
+        self.thread.join(timeout=timeout)
+
+    def status(self):
+        """返回写入状态，用于在界面上显示积压情况"""
+        with self._lock:
+            return {
+                'pending': self.queue.unfinished_tasks,
+                'capacity': self.queue.maxsize,
+                'written': self.written,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_error': self.last_error
+            }
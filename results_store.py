@@ -0,0 +1,394 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from threading import Lock
+
+import cv2
+import numpy as np
+
+# 导入统计过程控制模块
+from spc_stats import SPC_SCHEMA, update_aggregates, rebuild_aggregates, list_series, load_buckets
+
+# 数据表结构：每次测量追加一行，测量数据以JSON保存，图像只保存内容哈希
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    measurement_type TEXT NOT NULL,
+    operator TEXT,
+    passed INTEGER,
+    data TEXT NOT NULL,
+    image_sha1 TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_measurements_time ON measurements (created_at);
+CREATE INDEX IF NOT EXISTS idx_measurements_type_time ON measurements (measurement_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_measurements_operator_time ON measurements (operator, created_at);
+CREATE INDEX IF NOT EXISTS idx_measurements_passed_time ON measurements (passed, created_at);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    name TEXT PRIMARY KEY,
+    imported_at REAL NOT NULL
+);
+"""
+
+# 结果图像的JPEG质量
+JPEG_QUALITY = 90
+
+class ResultsStore:
+    """测量结果库
+
+    测量记录追加写入SQLite数据库（按时间、类型、操作员和合格与否建立索引），
+    结果图像按内容的SHA-1哈希保存在blobs目录下，相同的图像只保存一份。
+    保存一次测量只需一次插入；查询历史记录不需要遍历目录。
+    """
+    def __init__(self, root):
+        """
+        参数:
+            root: 结果目录，数据库为root/results.db，图像保存在root/blobs/
+        """
+        self.root = root
+        self.db_path = os.path.join(root, 'results.db')
+        self.blob_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        # Streamlit每次重跑脚本可能在不同线程中执行，共用一个连接并用锁串行化
+        self._lock = Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            # WAL模式下读写互不阻塞，追加写入也更快
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            self._conn.executescript(SPC_SCHEMA)
+            # 升级前已有测量记录时，根据记录重建一次统计聚合
+            with self._conn:
+                if self._conn.execute('SELECT 1 FROM spc_aggregates LIMIT 1').fetchone() is None and \
+                        self._conn.execute('SELECT 1 FROM measurements LIMIT 1').fetchone() is not None:
+                    rebuild_aggregates(self._conn)
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    # 图像存储
+    def blob_path(self, sha1):
+        """按内容哈希返回图像文件路径（前两位作为子目录，避免单个目录文件过多）"""
+        return os.path.join(self.blob_dir, sha1[:2], sha1[2:] + '.jpg')
+
+    def put_blob(self, data, fsync=True):
+        """
+        保存已编码的图像数据
+
+        参数:
+            data: JPEG字节数据
+            fsync: 是否立即把文件刷到磁盘；批量写入时可设为False，最后统一调用sync_blobs
+
+        返回:
+            内容的SHA-1哈希
+        """
+        sha1 = hashlib.sha1(data).hexdigest()
+        path = self.blob_path(sha1)
+        if os.path.exists(path):
+            # 内容相同的图像已经保存过
+            return sha1
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再重命名，读取方不会看到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            if fsync:
+                _fsync_dir(os.path.dirname(path))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return sha1
+
+    def sync_blobs(self, sha1s):
+        """把一批图像文件及其所在目录刷到磁盘（每个文件和目录只同步一次）"""
+        paths = {self.blob_path(sha1) for sha1 in sha1s}
+        for path in paths:
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+        for directory in {os.path.dirname(path) for path in paths}:
+            _fsync_dir(directory)
+
+    def get_blob(self, sha1):
+        """读取图像数据，不存在时返回None"""
+        try:
+            with open(self.blob_path(sha1), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    # 测量记录
+    def save(self, measurement_type, data, image=None, operator=None, passed=None, created_at=None):
+        """
+        追加一条测量记录
+
+        参数:
+            measurement_type: 'circle' 或 'rectangle' 等测量类型
+            data: 测量数据字典（需可JSON序列化）
+            image: 结果图像（RGB或灰度numpy数组）或已编码的JPEG字节 (可选)
+            operator: 操作员用户名 (可选)
+            passed: 是否合格，None表示未判定
+            created_at: 测量时间（Unix时间戳），默认当前时间
+
+        返回:
+            记录id
+        """
+        image_sha1 = None
+        if image is not None:
+            image_sha1 = self.put_blob(image if isinstance(image, bytes) else encode_image(image))
+        return self.insert_many([(measurement_type, data, image_sha1, operator, passed, created_at)])[0]
+
+    def insert_many(self, records, legacy_name=None):
+        """
+        在一个事务中追加多条记录（图像需已通过put_blob保存），同时更新统计聚合
+
+        参数:
+            records: 列表，每项为 (measurement_type, data, image_sha1, operator, passed, created_at)，
+                     created_at为None时使用当前时间
+            legacy_name: 导入旧版结果时的目录名 (可选)，与记录在同一事务中标记为已导入
+
+        返回:
+            记录id列表
+        """
+        now = time.time()
+        records = [(measurement_type, data, image_sha1, operator, passed, now if created_at is None else created_at)
+                   for measurement_type, data, image_sha1, operator, passed, created_at in records]
+        rows = [(created_at, measurement_type, operator, None if passed is None else int(bool(passed)),
+                 json.dumps(data, ensure_ascii=False), image_sha1)
+                for measurement_type, data, image_sha1, operator, passed, created_at in records]
+        ids = []
+        with self._lock, self._conn:
+            for row in rows:
+                cursor = self._conn.execute(
+                    'INSERT INTO measurements (created_at, measurement_type, operator, passed, data, image_sha1) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', row)
+                ids.append(cursor.lastrowid)
+            update_aggregates(self._conn, [(measurement_type, data, created_at, passed)
+                                           for measurement_type, data, _, _, passed, created_at in records])
+            if legacy_name is not None:
+                self._conn.execute('INSERT OR REPLACE INTO legacy_imports (name, imported_at) VALUES (?, ?)',
+                                   (legacy_name, now))
+        return ids
+
+    def legacy_imported(self):
+        """已导入的旧版结果目录名集合"""
+        with self._lock:
+            return {row[0] for row in self._conn.execute('SELECT name FROM legacy_imports')}
+
+    def mark_legacy_imported(self, name):
+        """把旧版结果目录标记为已导入（不写入记录）"""
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO legacy_imports (name, imported_at) VALUES (?, ?)',
+                               (name, time.time()))
+
+    def has_record(self, measurement_type, created_at):
+        """是否已有该类型、该时间的记录"""
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM measurements WHERE measurement_type = ? AND created_at = ? '
+                                      'LIMIT 1', (measurement_type, created_at)).fetchone() is not None
+
+    def get(self, record_id):
+        """按id读取一条记录，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM measurements WHERE id = ?', (record_id,)).fetchone()
+        return _row_to_record(row) if row is not None else None
+
+    def query(self, measurement_type=None, operator=None, passed=None, since=None, until=None,
+              limit=100, offset=0):
+        """
+        按条件查询测量记录（按时间从新到旧）
+
+        参数:
+            measurement_type: 测量类型 (可选)
+            operator: 操作员 (可选)
+            passed: 是否合格 (可选)
+            since: 起始时间（Unix时间戳或datetime，含） (可选)
+            until: 结束时间（Unix时间戳或datetime，不含） (可选)
+            limit: 最多返回的记录数，None表示不限制
+            offset: 跳过的记录数
+
+        返回:
+            记录字典列表 {id, created_at, measurement_type, operator, passed, data, image_sha1}
+        """
+        where, params = _build_filter(measurement_type, operator, passed, since, until)
+        sql = f'SELECT * FROM measurements{where} ORDER BY created_at DESC, id DESC'
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_row_to_record(row) for row in rows]
+
+    def count(self, measurement_type=None, operator=None, passed=None, since=None, until=None):
+        """按条件统计记录数"""
+        where, params = _build_filter(measurement_type, operator, passed, since, until)
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM measurements{where}', params).fetchone()[0]
+
+    # 统计过程控制
+    def spc_series(self):
+        """
+        列出所有统计分组
+
+        返回:
+            列表，每项为 (measurement_type, feature, nominal, 测量次数)
+        """
+        with self._lock:
+            return list_series(self._conn)
+
+    def spc_buckets(self, measurement_type, feature, nominal, since=None, until=None):
+        """
+        读取一个统计分组在时间范围内的每小时统计
+
+        参数:
+            measurement_type: 测量类型
+            feature: 特征名称（radius / width / height）
+            nominal: 标称尺寸(mm)
+            since: 起始时间（Unix时间戳或datetime） (可选)
+            until: 结束时间（Unix时间戳或datetime） (可选)
+
+        返回:
+            按时间排列的 (bucket_start, RunningStats) 列表
+        """
+        since = None if since is None else _to_timestamp(since)
+        until = None if until is None else _to_timestamp(until)
+        with self._lock:
+            return load_buckets(self._conn, measurement_type, feature, nominal, since, until)
+
+# 把结果图像编码为JPEG
+def encode_image(image):
+    """
+    把RGB或灰度图像编码为JPEG字节
+
+    参数:
+        image: numpy数组（RGB、RGBA或灰度）
+
+    返回:
+        JPEG字节数据
+    """
+    if image.dtype != np.uint8:
+        image = image.astype(np.uint8)
+    if len(image.shape) == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+    if len(image.shape) == 3:
+        # OpenCV编码需要BGR顺序
+        code = cv2.COLOR_RGBA2BGR if image.shape[2] == 4 else cv2.COLOR_RGB2BGR
+        image = cv2.cvtColor(image, code)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError(f"图像编码失败: shape={image.shape}")
+    return buffer.tobytes()
+
+# 导入旧版按目录保存的测量结果
+def import_legacy_results(store, results_dir):
+    """
+    把旧版 results/<类型>_<时间>/data.json + result_image.jpg 格式的结果导入结果库
+
+    每个目录导入后在结果库中记录目录名，已导入的目录下次不再导入；某个目录无法读取时
+    输出错误并跳过，不影响其他目录，下次启动时重试。
+
+    参数:
+        store: ResultsStore实例
+        results_dir: 旧版结果目录
+
+    返回:
+        本次导入的记录数
+    """
+    try:
+        names = sorted(os.listdir(results_dir))
+    except OSError as e:
+        print(f"无法读取旧版结果目录 {results_dir}: {e}", file=sys.stderr)
+        return 0
+    done = store.legacy_imported()
+    # 按目录记录导入状态之前已经整体导入过：按类型和时间识别已有的记录，不重复导入
+    upgraded = not done and store.count() > 0
+    imported = 0
+    for name in names:
+        data_file = os.path.join(results_dir, name, 'data.json')
+        if name in done or not os.path.isfile(data_file):
+            continue
+        try:
+            measurement_type = name.split('_', 1)[0]
+            with open(data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("data.json不是JSON对象")
+            created_at = None
+            if 'timestamp' in data:
+                created_at = time.mktime(time.strptime(str(data['timestamp']), '%Y-%m-%d %H:%M:%S'))
+            if upgraded and created_at is not None and store.has_record(measurement_type, created_at):
+                store.mark_legacy_imported(name)
+                continue
+            image_sha1 = None
+            image_file = os.path.join(results_dir, name, 'result_image.jpg')
+            if os.path.isfile(image_file):
+                with open(image_file, 'rb') as f:
+                    image_sha1 = store.put_blob(f.read())
+            store.insert_many([(measurement_type, data, image_sha1, None, None, created_at)], legacy_name=name)
+            imported += 1
+        except Exception as e:
+            print(f"跳过无法导入的旧版结果 {name}: {e}", file=sys.stderr)
+    return imported
+
+# 把目录项刷到磁盘（保证重命名后的文件在断电后仍然存在，Windows不支持时忽略）
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+# 生成查询条件
+def _build_filter(measurement_type, operator, passed, since, until):
+    clauses, params = [], []
+    if measurement_type is not None:
+        clauses.append('measurement_type = ?')
+        params.append(measurement_type)
+    if operator is not None:
+        clauses.append('operator = ?')
+        params.append(operator)
+    if passed is not None:
+        clauses.append('passed = ?')
+        params.append(int(bool(passed)))
+    if since is not None:
+        clauses.append('created_at >= ?')
+        params.append(_to_timestamp(since))
+    if until is not None:
+        clauses.append('created_at < ?')
+        params.append(_to_timestamp(until))
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+    return where, params
+
+# 时间统一转换为Unix时间戳
+def _to_timestamp(value):
+    return value.timestamp() if hasattr(value, 'timestamp') else float(value)
+
+# 数据库行转换为记录字典
+def _row_to_record(row):
+    return {
+        'id': row['id'],
+        'created_at': row['created_at'],
+        'measurement_type': row['measurement_type'],
+        'operator': row['operator'],
+        'passed': None if row['passed'] is None else bool(row['passed']),
+        'data': json.loads(row['data']),
+        'image_sha1': row['image_sha1']
+    }
@@ -0,0 +1,144 @@
+import cv2
+
+# 导入图像处理模块
+from image_processing import analyze_circle, analyze_rectangle, annotate_circle, annotate_rectangle, expand_roi
+from frame_workspace import FrameWorkspace
+
+class RoiTracker:
+    """零件ROI跟踪器，用于摄像头连续测量
+
+    零件通常静止放在A4纸上。检测成功后，下一帧的二值化和轮廓查找只在上次外接矩形
+    扩展后的区域内进行；区域内找不到零件时自动回退到全图检测，并清除跟踪区域。
+    各帧的中间结果写入跟踪器自己的FrameWorkspace，同一跟踪器不能在多个线程中同时使用。
+    """
+    def __init__(self, measurement_type, calibration, margin_ratio=0.25, min_margin=20, strategy_stats=None,
+                 geometry=None):
+        """
+        参数:
+            measurement_type: 'circle' 或 'rectangle'
+            calibration: 对应类型的标定数据字典
+            margin_ratio: ROI相对零件尺寸的扩展比例
+            min_margin: ROI最小扩展像素
+            strategy_stats: 矩形检测的StrategyStats实例 (可选)
+            geometry: CameraGeometry实例 (可选)，只校正检测到的轮廓点，不变换整帧图像
+        """
+        self.measurement_type = measurement_type
+        self.calibration = calibration
+        self.strategy_stats = strategy_stats
+        self.geometry = geometry
+        self.margin_ratio = margin_ratio
+        self.min_margin = min_margin
+        self.roi = None
+        self.frame_shape = None
+        # 按分辨率预分配的工作缓冲区，各帧复用
+        self.workspace = FrameWorkspace()
+        # 最近一次检测到的零件轮廓（用于在实时画面上叠加标注）
+        self.last_contour = None
+        # 统计信息
+        self.roi_hits = 0
+        self.full_searches = 0
+        self.losses = 0
+
+    def reset(self):
+        """清除跟踪区域，下一帧进行全图检测"""
+        self.roi = None
+        self.last_contour = None
+
+    def measure(self, frame):
+        """
+        测量一帧，并根据检测结果更新跟踪区域
+
+        参数:
+            frame: 摄像头帧（RGB或灰度）
+
+        返回:
+            CircleMeasurement / RectangleMeasurement（不含图像）
+        """
+        result, search_roi = self.detect(frame)
+        self.commit(result, search_roi, frame.shape)
+        return result
+
+    def detect(self, frame):
+        """
+        测量一帧但不更新跟踪区域
+
+        直接在摄像头环形缓冲区的视图上测量时，帧可能在测量期间被覆盖；
+        先确认帧仍然有效，再调用commit更新跟踪区域，避免根据损坏的数据移动ROI。
+
+        参数:
+            frame: 摄像头帧（RGB或灰度）
+
+        返回:
+            (测量结果, 本次使用的搜索区域)
+        """
+        # 分辨率变化时重新全图检测
+        if frame.shape != self.frame_shape:
+            self.frame_shape = frame.shape
+            self.reset()
+        self.workspace.begin(frame.shape)
+
+        search_roi = self.roi
+        if self.measurement_type == 'circle':
+            result = analyze_circle(frame, self.calibration['pixels_per_mm'], roi=search_roi,
+                                    workspace=self.workspace, geometry=self.geometry)
+        else:
+            result = analyze_rectangle(frame, self.calibration['pixels_per_mm_width'],
+                                       self.calibration['pixels_per_mm_height'], roi=search_roi,
+                                       strategy_stats=self.strategy_stats, workspace=self.workspace,
+                                       geometry=self.geometry, calibrated_method=self.calibration.get('method'))
+        return result, search_roi
+
+    def commit(self, result, search_roi, frame_shape):
+        """
+        根据detect的结果更新跟踪区域
+
+        参数:
+            result: detect返回的测量结果
+            search_roi: detect返回的搜索区域
+            frame_shape: 帧图像的shape
+        """
+        self.last_contour = result.contour
+        self._update(result.contour, search_roi, frame_shape)
+
+    def _update(self, contour, search_roi, frame_shape):
+        """根据检测到的轮廓更新跟踪区域"""
+        if contour is None:
+            # 零件丢失（ROI和全图都未找到），下一帧全图检测
+            if search_roi is not None:
+                self.losses += 1
+            self.full_searches += 1
+            self.roi = None
+            return
+
+        x, y, w, h = cv2.boundingRect(contour)
+        if search_roi is not None and _contains(search_roi, (x, y, w, h)):
+            self.roi_hits += 1
+        else:
+            self.full_searches += 1
+
+        margin = max(self.min_margin, self.margin_ratio * max(w, h))
+        self.roi = expand_roi((x, y, w, h), margin, frame_shape)
+
+    def __call__(self, frame):
+        """作为display_camera_stream的processing_func使用，返回标注后的图像"""
+        result = self.measure(frame)
+        if not result.success:
+            return frame
+        if self.measurement_type == 'circle':
+            return annotate_circle(frame, result)
+        return annotate_rectangle(frame, result)
+
+    def stats(self):
+        """返回跟踪统计信息"""
+        return {
+            'roi': self.roi,
+            'roi_hits': self.roi_hits,
+            'full_searches': self.full_searches,
+            'losses': self.losses
+        }
+
+def _contains(outer, inner):
+    """判断矩形inner是否完全位于outer内部"""
+    ox, oy, ow, oh = outer
+    ix, iy, iw, ih = inner
+    return ix >= ox and iy >= oy and ix + iw <= ox + ow and iy + ih <= oy + oh
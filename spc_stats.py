@@ -0,0 +1,202 @@
+import json
+import math
+
+# 统计聚合表：按 (测量类型, 特征, 标称尺寸, 时间桶) 保存运行统计量
+SPC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spc_aggregates (
+    measurement_type TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    nominal REAL NOT NULL,
+    bucket_start REAL NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    passed INTEGER NOT NULL,
+    PRIMARY KEY (measurement_type, feature, nominal, bucket_start)
+);
+"""
+
+# 时间桶长度（秒），按小时聚合
+BUCKET_SECONDS = 3600
+
+# 各测量类型的统计特征：(特征名称, 期望尺寸字段, 测量尺寸字段)
+FEATURES = {
+    'circle': [('radius', 'expected_radius', 'measured_radius')],
+    'rectangle': [('width', 'expected_width', 'measured_width'),
+                  ('height', 'expected_height', 'measured_height')]
+}
+
+class RunningStats:
+    """运行统计量（Welford算法），可在O(1)时间内追加一个值或合并另一组统计"""
+    def __init__(self, count=0, mean=0.0, m2=0.0, min_value=None, max_value=None, passed=0):
+        self.count = count
+        self.mean = mean
+        # 离差平方和
+        self.m2 = m2
+        self.min = min_value
+        self.max = max_value
+        # 合格数量
+        self.passed = passed
+
+    def add(self, value, passed=False):
+        """追加一个测量值"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if passed:
+            self.passed += 1
+
+    def merge(self, other):
+        """合并另一组统计（Chan等人的并行合并公式）"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max, self.passed = other.min, other.max, other.passed
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.passed += other.passed
+        return self
+
+    @property
+    def std(self):
+        """样本标准差，少于2个值时为0"""
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1))
+
+    def capability(self, lower_limit, upper_limit):
+        """
+        计算过程能力指数
+
+        参数:
+            lower_limit: 规格下限
+            upper_limit: 规格上限
+
+        返回:
+            (Cp, Cpk)，标准差为0时返回(None, None)
+        """
+        std = self.std
+        if std == 0:
+            return None, None
+        cp = (upper_limit - lower_limit) / (6 * std)
+        cpk = min(upper_limit - self.mean, self.mean - lower_limit) / (3 * std)
+        return cp, cpk
+
+# 从测量数据中提取统计特征
+def extract_features(measurement_type, data):
+    """
+    返回:
+        列表，每项为 (特征名称, 标称尺寸, 测量值)；缺少期望或测量尺寸的特征被跳过
+    """
+    features = []
+    for feature, expected_key, measured_key in FEATURES.get(measurement_type, []):
+        expected = data.get(expected_key)
+        measured = data.get(measured_key)
+        if expected is None or measured is None:
+            continue
+        # 标称尺寸取3位小数，避免浮点误差把同一规格分成多组
+        features.append((feature, round(float(expected), 3), float(measured)))
+    return features
+
+# 时间所在的时间桶
+def bucket_of(timestamp):
+    return math.floor(timestamp / BUCKET_SECONDS) * BUCKET_SECONDS
+
+# 追加测量记录时更新聚合表（需在调用方的事务中执行）
+def update_aggregates(conn, records):
+    """
+    参数:
+        conn: sqlite3连接
+        records: 列表，每项为 (measurement_type, data, created_at, passed)
+    """
+    # 同一批中相同分组的记录先在内存中合并，每个分组只读写一次数据库
+    groups = {}
+    for measurement_type, data, created_at, passed in records:
+        for feature, nominal, value in extract_features(measurement_type, data):
+            key = (measurement_type, feature, nominal, bucket_of(created_at))
+            groups.setdefault(key, RunningStats()).add(value, bool(passed))
+
+    for key, stats in groups.items():
+        row = conn.execute(
+            'SELECT count, mean, m2, min, max, passed FROM spc_aggregates '
+            'WHERE measurement_type = ? AND feature = ? AND nominal = ? AND bucket_start = ?', key).fetchone()
+        if row is not None:
+            stats = RunningStats(*row).merge(stats)
+        conn.execute(
+            'INSERT OR REPLACE INTO spc_aggregates '
+            '(measurement_type, feature, nominal, bucket_start, count, mean, m2, min, max, passed) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            key + (stats.count, stats.mean, stats.m2, stats.min, stats.max, stats.passed))
+
+# 根据测量记录重建聚合表（已有数据库首次升级时使用）
+def rebuild_aggregates(conn, chunk_size=10000):
+    conn.execute('DELETE FROM spc_aggregates')
+    cursor = conn.execute('SELECT measurement_type, data, created_at, passed FROM measurements ORDER BY id')
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        update_aggregates(conn, [(row[0], json.loads(row[1]), row[2], row[3]) for row in rows])
+
+# 列出所有统计分组
+def list_series(conn):
+    """
+    返回:
+        列表，每项为 (measurement_type, feature, nominal, 测量次数)
+    """
+    rows = conn.execute(
+        'SELECT measurement_type, feature, nominal, SUM(count) FROM spc_aggregates '
+        'GROUP BY measurement_type, feature, nominal ORDER BY measurement_type, nominal, feature').fetchall()
+    return [tuple(row) for row in rows]
+
+# 读取一个分组在时间范围内的各时间桶统计
+def load_buckets(conn, measurement_type, feature, nominal, since=None, until=None):
+    """
+    返回:
+        按时间排列的 (bucket_start, RunningStats) 列表
+    """
+    sql = ('SELECT bucket_start, count, mean, m2, min, max, passed FROM spc_aggregates '
+           'WHERE measurement_type = ? AND feature = ? AND nominal = ?')
+    params = [measurement_type, feature, nominal]
+    if since is not None:
+        sql += ' AND bucket_start >= ?'
+        params.append(bucket_of(since))
+    if until is not None:
+        sql += ' AND bucket_start < ?'
+        params.append(until)
+    sql += ' ORDER BY bucket_start'
+    return [(row[0], RunningStats(*row[1:])) for row in conn.execute(sql, params).fetchall()]
+
+# 合并多个时间桶的统计
+def merge_buckets(buckets, period=None, utc_offset=0):
+    """
+    参数:
+        buckets: load_buckets的返回值
+        period: 合并周期（秒），为None时合并为一组总体统计
+        utc_offset: 本地时间与UTC的差（秒），按天合并时以本地零点为界
+
+    返回:
+        period为None时返回RunningStats；否则返回按周期合并后的 (周期起点, RunningStats) 列表
+    """
+    if period is None:
+        total = RunningStats()
+        for _, stats in buckets:
+            total.merge(stats)
+        return total
+    merged = {}
+    for bucket_start, stats in buckets:
+        start = math.floor((bucket_start + utc_offset) / period) * period - utc_offset
+        merged.setdefault(start, RunningStats()).merge(stats)
+    return sorted(merged.items())
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# 导入运行统计量
+from spc_stats import RunningStats
+
+logger = logging.getLogger(__name__)
+
+class _NullStage:
+    """计时关闭时使用的空上下文，进入和退出都不做任何事"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    """一个阶段的计时上下文，退出时把耗时累加到收集器"""
+    __slots__ = ('collector', 'name', 'start')
+
+    def __init__(self, collector, name):
+        self.collector = collector
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.collector.add(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+class _Collector:
+    """一次测量的各阶段耗时，可被多个策略线程同时写入"""
+    def __init__(self):
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, elapsed_ms):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed_ms
+
+    def merge(self, timings):
+        for name, elapsed_ms in timings.items():
+            self.add(name, elapsed_ms)
+
+class TimingStats:
+    """多次测量的阶段耗时汇总（每个阶段的次数、均值、标准差、最大值）"""
+    def __init__(self):
+        self.stages = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, timings):
+        """
+        加入一次测量的阶段耗时
+
+        参数:
+            timings: {阶段名称: 耗时(ms)}
+        """
+        with self._lock:
+            self.calls += 1
+            for name, elapsed_ms in timings.items():
+                self.stages.setdefault(name, RunningStats()).add(elapsed_ms)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.calls = 0
+
+    def summary(self):
+        """
+        返回:
+            按总耗时从大到小排列的字典列表 {stage, count, mean_ms, std_ms, max_ms, total_ms}
+        """
+        with self._lock:
+            rows = [{'stage': name, 'count': stats.count, 'mean_ms': stats.mean, 'std_ms': stats.std,
+                     'max_ms': stats.max, 'total_ms': stats.mean * stats.count}
+                    for name, stats in self.stages.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def format(self):
+        """格式化为文本表格，用于日志和命令行输出"""
+        lines = [f"阶段耗时汇总（{self.calls} 次测量）",
+                 f"{'阶段':<28}{'次数':>8}{'平均(ms)':>12}{'标准差':>10}{'最大(ms)':>12}{'合计(ms)':>12}"]
+        for row in self.summary():
+            lines.append(f"{row['stage']:<28}{row['count']:>8}{row['mean_ms']:>12.2f}{row['std_ms']:>10.2f}"
+                         f"{row['max_ms']:>12.2f}{row['total_ms']:>12.1f}")
+        return '\n'.join(lines)
+
+class StageTimer:
+    """图像处理流程的分阶段计时
+
+    默认关闭，关闭时stage()直接返回一个共享的空上下文，几乎没有开销。开启后，
+    collect()内执行的各阶段耗时按阶段名称累加（同一阶段多次执行时相加）；
+    最外层的collect()结束时把本次测量的结果加入stats汇总。
+    矩形检测的各二值化方法在策略线程中并行执行，它们的阶段耗时也计入发起测量的collect()，
+    因此多核机器上各阶段耗时之和可能大于总耗时。
+    """
+    def __init__(self):
+        self.enabled = False
+        self.stats = TimingStats()
+        self._local = threading.local()
+
+    def stage(self, name):
+        """
+        为一个处理阶段计时
+
+        用法:
+            with stage_timer.stage('blur'):
+                blurred = cv2.GaussianBlur(...)
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        collector = getattr(self._local, 'collector', None)
+        if collector is None:
+            return _NULL_STAGE
+        return _Stage(collector, name)
+
+    @contextmanager
+    def collect(self):
+        """
+        收集代码块中各阶段的耗时，可以嵌套（内层的结果同时计入外层）
+
+        返回:
+            {阶段名称: 耗时(ms)} 字典，代码块结束后填充完整；计时关闭时为空字典
+        """
+        if not self.enabled:
+            yield {}
+            return
+        parent = getattr(self._local, 'collector', None)
+        collector = _Collector()
+        self._local.collector = collector
+        try:
+            yield collector.timings
+        finally:
+            self._local.collector = parent
+            if parent is not None:
+                parent.merge(collector.timings)
+            else:
+                self.stats.add(collector.timings)
+
+    def bind(self, func):
+        """
+        让func在其他线程中执行时，阶段耗时计入当前线程的collect()
+
+        返回:
+            包装后的函数，计时关闭或不在collect()中时返回func本身
+        """
+        collector = getattr(self._local, 'collector', None) if self.enabled else None
+        if collector is None:
+            return func
+        local = self._local
+
+        def run(*args, **kwargs):
+            previous = getattr(local, 'collector', None)
+            local.collector = collector
+            try:
+                return func(*args, **kwargs)
+            finally:
+                local.collector = previous
+        return run
+
+    def log_summary(self, level=logging.INFO):
+        """把汇总结果写入日志"""
+        if self.stats.calls:
+            logger.log(level, "\n%s", self.stats.format())
+
+# 全局计时器实例
+stage_timer = StageTimer()
@@ -0,0 +1,70 @@
+from threading import Lock
+
+# 导入图像处理模块
+from image_processing import RECTANGLE_METHODS
+
+class StrategyStats:
+    """矩形检测二值化方法的胜出统计
+
+    同一工位（相机、光照和A4背景不变）上几乎每次都是同一种二值化方法胜出。测量时总是先单独
+    运行标定时选中的方法（不同方法找到的边缘相差1~2像素，换方法会让测量值整体偏移），
+    只有它未找到零件或置信度不足时才运行其余方法，统计只决定这些方法的顺序。
+    统计数据保存在标定数据中，随标定一起持久化。
+    """
+    def __init__(self, wins=None, min_samples=5, max_total=1000):
+        """
+        参数:
+            wins: 各方法的胜出次数字典 {方法名称: 次数} (可选)
+            min_samples: 累计多少次测量后才按统计结果调整顺序
+            max_total: 总次数超过该值时所有计数减半，使统计能跟上工位条件的变化
+        """
+        wins = wins or {}
+        self.wins = {method: int(wins.get(method, 0)) for method in RECTANGLE_METHODS}
+        self.min_samples = min_samples
+        self.max_total = max_total
+        # 是否有尚未保存的更新
+        self.dirty = False
+        self._lock = Lock()
+
+    @classmethod
+    def from_calibration(cls, calibration):
+        """从矩形标定数据字典中读取统计（没有统计时返回空统计）"""
+        return cls(calibration.get('strategy_stats'))
+
+    def total(self):
+        """累计记录的测量次数"""
+        with self._lock:
+            return sum(self.wins.values())
+
+    def ordered_methods(self):
+        """
+        按胜出次数从多到少排列的方法列表
+
+        返回:
+            方法名称列表，样本不足时返回None（使用默认顺序）
+        """
+        with self._lock:
+            if sum(self.wins.values()) < self.min_samples:
+                return None
+            # 排序是稳定的，次数相同的方法保持默认顺序
+            return sorted(RECTANGLE_METHODS, key=lambda method: -self.wins[method])
+
+    def record(self, method):
+        """记录一次胜出的方法（method为None表示未检测到零件，不记录）"""
+        if method not in self.wins:
+            return
+        with self._lock:
+            self.wins[method] += 1
+            if sum(self.wins.values()) > self.max_total:
+                self.wins = {name: count // 2 for name, count in self.wins.items()}
+            self.dirty = True
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        with self._lock:
+            return dict(self.wins)
+
+    def save_to(self, calibration):
+        """把统计写入矩形标定数据字典，并清除未保存标记"""
+        calibration['strategy_stats'] = self.to_dict()
+        self.dirty = False
@@ -0,0 +1,142 @@
+import cv2
+import numpy as np
+
+# A4纸尺寸（毫米，横向）
+A4_WIDTH_MM = 297.0
+A4_HEIGHT_MM = 210.0
+
+# 亚像素绘制的小数位数（cv2绘图函数的shift参数，坐标乘以2^shift）
+DRAW_SHIFT = 4
+
+# 零件和红色印刷区域的颜色（RGB）
+PART_COLOR = (45, 45, 50)
+RED_COLOR = (200, 30, 30)
+
+# 生成A4纸背景
+def _paper(width, height, rng, lighting=0.0):
+    """
+    生成白色A4纸背景，可带由一侧向另一侧变暗的光照梯度
+
+    参数:
+        width, height: 图像尺寸（像素）
+        rng: numpy随机数生成器
+        lighting: 光照梯度强度（0~1），0表示均匀光照
+
+    返回:
+        float32的RGB图像，取值0~255
+    """
+    paper = np.full((height, width, 3), 245.0, dtype=np.float32)
+    if lighting > 0:
+        # 随机方向的线性光照梯度
+        angle = rng.uniform(0, 2 * np.pi)
+        ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+        ramp = (xs / width - 0.5) * np.cos(angle) + (ys / height - 0.5) * np.sin(angle)
+        paper *= (1 - lighting * (ramp + 0.5))[..., None]
+    return paper
+
+# 绘制零件形状的掩码（亚像素精度、抗锯齿）
+def _shape_mask(width, height, shape, center, size_pixels, rotation):
+    """
+    参数:
+        width, height: 图像尺寸（像素）
+        shape: 'circle' 或 'rectangle'
+        center: 中心坐标（像素，可为小数）
+        size_pixels: 圆形为半径，矩形为 (长, 宽)
+        rotation: 矩形旋转角度（度）
+
+    返回:
+        float32掩码，零件内部为1，边缘为抗锯齿过渡
+    """
+    mask = np.zeros((height, width), dtype=np.uint8)
+    scale = 1 << DRAW_SHIFT
+    if shape == 'circle':
+        cv2.circle(mask, (int(round(center[0] * scale)), int(round(center[1] * scale))),
+                   int(round(size_pixels * scale)), 255, -1, cv2.LINE_AA, DRAW_SHIFT)
+    else:
+        box = cv2.boxPoints((center, size_pixels, rotation))
+        cv2.fillPoly(mask, [np.round(box * scale).astype(np.int32)], 255, cv2.LINE_AA, DRAW_SHIFT)
+    return mask.astype(np.float32) / 255
+
+# 生成测试图像
+def make_part_image(shape='rectangle', size_mm=(85.6, 54.0), resolution=(1920, 1080), rotation=0.0,
+                    noise=0.0, blur=0.0, shadow=0.0, lighting=0.0, red_region=False, offset_mm=(0.0, 0.0),
+                    seed=0):
+    """
+    生成白色A4纸背景上放置一个已知尺寸零件的合成图像，A4纸充满整个画面
+
+    参数:
+        shape: 'circle' 或 'rectangle'
+        size_mm: 圆形为半径(mm)，矩形为 (长, 宽)(mm)
+        resolution: 图像尺寸 (宽, 高)，像素/毫米比例按A4纸刚好铺满画面计算
+        rotation: 矩形旋转角度（度）
+        noise: 高斯噪声标准差（灰度级）
+        blur: 高斯模糊的sigma（像素），模拟失焦
+        shadow: 零件投影的强度（0~1）
+        lighting: 光照梯度的强度（0~1）
+        red_region: 是否在零件上印一块红色区域（类似证件上的国徽）
+        offset_mm: 零件中心相对画面中心的偏移 (x, y)(mm)
+        seed: 随机数种子，相同参数和种子生成相同的图像
+
+    返回:
+        image: RGB图像 (uint8)
+        truth: 真实值字典 {shape, pixels_per_mm, radius_mm/width_mm, height_mm, ...}
+    """
+    rng = np.random.default_rng(seed)
+    width, height = resolution
+    pixels_per_mm = min(width / A4_WIDTH_MM, height / A4_HEIGHT_MM)
+    center = (width / 2 + offset_mm[0] * pixels_per_mm, height / 2 + offset_mm[1] * pixels_per_mm)
+
+    if shape == 'circle':
+        size_pixels = size_mm * pixels_per_mm
+        truth = {'shape': shape, 'pixels_per_mm': pixels_per_mm, 'radius_mm': float(size_mm)}
+    else:
+        size_pixels = (size_mm[0] * pixels_per_mm, size_mm[1] * pixels_per_mm)
+        truth = {'shape': shape, 'pixels_per_mm': pixels_per_mm,
+                 'width_mm': float(max(size_mm)), 'height_mm': float(min(size_mm))}
+
+    image = _paper(width, height, rng, lighting)
+
+    if shadow > 0:
+        # 投影：向右下偏移并大幅模糊的零件轮廓
+        shift = 3 * pixels_per_mm
+        shadow_mask = _shape_mask(width, height, shape, (center[0] + shift, center[1] + shift), size_pixels, rotation)
+        shadow_mask = cv2.GaussianBlur(shadow_mask, (0, 0), 2 * pixels_per_mm)
+        image *= (1 - 0.5 * shadow * shadow_mask)[..., None]
+
+    # 绘制零件
+    mask = _shape_mask(width, height, shape, center, size_pixels, rotation)[..., None]
+    image = image * (1 - mask) + np.array(PART_COLOR, dtype=np.float32) * mask
+
+    if red_region:
+        # 红色圆形印刷区域，位于零件内部靠一侧
+        if shape == 'circle':
+            red_center, red_radius = center, size_pixels * 0.4
+        else:
+            theta = np.deg2rad(rotation)
+            shift = size_pixels[0] * 0.25
+            red_center = (center[0] - shift * np.cos(theta), center[1] - shift * np.sin(theta))
+            red_radius = min(size_pixels) * 0.3
+        red_mask = _shape_mask(width, height, 'circle', red_center, red_radius, 0)[..., None]
+        image = image * (1 - red_mask) + np.array(RED_COLOR, dtype=np.float32) * red_mask
+
+    if blur > 0:
+        image = cv2.GaussianBlur(image, (0, 0), blur)
+    if noise > 0:
+        image += rng.normal(0, noise, image.shape).astype(np.float32)
+
+    return np.clip(image, 0, 255).astype(np.uint8), truth
+
+# 计算测量误差
+def measurement_error(truth, measured):
+    """
+    参数:
+        truth: make_part_image返回的真实值字典
+        measured: 测量值字典 {radius} 或 {width, height}(mm)
+
+    返回:
+        各尺寸的相对误差百分比字典
+    """
+    if truth['shape'] == 'circle':
+        return {'radius': (measured['radius'] - truth['radius_mm']) / truth['radius_mm'] * 100}
+    return {'width': (measured['width'] - truth['width_mm']) / truth['width_mm'] * 100,
+            'height': (measured['height'] - truth['height_mm']) / truth['height_mm'] * 100}
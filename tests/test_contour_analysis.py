@@ -0,0 +1,95 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from contour_analysis import (contour_stats, find_containers, reading_order, select_by_area,
+                              suppress_overlaps)
+
+class ContourStatsTest(unittest.TestCase):
+    """向量化统计量应与逐个调用OpenCV的结果一致"""
+
+    def setUp(self):
+        mask = np.zeros((300, 400), dtype=np.uint8)
+        cv2.rectangle(mask, (20, 30), (120, 90), 255, -1)
+        cv2.circle(mask, (250, 150), 60, 255, -1)
+        cv2.ellipse(mask, (100, 220), (50, 25), 30, 0, 360, 255, -1)
+        # 单像素和两像素的噪点轮廓
+        mask[5, 390] = 255
+        mask[290, 10:12] = 255
+        self.contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    def test_matches_opencv(self):
+        stats = contour_stats(self.contours)
+        self.assertEqual(len(stats['area']), len(self.contours))
+        for i, contour in enumerate(self.contours):
+            self.assertAlmostEqual(stats['area'][i], cv2.contourArea(contour))
+            # OpenCV按单精度累加周长
+            self.assertAlmostEqual(stats['perimeter'][i], cv2.arcLength(contour, True), places=4)
+            x, y, w, h = cv2.boundingRect(contour)
+            self.assertEqual((stats['x'][i], stats['y'][i], stats['w'][i], stats['h'][i]), (x, y, w, h))
+
+    def test_empty_input(self):
+        stats = contour_stats([])
+        self.assertEqual(len(stats['area']), 0)
+        kept, selected = select_by_area([], 10)
+        self.assertEqual(kept, [])
+        self.assertEqual(sorted(selected), sorted(stats))
+
+    def test_select_by_area_keeps_stats_aligned(self):
+        kept, stats = select_by_area(self.contours, 100)
+        self.assertEqual(len(kept), 3)
+        for contour, area in zip(kept, stats['area']):
+            self.assertAlmostEqual(area, cv2.contourArea(contour))
+
+class SuppressOverlapsTest(unittest.TestCase):
+    """重复检测和零件内部印刷区域的抑制"""
+
+    def test_keeps_highest_score_of_duplicates(self):
+        boxes = [(100, 100, 200, 100), (102, 101, 198, 98), (500, 400, 80, 80)]
+        self.assertEqual(suppress_overlaps(boxes, [2.0, 3.0, 1.0]), [1, 2])
+
+    def test_separate_parts_are_kept_in_score_order(self):
+        boxes = [(0, 0, 50, 50), (60, 0, 50, 50), (0, 60, 50, 50)]
+        self.assertEqual(suppress_overlaps(boxes, [1.0, 3.0, 2.0]), [1, 2, 0])
+
+    def test_partial_overlap_below_threshold_is_kept(self):
+        # 交并比 1/3，低于默认阈值
+        boxes = [(0, 0, 100, 100), (50, 0, 100, 100)]
+        self.assertEqual(suppress_overlaps(boxes, [1.0, 2.0]), [1, 0])
+        self.assertEqual(suppress_overlaps(boxes, [1.0, 2.0], iou_threshold=0.3), [1])
+
+    def test_printed_region_inside_part_is_suppressed(self):
+        # 印刷区域与零件的交并比只有0.04，按包含关系抑制
+        boxes = [(100, 100, 200, 200), (150, 150, 40, 40)]
+        self.assertEqual(suppress_overlaps(boxes, [40000.0, 1600.0]), [0])
+        self.assertEqual(suppress_overlaps(boxes, [40000.0, 1600.0], containment_threshold=1.0), [0, 1])
+
+    def test_empty_input(self):
+        self.assertEqual(suppress_overlaps(np.zeros((0, 4)), []), [])
+
+class FindContainersTest(unittest.TestCase):
+    """包围多个零件的背景外框"""
+
+    def test_sheet_around_several_parts_is_a_container(self):
+        boxes = [(0, 0, 1000, 800), (100, 100, 200, 100), (102, 101, 198, 98),
+                 (500, 400, 200, 200), (550, 450, 50, 50)]
+        self.assertEqual(find_containers(boxes), [0])
+
+    def test_part_with_duplicates_and_print_is_not_a_container(self):
+        # 零件外框内只有它自己的重复检测，彼此重叠
+        boxes = [(100, 100, 200, 200), (102, 102, 196, 196), (101, 101, 197, 197)]
+        self.assertEqual(find_containers(boxes), [])
+
+    def test_too_few_boxes(self):
+        self.assertEqual(find_containers([(0, 0, 100, 100), (10, 10, 20, 20)]), [])
+
+class ReadingOrderTest(unittest.TestCase):
+
+    def test_rows_then_columns(self):
+        centers = [(300, 12), (100, 95), (50, 10), (200, 105)]
+        self.assertEqual([int(i) for i in reading_order(centers, 50)], [2, 0, 1, 3])
+        self.assertEqual(reading_order([], 50), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from frame_averaging import FrameAverager, measure_frames
+
+# 只包含FrameAverager用到的字段的测量结果
+def circle(radius, success=True):
+    return SimpleNamespace(success=success, measured_radius=radius)
+
+class FrameAveragerTest(unittest.TestCase):
+    """多帧平均的运行统计量和按中位数/MAD剔除异常帧"""
+
+    def test_outlier_frames_are_rejected_from_robust_mean(self):
+        averager = FrameAverager('circle')
+        radii = [10.00, 10.02, 9.98, 10.01, 9.99, 10.00, 10.03, 9.97]
+        for radius in radii + [8.5]:
+            averager.add(circle(radius))
+        summary = averager.summary()['radius']
+        self.assertEqual(summary['count'], 9)
+        self.assertEqual(summary['rejected'], 1)
+        self.assertAlmostEqual(summary['robust_mean'], np.mean(radii))
+        # 普通均值和极值仍包含异常帧
+        self.assertAlmostEqual(summary['mean'], np.mean(radii + [8.5]))
+        self.assertEqual(summary['min'], 8.5)
+        self.assertAlmostEqual(summary['median'], 10.0)
+
+    def test_threshold_controls_rejection(self):
+        averager = FrameAverager('circle', outlier_threshold=100)
+        for radius in (10.00, 10.02, 9.98, 10.01, 8.5):
+            averager.add(circle(radius))
+        self.assertEqual(averager.summary()['radius']['rejected'], 0)
+
+    def test_zero_mad_rejects_nothing(self):
+        # 一半以上的帧结果相同，MAD为0
+        averager = FrameAverager('circle')
+        for radius in (10.0, 10.0, 10.0, 12.0):
+            averager.add(circle(radius))
+        summary = averager.summary()['radius']
+        self.assertEqual(summary['rejected'], 0)
+        self.assertAlmostEqual(summary['robust_mean'], 10.5)
+
+    def test_failed_frames_are_counted_but_not_averaged(self):
+        averager = FrameAverager('circle')
+        self.assertEqual(averager.summary(), {})
+        averager.add(circle(None, success=False))
+        self.assertEqual(averager.summary(), {})
+        averager.add(circle(5.0))
+        self.assertEqual(averager.failed, 1)
+        self.assertEqual(averager.count, 1)
+        self.assertEqual(averager.summary()['radius']['std'], 0.0)
+
+    def test_rectangle_averages_width_and_height(self):
+        averager = FrameAverager('rectangle')
+        for width, height in ((60.0, 40.0), (60.2, 40.2), (59.8, 39.8)):
+            averager.add(SimpleNamespace(success=True, measured_width=width, measured_height=height))
+        summary = averager.summary()
+        self.assertEqual(sorted(summary), ['height', 'width'])
+        self.assertAlmostEqual(summary['width']['mean'], 60.0)
+        self.assertAlmostEqual(summary['height']['std'], 0.2)
+
+class FakeBuffer:
+    def __init__(self, valid):
+        self.valid = valid
+
+    def is_valid(self, seq):
+        return self.valid(seq)
+
+class FakeCamera:
+    """每次等待都立即返回一个新帧的摄像头，valid决定帧在检测后是否仍有效"""
+    def __init__(self, valid):
+        self.buffer = FakeBuffer(valid)
+        self.seq = -1
+
+    def get_latest(self, mode):
+        return None, self.seq, 0
+
+    def wait_for_frame(self, after_seq, timeout=1.0, mode='rgb'):
+        self.seq += 1
+        return np.zeros((4, 4), dtype=np.uint8), self.seq, 0
+
+class FakeTracker:
+    measurement_type = 'circle'
+
+    def __init__(self):
+        self.committed = 0
+
+    def detect(self, frame):
+        return circle(10.0), None
+
+    def commit(self, result, search_roi, frame_shape):
+        self.committed += 1
+
+class MeasureFramesTest(unittest.TestCase):
+    """检测期间被覆盖的帧不参与平均，且不会让测量无限进行"""
+
+    def test_overwritten_frames_are_discarded(self):
+        tracker = FakeTracker()
+        camera = FakeCamera(lambda seq: seq % 2 == 0)
+        averager, result, frame = measure_frames(camera, tracker, frame_count=4)
+        self.assertEqual(averager.count, 4)
+        self.assertEqual(averager.discarded, 3)
+        self.assertEqual(tracker.committed, 4)
+        self.assertIsNotNone(frame)
+
+    def test_stops_when_every_frame_is_overwritten(self):
+        tracker = FakeTracker()
+        averager, result, frame = measure_frames(FakeCamera(lambda seq: False), tracker, frame_count=5)
+        self.assertEqual(averager.count, 0)
+        self.assertEqual(averager.discarded, 5)
+        self.assertIsNone(result)
+        self.assertEqual(tracker.committed, 0)
+        averager, _, _ = measure_frames(FakeCamera(lambda seq: False), tracker, frame_count=5, max_discarded=2)
+        self.assertEqual(averager.discarded, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import threading
+import unittest
+
+import numpy as np
+
+from camera_utils import FrameRingBuffer
+
+class FrameRingBufferTest(unittest.TestCase):
+    """帧环形缓冲区的序号发布、覆盖作废和等待新帧"""
+
+    def write(self, buffer, value, timestamp):
+        # 模拟捕获线程：先取槽位（作废旧帧），原地写入后发布
+        slot = buffer.slot_for_write()
+        buffer.frames[slot][...] = value
+        return buffer.publish(slot, timestamp)
+
+    def test_empty_buffer_has_no_frames(self):
+        buffer = FrameRingBuffer(3, (2, 2))
+        frame, seq, timestamp = buffer.latest()
+        self.assertIsNone(frame)
+        self.assertEqual(seq, -1)
+        self.assertFalse(buffer.is_valid(-1))
+        self.assertEqual(buffer.history(5), [])
+
+    def test_publish_returns_increasing_sequences(self):
+        buffer = FrameRingBuffer(3, (2, 2))
+        self.assertEqual([self.write(buffer, i, i * 0.1) for i in range(4)], [0, 1, 2, 3])
+        frame, seq, timestamp = buffer.latest()
+        self.assertEqual(seq, 3)
+        self.assertEqual(frame[0, 0], 3)
+        self.assertAlmostEqual(timestamp, 0.3)
+
+    def test_frames_are_read_only_views(self):
+        buffer = FrameRingBuffer(2, (2, 2))
+        seq = self.write(buffer, 7, 1.0)
+        frame, _ = buffer.get(seq)
+        with self.assertRaises(ValueError):
+            frame[0, 0] = 0
+        self.assertTrue(np.shares_memory(frame, buffer.frames))
+
+    def test_overwritten_frames_become_invalid(self):
+        buffer = FrameRingBuffer(3, (2, 2))
+        for i in range(5):
+            self.write(buffer, i, float(i))
+        # 序号0、1所在的槽位已被序号3、4覆盖
+        for seq in (0, 1):
+            self.assertFalse(buffer.is_valid(seq))
+            self.assertEqual(buffer.get(seq), (None, 0))
+        for seq in (2, 3, 4):
+            frame, timestamp = buffer.get(seq)
+            self.assertEqual(frame[0, 0], seq)
+            self.assertEqual(timestamp, float(seq))
+        self.assertFalse(buffer.is_valid(5))
+
+    def test_slot_for_write_invalidates_frame_being_overwritten(self):
+        buffer = FrameRingBuffer(2, (2, 2))
+        self.write(buffer, 0, 0.0)
+        self.write(buffer, 1, 1.0)
+        buffer.slot_for_write()
+        # 写入过程中读取者持有的序号0已失效，不会读到写了一半的帧
+        self.assertFalse(buffer.is_valid(0))
+        self.assertTrue(buffer.is_valid(1))
+
+    def test_history_is_newest_first_and_bounded_by_size(self):
+        buffer = FrameRingBuffer(3, (1,))
+        for i in range(5):
+            self.write(buffer, i, float(i))
+        self.assertEqual([seq for _, seq, _ in buffer.history(2)], [4, 3])
+        self.assertEqual([seq for _, seq, _ in buffer.history(10)], [4, 3, 2])
+
+    def test_wait_next_times_out_without_new_frame(self):
+        buffer = FrameRingBuffer(2, (1,))
+        seq = self.write(buffer, 0, 0.0)
+        frame, next_seq, _ = buffer.wait_next(seq, timeout=0.01)
+        self.assertIsNone(frame)
+        self.assertEqual(next_seq, -1)
+        # 已有更新的帧时立即返回
+        self.assertEqual(buffer.wait_next(-1, timeout=0.01)[1], seq)
+
+    def test_wait_next_wakes_up_on_publish(self):
+        buffer = FrameRingBuffer(2, (1,))
+        writer = threading.Timer(0.05, self.write, (buffer, 9, 2.0))
+        writer.start()
+        try:
+            frame, seq, timestamp = buffer.wait_next(-1, timeout=5.0)
+        finally:
+            writer.join()
+        self.assertEqual(seq, 0)
+        self.assertEqual(frame[0], 9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+
+from preprocess_cache import PreprocessCache
+
+class PreprocessCacheTest(unittest.TestCase):
+    """预处理缓存的命中、只读结果和LRU淘汰"""
+
+    def test_image_key_depends_on_content_shape_and_dtype(self):
+        cache = PreprocessCache()
+        image = np.zeros((4, 6), dtype=np.uint8)
+        self.assertEqual(cache.image_key(image), cache.image_key(image.copy()))
+        changed = image.copy()
+        changed[0, 0] = 1
+        self.assertNotEqual(cache.image_key(image), cache.image_key(changed))
+        # 字节相同但形状或类型不同的图像不能共用缓存
+        self.assertNotEqual(cache.image_key(image), cache.image_key(image.reshape(6, 4)))
+        self.assertNotEqual(cache.image_key(image), cache.image_key(image.view(np.int8)))
+
+    def test_get_computes_once_per_stage(self):
+        cache = PreprocessCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return np.ones(10, dtype=np.uint8)
+
+        first = cache.get('a', 'gray', compute)
+        second = cache.get('a', 'gray', compute)
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        # 同一图像的不同阶段分别计算
+        cache.get('a', 'blur', compute)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_cached_arrays_are_read_only(self):
+        cache = PreprocessCache()
+        value = cache.get('a', 'contours', lambda: [np.zeros(3), np.zeros(4)])
+        for array in value:
+            with self.assertRaises(ValueError):
+                array[0] = 1
+
+    def test_disabled_cache_and_none_key_always_compute(self):
+        cache = PreprocessCache()
+        calls = []
+        compute = lambda: calls.append(1) or np.zeros(1)
+        cache.get(None, 'gray', compute)
+        cache.get(None, 'gray', compute)
+        cache.enabled = False
+        self.assertIsNone(cache.image_key(np.zeros(1)))
+        cache.get('a', 'gray', compute)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_evicts_least_recently_used_entry_by_count(self):
+        cache = PreprocessCache(max_entries=2)
+        for key in ('a', 'b'):
+            cache.get(key, 'gray', lambda: np.zeros(1))
+        # 访问a后b成为最久未使用的条目
+        cache.get('a', 'gray', lambda: self.fail("a应当命中缓存"))
+        cache.get('c', 'gray', lambda: np.zeros(1))
+        self.assertEqual(cache.stats()['entries'], 2)
+        calls = []
+        cache.get('b', 'gray', lambda: calls.append(1) or np.zeros(1))
+        self.assertEqual(calls, [1])
+
+    def test_evicts_by_byte_budget_and_tracks_total(self):
+        cache = PreprocessCache(max_bytes=250, max_entries=100)
+        for key in ('a', 'b', 'c'):
+            cache.get(key, 'mask', lambda: np.zeros(100, dtype=np.uint8))
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['bytes'], 200)
+        cache.clear()
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    def test_current_entry_is_kept_even_over_budget(self):
+        cache = PreprocessCache(max_bytes=50)
+        value = cache.get('big', 'mask', lambda: np.zeros(100, dtype=np.uint8))
+        self.assertEqual(len(value), 100)
+        self.assertEqual(cache.stats()['entries'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from image_processing import RECTANGLE_METHODS, analyze_rectangle, calibrate_rectangle
+from roi_tracker import RoiTracker
+from strategy_stats import StrategyStats
+from synthetic_images import make_part_image
+
+CARD_MM = (85.6, 54.0)
+PART_MM = (60.0, 40.0)
+RESOLUTION = (1280, 720)
+
+class CalibratedMethodTest(unittest.TestCase):
+    """矩形测量与标定使用同一种二值化方法，结果不随历史统计的方法顺序变化"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.card, _ = make_part_image('rectangle', CARD_MM, RESOLUTION, seed=0)
+        cls.part, _ = make_part_image('rectangle', PART_MM, RESOLUTION, offset_mm=(30.0, -20.0), seed=1)
+
+    def test_measurement_does_not_depend_on_learned_order(self):
+        sizes = set()
+        for preferred in RECTANGLE_METHODS:
+            stats = StrategyStats({preferred: 10})
+            success, _, ppm_width, ppm_height, method = calibrate_rectangle(self.card, *CARD_MM,
+                                                                            strategy_stats=stats)
+            self.assertTrue(success)
+            result = analyze_rectangle(self.part, ppm_width, ppm_height, strategy_stats=stats,
+                                       calibrated_method=method)
+            self.assertEqual(result.method, method)
+            sizes.add((round(result.measured_width, 3), round(result.measured_height, 3)))
+        self.assertEqual(len(sizes), 1)
+
+    def test_tracker_uses_calibrated_method(self):
+        _, _, ppm_width, ppm_height, method = calibrate_rectangle(self.card, *CARD_MM)
+        calibration = {'pixels_per_mm_width': ppm_width, 'pixels_per_mm_height': ppm_height, 'method': method}
+        tracker = RoiTracker('rectangle', calibration, strategy_stats=StrategyStats())
+        result = tracker.measure(self.part)
+        self.assertTrue(result.success)
+        self.assertEqual(result.method, method)
+
+    def test_without_calibrated_method_matches_calibration_rule(self):
+        # 旧标定数据没有记录方法：与标定一样比较所有方法
+        success, _, ppm_width, ppm_height, method = calibrate_rectangle(self.card, *CARD_MM)
+        legacy = analyze_rectangle(self.part, ppm_width, ppm_height,
+                                   strategy_stats=StrategyStats({'otsu': 10}))
+        self.assertEqual(legacy.method, method)
+
+if __name__ == '__main__':
+    unittest.main()
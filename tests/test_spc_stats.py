@@ -0,0 +1,108 @@
+import random
+import sqlite3
+import unittest
+
+import numpy as np
+
+import spc_stats
+from spc_stats import RunningStats, merge_buckets
+
+# 逐个追加测量值得到的运行统计量
+def stats_of(values, passed=()):
+    stats = RunningStats()
+    for i, value in enumerate(values):
+        stats.add(value, i in passed)
+    return stats
+
+class RunningStatsTest(unittest.TestCase):
+    """Welford追加与Chan合并的结果应与直接计算一致"""
+
+    def setUp(self):
+        rng = random.Random(1)
+        # 大均值小方差，检验数值稳定性
+        self.values = [1000.0 + rng.gauss(0, 0.01) for _ in range(500)]
+
+    def assert_matches(self, stats, values):
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.mean, np.mean(values), places=9)
+        self.assertAlmostEqual(stats.std, np.std(values, ddof=1), places=9)
+        self.assertEqual(stats.min, min(values))
+        self.assertEqual(stats.max, max(values))
+
+    def test_add_matches_numpy(self):
+        self.assert_matches(stats_of(self.values), self.values)
+
+    def test_merge_matches_single_pass(self):
+        for split in (1, 7, 250, 499):
+            left, right = self.values[:split], self.values[split:]
+            merged = stats_of(left, passed={0}).merge(stats_of(right, passed={0, 1}))
+            self.assert_matches(merged, self.values)
+            self.assertEqual(merged.passed, 1 + min(len(right), 2))
+
+    def test_merge_many_chunks(self):
+        total = RunningStats()
+        for start in range(0, len(self.values), 37):
+            total.merge(stats_of(self.values[start:start + 37]))
+        self.assert_matches(total, self.values)
+
+    def test_merge_with_empty_stats(self):
+        stats = stats_of(self.values[:10], passed={2})
+        self.assert_matches(stats.merge(RunningStats()), self.values[:10])
+        merged = RunningStats().merge(stats)
+        self.assert_matches(merged, self.values[:10])
+        self.assertEqual(merged.passed, 1)
+        self.assertEqual(RunningStats().merge(RunningStats()).count, 0)
+
+    def test_std_and_capability_need_two_values(self):
+        stats = stats_of([5.0])
+        self.assertEqual(stats.std, 0.0)
+        self.assertEqual(stats.capability(4.0, 6.0), (None, None))
+
+    def test_capability(self):
+        stats = stats_of([9.0, 10.0, 11.0])
+        cp, cpk = stats.capability(7.0, 14.0)
+        self.assertAlmostEqual(cp, 7.0 / 6.0)
+        self.assertAlmostEqual(cpk, 1.0)
+
+class AggregatesTest(unittest.TestCase):
+    """聚合表分批更新后，按时间桶合并的结果应与全部数据一致"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.executescript(spc_stats.SPC_SCHEMA)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_batched_updates_merge_into_buckets(self):
+        rng = random.Random(2)
+        records = []
+        for i in range(200):
+            width = 60.0 + rng.gauss(0, 0.05)
+            data = {'expected_width': 60.0, 'measured_width': width,
+                    'expected_height': 40.0, 'measured_height': 40.0 + rng.gauss(0, 0.05)}
+            # 分布在3个小时内
+            records.append(('rectangle', data, i * 50.0, i % 4 != 0))
+        spc_stats.update_aggregates(self.conn, records[:70])
+        spc_stats.update_aggregates(self.conn, records[70:])
+
+        buckets = spc_stats.load_buckets(self.conn, 'rectangle', 'width', 60.0)
+        self.assertEqual([start for start, _ in buckets], [0, 3600, 7200])
+        widths = [data['measured_width'] for _, data, _, _ in records]
+        total = merge_buckets(buckets)
+        self.assertEqual(total.count, 200)
+        self.assertEqual(total.passed, 150)
+        self.assertAlmostEqual(total.mean, np.mean(widths), places=9)
+        self.assertAlmostEqual(total.std, np.std(widths, ddof=1), places=9)
+
+        # 按两小时合并
+        periods = merge_buckets(buckets, period=7200)
+        self.assertEqual([start for start, _ in periods], [0, 7200])
+        self.assertEqual([stats.count for _, stats in periods], [144, 56])
+
+    def test_records_without_expected_size_are_skipped(self):
+        spc_stats.update_aggregates(self.conn, [('circle', {'measured_radius': 5.0}, 0.0, True)])
+        self.assertEqual(spc_stats.list_series(self.conn), [])
+
+if __name__ == '__main__':
+    unittest.main()
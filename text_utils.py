@@ -1,50 +1,108 @@
+from functools import lru_cache
+
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
-def put_chinese_text(img, text, position, font_size=30, color=(0, 0, 255)):
+# 按优先级尝试的中文字体：微软雅黑、宋体、黑体
+CHINESE_FONTS = ["msyh.ttc", "simsun.ttc", "simhei.ttf"]
+
+@lru_cache(maxsize=32)
+def get_font(font_size):
+    """
+    加载指定字号的中文字体（按字号缓存，每个字号只探测一次字体文件）
+
+    参数:
+        font_size: 字体大小
+
+    返回:
+        PIL字体对象
+    """
+    for font_name in CHINESE_FONTS:
+        try:
+            return ImageFont.truetype(font_name, font_size)
+        except IOError:
+            continue
+    # 如果都失败，使用默认字体
+    return ImageFont.load_default()
+
+@lru_cache(maxsize=512)
+def render_text_mask(text, font_size):
+    """
+    将文本渲染为灰度透明度位图（按文本和字号缓存）
+
+    参数:
+        text: 要绘制的文本
+        font_size: 字体大小
+
+    返回:
+        (透明度位图, 相对于绘制位置的偏移(x, y))，文本为空时位图为None
+    """
+    font = get_font(font_size)
+    left, top, right, bottom = font.getbbox(text)
+    if right <= left or bottom <= top:
+        return None, (0, 0)
+    mask_img = Image.new('L', (right - left, bottom - top), 0)
+    ImageDraw.Draw(mask_img).text((-left, -top), text, font=font, fill=255)
+    mask = np.array(mask_img)
+    mask.flags.writeable = False
+    return mask, (left, top)
+
+def draw_text(img, text, position, font_size=30, color=(0, 0, 255)):
+    """
+    在图像上原地绘制文本，只混合文本所在的局部区域
+
+    参数:
+        img: 三通道图像（会被直接修改）
+        text: 要绘制的文本
+        position: 文本位置，元组(x, y)
+        font_size: 字体大小
+        color: 文本颜色，按图像的通道顺序直接写入
+
+    返回:
+        img本身
+    """
+    mask, (offset_x, offset_y) = render_text_mask(text, font_size)
+    if mask is None:
+        return img
+
+    # 计算文本区域与图像的交集
+    x0 = int(position[0]) + offset_x
+    y0 = int(position[1]) + offset_y
+    mask_h, mask_w = mask.shape
+    img_h, img_w = img.shape[:2]
+    left, top = max(x0, 0), max(y0, 0)
+    right, bottom = min(x0 + mask_w, img_w), min(y0 + mask_h, img_h)
+    if right <= left or bottom <= top:
+        return img
+
+    # 按透明度混合：结果 = 原图 * (1 - a) + 颜色 * a
+    alpha = mask[top - y0:bottom - y0, left - x0:right - x0, None].astype(np.uint16)
+    roi = img[top:bottom, left:right]
+    ink = np.array(color, dtype=np.uint16)[:roi.shape[2]]
+    roi[...] = (roi * (255 - alpha) + ink * alpha + 127) // 255
+    return img
+
+def put_chinese_text(img, text, position, font_size=30, color=(0, 0, 255), inplace=False):
     """
     在图片上绘制中文文本
-    
+
     参数:
         img: OpenCV格式的图像
         text: 要绘制的文本
         position: 文本位置，元组(x, y)
         font_size: 字体大小
-        color: 文本颜色，BGR格式
-        
+        color: 文本颜色，按图像的通道顺序写入（BGR图像即为BGR格式）
+        inplace: 是否直接在输入图像上绘制（输入需为可写的三通道图像），默认返回新图像
+
     返回:
         添加文本后的图像
     """
-    # 将OpenCV图像转换为PIL图像
-    if len(img.shape) == 3:
-        pil_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-    else:
-        pil_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_GRAY2RGB))
-    
-    # 创建绘图对象
-    draw = ImageDraw.Draw(pil_img)
-    
-    # 尝试加载系统字体
-    try:
-        # 尝试加载微软雅黑字体
-        font = ImageFont.truetype("msyh.ttc", font_size)
-    except IOError:
-        try:
-            # 尝试加载宋体
-            font = ImageFont.truetype("simsun.ttc", font_size)
-        except IOError:
-            try:
-                # 尝试加载黑体
-                font = ImageFont.truetype("simhei.ttf", font_size)
-            except IOError:
-                # 如果都失败，使用默认字体
-                font = ImageFont.load_default()
-    
-    # 绘制文本，注意PIL使用RGB而OpenCV使用BGR
-    draw.text(position, text, font=font, fill=(color[2], color[1], color[0]))
-    
-    # 将PIL图像转换回OpenCV格式
-    result_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-    
-    return result_img
\ No newline at end of file
+    if len(img.shape) == 2:
+        # 灰度图转换为三通道
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    elif not inplace:
+        img = img.copy()
+
+    # 文本颜色按通道顺序直接写入，与图像是BGR还是RGB无关
+    return draw_text(img, text, position, font_size, color)
@@ -0,0 +1,221 @@
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# 导入ROI跟踪模块
+from roi_tracker import RoiTracker
+from strategy_stats import StrategyStats
+from batch_measure import ResultWriter, DEFAULT_CALIBRATION_FILE, load_calibration
+from calibration_store import DEFAULT_PROFILE
+
+# 支持的视频格式
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# 场景变化检测使用的缩略图尺寸
+SIGNATURE_SIZE = (64, 36)
+
+# 画面稳定的判断阈值（相对场景变化阈值的比例）
+STABLE_RATIO = 0.25
+
+# 输出字段
+CIRCLE_FIELDS = ['frame', 'time_s', 'success', 'measured_radius', 'expected_radius', 'error_percentage', 'passed',
+                 'confidence', 'elapsed_ms']
+RECTANGLE_FIELDS = ['frame', 'time_s', 'success', 'measured_width', 'measured_height', 'expected_width',
+                    'expected_height', 'width_error_percentage', 'height_error_percentage', 'passed', 'confidence',
+                    'method', 'elapsed_ms']
+
+# 读取视频信息
+def video_info(path):
+    """
+    返回:
+        字典 {fps, frame_count, width, height, duration_s}，无法打开时抛出ValueError
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"无法打开视频: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        return {
+            'fps': fps,
+            'frame_count': frame_count,
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'duration_s': frame_count / fps if fps else 0
+        }
+    finally:
+        cap.release()
+
+# 画面缩略图（用于场景变化检测）
+def _signature(frame_bgr):
+    small = cv2.resize(frame_bgr, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+# 两个缩略图的平均灰度差
+def _difference(a, b):
+    return float(np.mean(np.abs(a - b)))
+
+# 逐帧读取视频
+def iter_video_frames(path, stride=1, scene_threshold=None, mode='rgb'):
+    """
+    以生成器方式逐帧读取视频，任何时刻只解码和保存当前一帧，不会把整个视频读入内存
+
+    参数:
+        path: 视频文件路径
+        stride: 采样间隔，每stride帧检查一帧；跳过的帧只grab()不转换颜色
+        scene_threshold: 场景变化阈值（缩略图平均灰度差，0~255）。为None时按stride等间隔采样；
+            否则只在画面与上次采样明显不同、且已经稳定下来（零件放好）时采样一帧
+        mode: 'rgb' 或 'gray'，返回帧的颜色格式
+
+    返回:
+        生成器，每次产生 (帧序号, 时间(秒), 帧图像)
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    stride = max(1, int(stride))
+    code = cv2.COLOR_BGR2GRAY if mode == 'gray' else cv2.COLOR_BGR2RGB
+    # 解码缓冲区，每帧复用
+    buffer = None
+    previous = None
+    last_sampled = None
+    index = -1
+    try:
+        while True:
+            # 跳过的帧只解码不取出，省去颜色转换和内存复制
+            for _ in range(stride - 1):
+                if not cap.grab():
+                    return
+                index += 1
+            if not cap.grab():
+                return
+            index += 1
+            ok, buffer = cap.retrieve(buffer)
+            if not ok:
+                return
+
+            if scene_threshold is not None:
+                signature = _signature(buffer)
+                changed = last_sampled is None or _difference(signature, last_sampled) >= scene_threshold
+                stable = previous is not None and _difference(signature, previous) < scene_threshold * STABLE_RATIO
+                previous = signature
+                if not (changed and stable):
+                    continue
+                last_sampled = signature
+
+            yield index, index / fps if fps else 0.0, cv2.cvtColor(buffer, code)
+    finally:
+        cap.release()
+
+# 测量视频中的零件
+def measure_video(path, measurement_type, calibration, expected=None, tolerance=None, stride=1, scene_threshold=None,
+                  strategy_stats=None):
+    """
+    对采样到的每一帧测量零件尺寸。相邻帧之间零件位置基本不变，使用RoiTracker只在上次位置附近搜索
+
+    参数:
+        path: 视频文件路径
+        measurement_type: 'circle' 或 'rectangle'
+        calibration: 对应类型的标定数据字典
+        expected: 期望尺寸字典 {radius} 或 {width, height} (可选)
+        tolerance: 允许误差(%)，提供期望尺寸时用于判定合格 (可选)
+        stride: 采样间隔（帧）
+        scene_threshold: 场景变化阈值，见iter_video_frames (可选)
+        strategy_stats: 矩形检测的StrategyStats实例 (可选)
+
+    返回:
+        生成器，每个采样帧产生一行结果字典
+    """
+    expected = expected or {}
+    tracker = RoiTracker(measurement_type, calibration, strategy_stats=strategy_stats)
+    # 圆形检测只用灰度图；矩形检测的红色过滤方法需要彩色图
+    mode = 'gray' if measurement_type == 'circle' else 'rgb'
+    for index, timestamp, frame in iter_video_frames(path, stride, scene_threshold, mode):
+        start_time = time.perf_counter()
+        result = tracker.measure(frame)
+        row = {'frame': index, 'time_s': round(timestamp, 3), 'success': result.success,
+               'confidence': result.confidence}
+        errors = []
+        if measurement_type == 'circle':
+            if result.success:
+                row['measured_radius'] = result.measured_radius
+                if expected.get('radius'):
+                    row['expected_radius'] = expected['radius']
+                    row['error_percentage'] = (result.measured_radius - expected['radius']) / expected['radius'] * 100
+                    errors.append(row['error_percentage'])
+        else:
+            row['method'] = result.method
+            if result.success:
+                row['measured_width'] = result.measured_width
+                row['measured_height'] = result.measured_height
+                if expected.get('width') and expected.get('height'):
+                    row['expected_width'] = expected['width']
+                    row['expected_height'] = expected['height']
+                    row['width_error_percentage'] = (result.measured_width - expected['width']) / expected['width'] * 100
+                    row['height_error_percentage'] = (result.measured_height - expected['height']) / expected['height'] * 100
+                    errors.extend([row['width_error_percentage'], row['height_error_percentage']])
+        if errors and tolerance is not None:
+            row['passed'] = all(abs(error) <= tolerance for error in errors)
+        row['elapsed_ms'] = (time.perf_counter() - start_time) * 1000
+        yield row
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量视频文件中的零件，逐帧输出结果")
+    parser.add_argument('video', help="视频文件路径")
+    parser.add_argument('--type', choices=['circle', 'rectangle'], required=True, help="测量类型")
+    parser.add_argument('--calibration', default=DEFAULT_CALIBRATION_FILE, help="标定数据文件")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, help="标定配置名称（相机/工位）")
+    parser.add_argument('--output', '-o', default='-', help="输出文件 (.csv 或 .jsonl)，默认输出到标准输出")
+    parser.add_argument('--stride', type=int, default=1, help="采样间隔（帧）")
+    parser.add_argument('--scene-threshold', type=float, default=None,
+                        help="按场景变化采样：画面变化超过该值（平均灰度差）并稳定后测量一帧")
+    parser.add_argument('--expected-radius', type=float, help="期望半径 (mm)")
+    parser.add_argument('--expected-width', type=float, help="期望长度 (mm)")
+    parser.add_argument('--expected-height', type=float, help="期望宽度 (mm)")
+    parser.add_argument('--tolerance', type=float, default=None, help="允许误差 (%%)，用于判定合格")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.video):
+        print(f"未找到视频: {args.video}", file=sys.stderr)
+        return 1
+
+    calibration = load_calibration(args.calibration, args.profile)[args.type]
+    if args.type == 'circle' and not calibration.get('pixels_per_mm'):
+        print("请先进行圆形标定！", file=sys.stderr)
+        return 1
+    if args.type == 'rectangle' and not calibration.get('pixels_per_mm_width'):
+        print("请先进行矩形标定！", file=sys.stderr)
+        return 1
+    if calibration.get('geometry_corrected'):
+        # 比例属于几何校正后的摄像头坐标，用于未校正的视频帧会随相机倾斜产生误差
+        print("该标定配置是在几何校正后的摄像头画面上标定的，不能用于视频文件，请另建配置并用图片标定", file=sys.stderr)
+        return 1
+
+    info = video_info(args.video)
+    expected = {'radius': args.expected_radius, 'width': args.expected_width, 'height': args.expected_height}
+    strategy_stats = StrategyStats.from_calibration(calibration) if args.type == 'rectangle' else None
+    writer = ResultWriter(args.output, CIRCLE_FIELDS if args.type == 'circle' else RECTANGLE_FIELDS)
+    start_time = time.perf_counter()
+    count = 0
+    success_count = 0
+    try:
+        for row in measure_video(args.video, args.type, calibration, expected, args.tolerance, args.stride,
+                                 args.scene_threshold, strategy_stats):
+            writer.write(row)
+            count += 1
+            if row['success']:
+                success_count += 1
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start_time
+    speed = f"，{info['duration_s'] / elapsed:.1f} 倍实时速度" if elapsed > 0 and info['duration_s'] else ''
+    print(f"完成: 采样 {count} 帧，{success_count} 帧测量成功，用时 {elapsed:.1f} 秒{speed}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())